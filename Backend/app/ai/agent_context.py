@@ -0,0 +1,185 @@
+"""
+Agent Context Builder
+Keeps a compact, token-budgeted digest of the autonomous agent's progress
+"""
+import json
+import logging
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough local token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def _compact(value: Any) -> str:
+    """Serialize without indentation or extra whitespace"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _truncate(text: Optional[str], limit: int) -> Optional[str]:
+    """Trim long strings, marking that they were cut"""
+    if not text or len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + "…"
+
+
+def _shorten(value: Any, limit: int) -> Any:
+    """Trim a digest value (a string or a list of strings) to limit characters per string"""
+    if isinstance(value, str):
+        return _truncate(value, limit)
+    if isinstance(value, list):
+        return [_truncate(v, limit) if isinstance(v, str) else v for v in value]
+    return value
+
+
+class AgentContextBuilder:
+    """
+    Builds the prompt context for the autonomous agent's planner and synthesizer.
+
+    Instead of re-serializing the full initial analysis and every step result
+    on each iteration, each piece is reduced once to its key fields and the
+    digest is reused. Rendering drops the oldest step digests first when the
+    context would exceed the configured token ceiling.
+    """
+
+    # Max characters kept for free-text fields inside digests
+    TEXT_LIMIT = 240
+    SOURCE_TEXT_LIMIT = 400
+
+    def __init__(self, initial_analysis: Dict[str, Any], max_tokens: int = 2000):
+        self.max_tokens = max_tokens
+        self.initial_digest = self._digest_initial_analysis(initial_analysis)
+        self.step_digests: List[Dict[str, Any]] = []
+        self.prompt_tokens: List[int] = []  # Measured prompt size per planner/synthesis call
+
+    def _digest_initial_analysis(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce the initial analysis to what the planner needs"""
+        trade_offs = analysis.get("trade_offs") or {}
+        digest = {
+            "insight": _truncate(analysis.get("insight"), self.TEXT_LIMIT),
+            "pros": [_truncate(p, 80) for p in trade_offs.get("pros", [])[:3]],
+            "cons": [_truncate(c, 80) for c in trade_offs.get("cons", [])[:3]],
+            "uncertainty": _truncate(analysis.get("uncertainty_note"), 120),
+        }
+        source_text = analysis.get("extracted_text") or analysis.get("text")
+        if source_text:
+            digest["source_text"] = _truncate(source_text, self.SOURCE_TEXT_LIMIT)
+        return {k: v for k, v in digest.items() if v}
+
+    def _digest_result(self, action: str, result: Any) -> Any:
+        """Summarize a step result down to its key fields"""
+        if not isinstance(result, dict):
+            return _truncate(str(result), self.TEXT_LIMIT) if result is not None else None
+
+        if "error" in result:
+            return {"error": _truncate(str(result["error"]), 160)}
+
+        if action == "decision_engine":
+            structured = result.get("structured_analysis") or {}
+            summary = structured.get("ingredient_summary") or {}
+            properties = structured.get("food_properties") or {}
+            return {
+                "summary": _truncate((result.get("quick_insight") or {}).get("summary"), self.TEXT_LIMIT),
+                "intent": result.get("intent_classified"),
+                "signals": result.get("key_signals", [])[:3],
+                "processing": summary.get("processing_level"),
+                "sugar_dominant": properties.get("sugar_dominant"),
+                "uncertainty_flags": result.get("uncertainty_flags", [])[:3],
+                "translated_terms": [t.get("term") for t in result.get("ingredient_translations", [])[:5]],
+            }
+
+        if action == "generate_recommendations":
+            recommendations = result.get("recommendations", [])
+            return {"recommendations": [r.get("title") for r in recommendations if isinstance(r, dict)][:5]}
+
+        if action == "search_product":
+            return {
+                "status": result.get("status"),
+                "matches": [
+                    {"name": m.get("name"), "brands": m.get("brands"), "category": m.get("main_category"), "nova_group": m.get("nova_group")}
+                    for m in result.get("matches", [])[:3]
+                ],
+            }
+
+        if action == "compare_alternatives":
+            return {
+                "status": result.get("status"),
+                "reference_score": (result.get("reference") or {}).get("score"),
+                "alternatives": [
+                    {"name": a.get("name"), "brands": a.get("brands"), "score": a.get("score")}
+                    for a in result.get("alternatives", [])[:3]
+                ],
+            }
+
+        # Generic fallback: keep short scalar fields only
+        return {
+            k: _truncate(v, self.TEXT_LIMIT) if isinstance(v, str) else v
+            for k, v in result.items()
+            if isinstance(v, (str, int, float, bool)) or v is None
+        }
+
+    def add_step(self, step: Dict[str, Any]):
+        """Summarize a completed step once and keep its digest"""
+        action = step.get("action")
+        digest = {"action": action, "result": self._digest_result(action, step.get("result"))}
+        self.step_digests.append(digest)
+
+    def render(self, reserved_tokens: int = 0) -> str:
+        """
+        Render the context as compact JSON, dropping the oldest step digests
+        until it fits within max_tokens (minus tokens reserved for the
+        surrounding prompt). If the initial digest alone is over budget its
+        text values are shortened, then its fields dropped; the result is
+        always valid JSON.
+        """
+        budget = max(self.max_tokens - reserved_tokens, 0)
+        steps = list(self.step_digests)
+        omitted = 0
+
+        while True:
+            # Completed action names are always kept so the planner never repeats work
+            context = {
+                "initial": self.initial_digest,
+                "completed_actions": [d["action"] for d in self.step_digests],
+                "steps": steps,
+            }
+            if omitted:
+                context["omitted_steps"] = omitted
+            rendered = _compact(context)
+            if estimate_tokens(rendered) <= budget or not steps:
+                break
+            steps = steps[1:]
+            omitted += 1
+
+        limit = self.SOURCE_TEXT_LIMIT
+        initial = self.initial_digest
+        while estimate_tokens(rendered) > budget and initial:
+            # Even the initial digest alone is too large - shorten its text
+            # values, then drop whole fields, so the output stays valid JSON
+            limit //= 2
+            if limit >= 16:
+                initial = {k: _shorten(v, limit) for k, v in initial.items()}
+            else:
+                initial = dict(list(initial.items())[:-1])
+            context["initial"] = initial
+            rendered = _compact(context)
+
+        return rendered
+
+    def record_prompt(self, label: str, prompt: str) -> int:
+        """Measure the size of an outgoing prompt"""
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens.append(tokens)
+        logger.debug("   → %s prompt: ~%s tokens (ceiling %s)", label, tokens, self.max_tokens)
+        return tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Prompt size statistics for this run"""
+        return {
+            "max_tokens": self.max_tokens,
+            "prompt_tokens": list(self.prompt_tokens),
+            "total_prompt_tokens": sum(self.prompt_tokens),
+        }
@@ -3,16 +3,46 @@ Autonomous AI Agent
 Orchestrates multi-step analysis workflow autonomously
 """
 import asyncio
+import logging
 from typing import Dict, List, Any, Optional
 from enum import Enum
-import google.generativeai as genai
 from app.ai.key_manager import key_manager
+from app.ai.model_backend import LazyModel
+from app.ai.llm import generate
 from app.ai.schemas import DecisionEngineResponse, QuickInsight, ConsumerExplanation, IngredientTranslation
 from app.ai.service import ai_service
 from app.ai.coordinator import coordinator
 from app.ai.schemas import DecisionRequest
+from app.ai.agent_context import AgentContextBuilder, estimate_tokens
+from app.ai.prompts import PLANNER, RECOMMENDATIONS, SYNTHESIS
+from app.ai.progress import report_progress
+from app.ai.vision_extractor import vision_extractor
+from app.ai.cache import autonomous_cache, normalize_cache_text
+from app.ai.product_catalog import product_catalog
+from app.ai.product_vectors import product_vectors
+from config.settings import AGENT_CONTEXT_MAX_TOKENS
 import json
 
+logger = logging.getLogger(__name__)
+
+
+# Free-form JSON steps (no Pydantic schema); a plain dict config keeps the SDK import lazy
+JSON_MODE = {"response_mime_type": "application/json"}
+
+PLANNER_ACTIONS = [
+    ("decision_engine", "Deep analysis with decision engine (intent classification, ingredient interpretation, etc.)"),
+    ("search_product", "Search for this product in the local product catalog"),
+    ("compare_alternatives", "Find and compare healthier alternatives"),
+    ("generate_recommendations", "Generate personalized recommendations"),
+    ("complete", "Analysis is comprehensive, no more actions needed"),
+]
+
+# Actions that need local catalog data; not offered to the planner until it is built
+CATALOG_ACTIONS = {
+    "search_product": lambda: product_catalog.available,
+    "compare_alternatives": lambda: product_catalog.available and product_vectors.available,
+}
+
 
 class AgentAction(str, Enum):
     """Possible actions the agent can take"""
@@ -48,41 +78,30 @@ class AutonomousAgent:
     
     def __init__(self):
         if not key_manager:
-            print("WARNING: No API keys configured. Autonomous agent will fail.")
+            logger.warning("No API keys configured. Autonomous agent will fail.")
             self.use_key_manager = False
             self.model = None
             return
         
         self.use_key_manager = True
         self.max_steps = 8  # Allow comprehensive autonomous workflow
-        self.progress_callback = None  # Callback for progress updates
         
-        # Initialize the Gemini model
-        try:
-            self.model = key_manager.create_model('gemini-2.5-flash')
-            print("Autonomous agent model initialized successfully")
-        except Exception as e:
-            print(f"Failed to initialize autonomous agent model: {e}")
-            self.model = None
+        # Created on the first planner call, not at import
+        self.model = LazyModel('gemini-2.5-flash', key_manager.get_current_key())
     
-    def set_progress_callback(self, callback):
-        """Set callback function for progress updates"""
-        self.progress_callback = callback
+    @staticmethod
+    def _report_progress(step: int, total: int, message: str, name: str):
+        """Report a step starting to the current request's progress channel"""
+        report_progress("step_start", step=step, total=total, name=name, message=message)
     
-    async def _report_progress(self, step: int, total: int, message: str, status: str = "in_progress"):
-        """Report progress to callback if set"""
-        if self.progress_callback:
-            await self.progress_callback({
-                "step": step,
-                "total": total,
-                "message": message,
-                "status": status
-            })
+    @staticmethod
+    def _report_step_complete(step: int, name: str, result: Any):
+        """Report a finished step with its partial result"""
+        report_progress("step_complete", step=step, name=name, result=result)
     
     async def _decide_next_action(
         self, 
-        initial_analysis: Dict[str, Any], 
-        completed_steps: List[AgentStep],
+        context_builder: AgentContextBuilder,
         user_query: Optional[str] = None
     ) -> AgentAction:
         """
@@ -95,62 +114,44 @@ class AutonomousAgent:
             return AgentAction.COMPLETE
         
         # Build context for decision making
-        context = f"""
-You are an autonomous food analysis agent. Based on the information below, decide the NEXT BEST ACTION to help the user.
-
-INITIAL ANALYSIS:
-{json.dumps(initial_analysis, indent=2)}
-
-COMPLETED STEPS:
-{json.dumps([step for step in completed_steps], indent=2)}
-
-USER QUERY: {user_query or "General food analysis"}
-
-AVAILABLE ACTIONS:
-1. decision_engine - Deep analysis with decision engine (intent classification, ingredient interpretation, etc.)
-2. search_product - Search for this product in global food database
-3. compare_alternatives - Find and compare healthier alternatives
-4. generate_recommendations - Generate personalized recommendations
-5. complete - Analysis is comprehensive, no more actions needed
-
-RULES:
-- Always run decision_engine after initial analysis (if not done yet)
-- Only search_product if we have a clear product name
-- Only compare_alternatives if the product has concerning ingredients
-- Only generate_recommendations if user might benefit from guidance
-- Choose 'complete' when sufficient information has been gathered
-
-Return ONLY the action name (e.g., "decision_engine", "complete")
-"""
+        offered = [
+            (name, description) for name, description in PLANNER_ACTIONS
+            if name not in CATALOG_ACTIONS or CATALOG_ACTIONS[name]()
+        ]
+        user_query = user_query or "General food analysis"
+        available_actions = "\n".join(
+            f"{i}. {name} - {description}" for i, (name, description) in enumerate(offered, 1)
+        )
+        context = PLANNER.render(
+            context=context_builder.render(
+                reserved_tokens=PLANNER.static_tokens + estimate_tokens(user_query + available_actions)
+            ),
+            user_query=user_query,
+            available_actions=available_actions
+        )
+        context_builder.record_prompt("Planner", context)
         
-        try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(context)
-            )
-            
-            action_text = response.text.strip().lower()
-            
-            # Map response to action
-            action_map = {
-                "decision_engine": AgentAction.DECISION_ENGINE,
-                "search_product": AgentAction.SEARCH_PRODUCT,
-                "compare_alternatives": AgentAction.COMPARE_ALTERNATIVES,
-                "generate_recommendations": AgentAction.GENERATE_RECOMMENDATIONS,
-                "complete": AgentAction.COMPLETE
-            }
-            
-            for key, action in action_map.items():
-                if key in action_text:
-                    return action
-            
-            # Default to complete if unclear
-            return AgentAction.COMPLETE
-            
-        except Exception as e:
-            print(f"Error deciding next action: {e}")
-            return AgentAction.COMPLETE
+        # Errors propagate: the workflow records them as a failed step
+        response = await generate(self.model, context, agent=PLANNER.name)
+        
+        action_text = response.text.strip().lower()
+        
+        # Map response to action
+        action_map = {
+            "decision_engine": AgentAction.DECISION_ENGINE,
+            "search_product": AgentAction.SEARCH_PRODUCT,
+            "compare_alternatives": AgentAction.COMPARE_ALTERNATIVES,
+            "generate_recommendations": AgentAction.GENERATE_RECOMMENDATIONS,
+            "complete": AgentAction.COMPLETE
+        }
+        
+        offered_names = {name for name, _ in offered}
+        for key, action in action_map.items():
+            if key in offered_names and key in action_text:
+                return action
+        
+        # Default to complete if unclear
+        return AgentAction.COMPLETE
     
     async def _execute_action(
         self, 
@@ -190,51 +191,73 @@ Return ONLY the action name (e.g., "decision_engine", "complete")
                 )
         
         elif action == AgentAction.SEARCH_PRODUCT:
-            # Search for product in database
-            return AgentStep(
-                action=action,
-                description="Search global food database",
-                result={"status": "not_implemented", "message": "Product search integration pending"},
-                reasoning="Would search Open Food Facts database for similar products"
-            )
+            # Search the local product catalog (no network calls)
+            if not product_catalog.available:
+                return AgentStep(
+                    action=action,
+                    description="Search local product catalog",
+                    result={"status": "unavailable", "message": "No local product catalog has been built"},
+                    reasoning="Product catalog not configured"
+                )
+            try:
+                query = self._product_search_query(context)
+                loop = asyncio.get_event_loop()
+                matches = await loop.run_in_executor(None, lambda: product_catalog.search(query, limit=5))
+                context['catalog_matches'] = matches
+                return AgentStep(
+                    action=action,
+                    description="Search local product catalog",
+                    result={"status": "ok" if matches else "no_match", "query": query, "matches": matches},
+                    reasoning=f"Found {len(matches)} catalog match(es) by name, brand and ingredients"
+                )
+            except Exception as e:
+                return AgentStep(
+                    action=action,
+                    description="Product catalog search failed",
+                    result={"error": str(e)},
+                    reasoning=f"Error: {str(e)}"
+                )
         
         elif action == AgentAction.COMPARE_ALTERNATIVES:
-            # Find healthier alternatives
-            return AgentStep(
-                action=action,
-                description="Find healthier alternatives",
-                result={"status": "not_implemented", "message": "Alternative comparison pending"},
-                reasoning="Would compare with healthier alternatives based on key signals"
-            )
+            # Nearest neighbours by ingredients, same category, higher rule-based score
+            if not (product_catalog.available and product_vectors.available):
+                return AgentStep(
+                    action=action,
+                    description="Find healthier alternatives",
+                    result={"status": "unavailable", "message": "No product similarity index has been built"},
+                    reasoning="Product catalog not configured"
+                )
+            try:
+                loop = asyncio.get_event_loop()
+                result = await loop.run_in_executor(None, lambda: self._find_alternatives(context))
+                return AgentStep(
+                    action=action,
+                    description="Find healthier alternatives",
+                    result=result,
+                    reasoning="Most similar catalog products by ingredients that score higher on the same rules"
+                )
+            except Exception as e:
+                return AgentStep(
+                    action=action,
+                    description="Alternative search failed",
+                    result={"error": str(e)},
+                    reasoning=f"Error: {str(e)}"
+                )
         
         elif action == AgentAction.GENERATE_RECOMMENDATIONS:
             # Generate personalized recommendations
             try:
-                initial_analysis = context.get('initial_analysis', {})
+                context_builder: AgentContextBuilder = context['context_builder']
                 
-                prompt = f"""
-Based on this food analysis, generate 3-5 actionable recommendations for the user.
-
-ANALYSIS:
-{json.dumps(initial_analysis, indent=2)}
-
-Provide practical, specific recommendations. Format as JSON:
-{{
-    "recommendations": [
-        {{"title": "...", "description": "...", "priority": "high|medium|low"}},
-        ...
-    ]
-}}
-"""
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None,
-                    lambda: self.model.generate_content(
-                        prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            response_mime_type="application/json"
-                        )
-                    )
+                prompt = RECOMMENDATIONS.render(
+                    context=context_builder.render(reserved_tokens=RECOMMENDATIONS.static_tokens)
+                )
+                context_builder.record_prompt("Recommendations", prompt)
+                response = await generate(
+                    self.model,
+                    prompt,
+                    generation_config=JSON_MODE,
+                    agent=RECOMMENDATIONS.name
                 )
                 
                 recommendations = json.loads(response.text.strip())
@@ -263,73 +286,136 @@ Provide practical, specific recommendations. Format as JSON:
     
     async def _synthesize_final_response(
         self, 
-        initial_analysis: Dict[str, Any],
-        all_steps: List[AgentStep]
+        context_builder: AgentContextBuilder
     ) -> Dict[str, Any]:
         """
         Synthesize all gathered information into a comprehensive final response
         """
         try:
-            synthesis_prompt = f"""
-You are synthesizing a comprehensive food analysis report from multiple analysis steps.
-
-INITIAL ANALYSIS:
-{json.dumps(initial_analysis, indent=2)}
-
-ALL ANALYSIS STEPS:
-{json.dumps([step for step in all_steps], indent=2)}
-
-Create a comprehensive summary that:
-1. Highlights the most important findings
-2. Provides clear, actionable insights
-3. Maintains honest uncertainty where appropriate
-4. Gives context-aware recommendations
-
-Format as JSON:
-{{
-    "executive_summary": "One powerful paragraph summarizing everything",
-    "key_takeaways": ["takeaway 1", "takeaway 2", "takeaway 3"],
-    "confidence_level": "high|medium|low",
-    "next_steps": ["suggestion 1", "suggestion 2"]
-}}
-"""
+            synthesis_prompt = SYNTHESIS.render(
+                context=context_builder.render(reserved_tokens=SYNTHESIS.static_tokens)
+            )
+            context_builder.record_prompt("Synthesis", synthesis_prompt)
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    synthesis_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        response_mime_type="application/json"
-                    )
-                )
+            response = await generate(
+                self.model,
+                synthesis_prompt,
+                generation_config=JSON_MODE,
+                agent=SYNTHESIS.name
             )
             
             synthesis = json.loads(response.text.strip())
             return synthesis
             
         except Exception as e:
-            print(f"Error synthesizing response: {e}")
+            logger.warning("Error synthesizing response: %s", e)
             return {
                 "executive_summary": "Analysis completed with multiple steps",
                 "key_takeaways": ["See detailed steps for information"],
                 "confidence_level": "medium",
-                "next_steps": []
+                "next_steps": [],
+                "degraded": True  # Placeholder summary: the run is not cached
             }
     
+    @staticmethod
+    def _product_search_query(context: Dict[str, Any]) -> str:
+        """Best available search terms: user query plus product name/brand, else the label text"""
+        parts = [context.get('user_query') or "", context.get('product_text') or ""]
+        if not any(part.strip() for part in parts):
+            parts.append(context.get('extracted_text') or "")
+        return " ".join(" ".join(parts).split())[:300]
+    
+    @staticmethod
+    def _find_alternatives(context: Dict[str, Any], k: int = 5) -> Dict[str, Any]:
+        """
+        Healthier alternatives for the analyzed product.
+        Uses the catalog match (from search_product) for category and ingredients
+        when there is one, otherwise the label text across all categories.
+        """
+        matches = context.get('catalog_matches') or []
+        reference = matches[0] if matches else None
+        ingredients = (reference or {}).get('ingredients_text') or context.get('extracted_text') or ""
+        category = reference.get('main_category') if reference else None
+
+        # The reference score must come from the same catalog encoder as the
+        # indexed scores (an LLM analysis of the label scores on a different basis)
+        score = product_vectors.score_of(reference['rowid']) if reference else None
+        if score is None:
+            score = product_vectors.score_text(ingredients)
+
+        neighbours = product_vectors.nearest(
+            ingredients,
+            k=k,
+            category=category,
+            min_score=score,
+            exclude_rowid=reference['rowid'] if reference else None
+        )
+        # get_by_rowids skips rows missing from the catalog, so join on rowid
+        products = {
+            product['rowid']: product
+            for product in product_catalog.get_by_rowids([n['rowid'] for n in neighbours])
+        }
+        found = [(n, products[n['rowid']]) for n in neighbours if n['rowid'] in products]
+        alternatives = [
+            {
+                "barcode": product['barcode'],
+                "name": product['name'],
+                "brands": product['brands'],
+                "main_category": product['main_category'],
+                "nova_group": product['nova_group'],
+                "score": neighbour['score'],
+                "similarity": neighbour['similarity']
+            }
+            for neighbour, product in found
+        ]
+        return {
+            "status": "ok" if alternatives else "no_match",
+            "reference": {
+                "name": reference['name'] if reference else None,
+                "category": category,
+                "score": score
+            },
+            "alternatives": alternatives
+        }
+    
+    @staticmethod
+    def _run_cache_key(images: Optional[List[bytes]], text_data: Optional[str], user_query: Optional[str]) -> str:
+        """Cache key for a whole run: input fingerprint plus normalized user query"""
+        if images:
+            source = vision_extractor.cache_key(images)
+        else:
+            source = f"text:{normalize_cache_text(text_data or '')}"
+        return f"{source}|query:{normalize_cache_text(user_query or '')}"
+    
+    @staticmethod
+    def _is_cacheable_run(result: Dict[str, Any]) -> bool:
+        """Only cache runs where no step, planner call or synthesis failed or fell back to a degraded result"""
+        if (result.get("synthesis") or {}).get("degraded"):
+            return False
+        return not any(
+            isinstance(step.get("result"), dict)
+            and ("error" in step["result"] or step["result"].get("degraded"))
+            for step in result.get("workflow_steps", [])
+        )
+    
     async def analyze_autonomously(
         self,
         image_data: Optional[bytes] = None,
         text_data: Optional[str] = None,
-        user_query: Optional[str] = None
+        user_query: Optional[str] = None,
+        images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         """
         Main autonomous analysis workflow.
         
+        Whole runs are cached by input fingerprint and user query, and
+        concurrent identical runs share a single execution.
+        
         Args:
-            image_data: Image bytes (if analyzing image)
+            image_data: Image bytes (if analyzing a single image)
             text_data: Text input (if analyzing text)
             user_query: Optional user query for context
+            images: Several photos of the same product (front, ingredients, nutrition)
         
         Returns:
             Comprehensive analysis with all steps taken
@@ -337,52 +423,36 @@ Format as JSON:
         if not self.model:
             raise ValueError("Autonomous agent not configured (Missing API Key)")
         
+        if image_data and not images:
+            images = [image_data]
+        
+        return await autonomous_cache.get_or_compute(
+            self._run_cache_key(images, text_data, user_query),
+            lambda: self._run_workflow(images, text_data, user_query),
+            should_cache=self._is_cacheable_run
+        )
+    
+    async def _run_workflow(
+        self,
+        images: Optional[List[bytes]],
+        text_data: Optional[str],
+        user_query: Optional[str]
+    ) -> Dict[str, Any]:
+        """Execute the multi-step workflow (uncached)"""
         workflow_steps = []
         estimated_total = 3  # Initial estimate
         
         # STEP 1: Initial Analysis (Image or Text)
-        await self._report_progress(1, estimated_total, "Starting initial analysis...")
-        print("Agent Step 1: Initial Analysis")
-        if image_data:
-            # Analyze image first
-            try:
-                await self._report_progress(1, estimated_total, "Analyzing image...")
-                print(f"   → Calling ai_service.analyze_image with {len(image_data)} bytes")
-                initial_result = await ai_service.analyze_image(image_data, "image/jpeg")
-                print(f"   → ai_service.analyze_image completed successfully")
-            except Exception as e:
-                print(f"❌ ERROR in ai_service.analyze_image: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                raise Exception(f"Image analysis failed: {type(e).__name__}: {str(e)}")
-            
-            # Also extract text from image for follow-up steps
-            try:
-                await self._report_progress(1, estimated_total, "Extracting text from image...")
-                print(f"   → Extracting text from image")
-                import PIL.Image
-                import io
-                image = PIL.Image.open(io.BytesIO(image_data))
-                print(f"   → PIL Image opened successfully: {image.format}, {image.size}")
-                
-                extraction_prompt = """Extract all text from this food label image.
-Return the complete ingredient list and nutrition information."""
-                
-                loop = asyncio.get_event_loop()
-                print(f"   → Calling Gemini for text extraction")
-                extraction_response = await loop.run_in_executor(
-                    None,
-                    lambda: self.model.generate_content([extraction_prompt, image])
-                )
-                extracted_text = extraction_response.text.strip()
-                print(f"   → Text extraction completed, length: {len(extracted_text)}")
-            except Exception as e:
-                print(f"❌ ERROR in text extraction: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                # Continue with empty extracted text rather than failing
-                extracted_text = ""
-                print(f"   ⚠️  Continuing without extracted text")
+        self._report_progress(1, estimated_total, "Starting initial analysis...", "initial_analysis")
+        logger.info("Agent Step 1: Initial Analysis")
+        if images:
+            # One vision call returns both the analysis and the verbatim label text
+            self._report_progress(1, estimated_total, "Analyzing image and extracting text...", "initial_analysis")
+            logger.info("   → Calling vision_extractor.extract with %s image(s), %s bytes", len(images), sum(len(i) for i in images))
+            extraction = await vision_extractor.extract(images)
+            initial_result = extraction.to_analysis()
+            extracted_text = extraction.label_text
+            product_text = extraction.other_text
             
             # Create key takeaways from trade-offs
             key_takeaways = []
@@ -409,8 +479,9 @@ Return the complete ingredient list and nutrition information."""
             
         else:
             # Analyze text
-            await self._report_progress(1, estimated_total, "Analyzing text...")
+            self._report_progress(1, estimated_total, "Analyzing text...", "initial_analysis")
             initial_result = await ai_service.analyze_text(text_data)
+            product_text = ""
             
             # Create key takeaways from trade-offs
             key_takeaways = []
@@ -427,6 +498,9 @@ Return the complete ingredient list and nutrition information."""
                 "uncertainty_note": initial_result.uncertainty_note,
                 "text": text_data
             }
+            if initial_result.degraded:
+                # Fallback analysis: keep the run going but never cache it
+                initial_analysis["degraded"] = True
             
             workflow_steps.append(AgentStep(
                 action=AgentAction.ANALYZE_TEXT,
@@ -435,44 +509,59 @@ Return the complete ingredient list and nutrition information."""
                 reasoning="Extracted summary and key takeaways"
             ))
         
+        self._report_step_complete(1, "initial_analysis", initial_analysis)
+        
+        # Compact digest of the run, reused by planner, recommendations and synthesis
+        context_builder = AgentContextBuilder(initial_analysis, max_tokens=AGENT_CONTEXT_MAX_TOKENS)
+        
         # STEP 2-N: Autonomous follow-up actions
         context = {
             "initial_analysis": initial_analysis,
             "extracted_text": initial_analysis.get("extracted_text", initial_analysis.get("text", "")),
-            "user_query": user_query
+            "user_query": user_query,
+            "product_text": product_text,
+            "context_builder": context_builder
         }
         
         step_count = 1
         while step_count < self.max_steps:
-            await self._report_progress(step_count + 1, estimated_total, f"Deciding next action (step {step_count + 1})...")
-            print(f"Agent Step {step_count + 1}: Deciding next action...")
+            self._report_progress(step_count + 1, estimated_total, f"Deciding next action (step {step_count + 1})...", "planning")
+            logger.info("Agent Step %s: Deciding next action...", step_count + 1)
             
             # Decide next action
-            next_action = await self._decide_next_action(
-                initial_analysis, 
-                workflow_steps,
-                user_query
-            )
+            try:
+                next_action = await self._decide_next_action(context_builder, user_query)
+            except Exception as e:
+                logger.warning("Error deciding next action: %s", e)
+                # Stop here, but record the failure so the cut-short run is not cached
+                workflow_steps.append(AgentStep(
+                    action=AgentAction.COMPLETE,
+                    description="Planning failed, workflow stopped early",
+                    result={"error": str(e)},
+                    reasoning=f"Error: {str(e)}"
+                ))
+                break
             
-            print(f"   → Action: {next_action.value}")
+            logger.info("   → Action: %s", next_action.value)
             
             if next_action == AgentAction.COMPLETE:
-                print("   → Agent decided analysis is complete")
+                logger.info("   → Agent decided analysis is complete")
                 break
             
             # Execute action
-            await self._report_progress(step_count + 1, estimated_total, f"Executing: {next_action.value}...")
+            self._report_progress(step_count + 1, estimated_total, f"Executing: {next_action.value}...", next_action.value)
             step_result = await self._execute_action(next_action, context)
             workflow_steps.append(step_result)
+            context_builder.add_step(step_result)
+            self._report_step_complete(step_count + 1, next_action.value, step_result["result"])
             
             step_count += 1
         
         # FINAL STEP: Synthesize everything
-        await self._report_progress(step_count + 1, step_count + 1, "Synthesizing final response...")
-        print("Final Step: Synthesizing comprehensive response")
-        synthesis = await self._synthesize_final_response(initial_analysis, workflow_steps)
-        
-        await self._report_progress(step_count + 1, step_count + 1, "Analysis complete!", "completed")
+        self._report_progress(step_count + 1, step_count + 1, "Synthesizing final response...", "synthesis")
+        logger.info("Final Step: Synthesizing comprehensive response")
+        synthesis = await self._synthesize_final_response(context_builder)
+        self._report_step_complete(step_count + 1, "synthesis", synthesis)
         
         return {
             "initial_analysis": initial_analysis,
@@ -0,0 +1,119 @@
+"""
+Batch Decision Service
+Runs many products through the decision engine with in-batch dedup and bounded concurrency
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from app.ai.coordinator import coordinator
+from app.ai.cache import decision_cache, normalize_cache_text
+from app.ai.key_manager import key_manager
+from app.ai.schemas import DecisionBatchItem, DecisionRequest
+from config.settings import BATCH_CONCURRENCY_PER_KEY, BATCH_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class BatchDecisionService:
+    """
+    Processes a batch of products for catalogue ingestion.
+
+    - Items with the same normalized text (and options) are analyzed once
+    - Cache hits are emitted immediately
+    - Misses run through coordinator.process on a worker pool whose active
+      size follows the number of healthy API keys
+    - Results are yielded as they complete; a failing item only fails its own line
+    """
+
+    # How long an idle worker waits before re-checking key availability
+    THROTTLE_INTERVAL = 0.5
+
+    @staticmethod
+    def _dedup_key(item: DecisionBatchItem) -> Tuple[str, str, str]:
+        return (
+            normalize_cache_text(item.text),
+            item.user_intent or "",
+            normalize_cache_text(item.include_nutrition or "")
+        )
+
+    @staticmethod
+    def _concurrency_limit() -> int:
+        if not key_manager:
+            return 1
+        return key_manager.recommended_concurrency(
+            per_key=BATCH_CONCURRENCY_PER_KEY,
+            maximum=BATCH_MAX_CONCURRENCY
+        )
+
+    @staticmethod
+    def _line(index: int, item: DecisionBatchItem, **fields: Any) -> Dict[str, Any]:
+        return {"index": index, "id": item.id, **fields}
+
+    async def run(self, items: List[DecisionBatchItem]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result line per input item, in completion order"""
+        # Group duplicate items so each distinct product is analyzed once
+        groups: Dict[Tuple[str, str, str], List[int]] = {}
+        for index, item in enumerate(items):
+            if not item.text.strip():
+                yield self._line(index, item, status="error", error="Text cannot be empty")
+                continue
+            groups.setdefault(self._dedup_key(item), []).append(index)
+
+        # Serve cache hits straight away
+        pending: asyncio.Queue = asyncio.Queue()
+        for key, indexes in groups.items():
+            first = items[indexes[0]]
+            cached = decision_cache.get(first.text)
+            if cached is not None:
+                for n, index in enumerate(indexes):
+                    yield self._line(index, items[index], status="ok", cached=True, deduplicated=n > 0, result=cached)
+            else:
+                pending.put_nowait(key)
+
+        total_jobs = pending.qsize()
+        if not total_jobs:
+            return
+
+        logger.info("📦 Batch: %s item(s), %s distinct, %s to analyze", len(items), len(groups), total_jobs)
+        completed: asyncio.Queue = asyncio.Queue()
+
+        async def worker(slot: int):
+            while True:
+                # Workers above the current key-pool limit idle until keys recover
+                while slot >= self._concurrency_limit():
+                    await asyncio.sleep(self.THROTTLE_INTERVAL)
+                try:
+                    key = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                item = items[groups[key][0]]
+                try:
+                    request = DecisionRequest(
+                        text=item.text,
+                        user_intent=item.user_intent,
+                        include_nutrition=item.include_nutrition
+                    )
+                    result = await coordinator.process(request)
+                    completed.put_nowait((key, result, None))
+                except Exception as e:
+                    logger.warning("❌ Batch item failed: %.200s", e)
+                    completed.put_nowait((key, None, e))
+
+        workers = [
+            asyncio.create_task(worker(slot))
+            for slot in range(min(total_jobs, BATCH_MAX_CONCURRENCY))
+        ]
+        try:
+            for _ in range(total_jobs):
+                key, result, error = await completed.get()
+                for n, index in enumerate(groups[key]):
+                    if error is not None:
+                        yield self._line(index, items[index], status="error", error=str(error))
+                    else:
+                        yield self._line(index, items[index], status="ok", cached=False, deduplicated=n > 0, result=result)
+        finally:
+            for task in workers:
+                task.cancel()
+
+
+batch_service = BatchDecisionService()
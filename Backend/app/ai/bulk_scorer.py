@@ -0,0 +1,391 @@
+"""
+Offline Bulk Scorer
+Scores whole product catalogs from JSONL/CSV files with checkpoint/resume
+"""
+import asyncio
+import glob
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.ai.coordinator import coordinator
+from app.ai.decision_engine import decision_engine
+from app.ai.ingredient_interpreter import ingredient_interpreter
+from app.ai.key_manager import key_manager, is_key_issue
+from app.ai.product_catalog import iter_dump
+from app.ai.progress import run_with_progress
+from app.ai.cache import decision_cache, ingredient_analysis_cache
+from app.ai.near_duplicate import near_duplicate_index
+from app.ai.schemas import DecisionRequest
+from config.settings import BATCH_CONCURRENCY_PER_KEY, BATCH_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExhausted(Exception):
+    """Every API key is out of quota; the run stops and can be resumed later"""
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class JsonlSink:
+    """Appends result lines to one JSONL file; a commit is an fsync'd byte offset"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def restore(self, state: Optional[Dict[str, Any]]):
+        """Drop anything written after the last commit (e.g. before a crash)"""
+        size = (state or {}).get("bytes", 0)
+        mode = "r+b" if os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as f:
+            f.truncate(size)
+
+    def commit(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        with open(self.path, "ab") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+            return {"bytes": f.tell()}
+
+
+class ParquetSink:
+    """Writes each commit as a numbered part file in an output directory (needs pyarrow)"""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.path = path
+        self.parts = 0
+
+    def restore(self, state: Optional[Dict[str, Any]]):
+        """Remove part files written after the last commit"""
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = (state or {}).get("parts", 0)
+        for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            if int(os.path.basename(part)[5:10]) >= self.parts:
+                os.remove(part)
+
+    def commit(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Nested fields are stored as JSON strings to keep one flat schema
+        table = pa.Table.from_pylist([
+            {
+                "offset": row["offset"],
+                "id": None if row.get("id") is None else str(row["id"]),
+                "status": row["status"],
+                "score": row.get("score"),
+                "key_signals": json.dumps(row.get("key_signals", [])),
+                "result": json.dumps(row.get("result"), default=str) if row.get("result") is not None else None,
+                "error": row.get("error"),
+            }
+            for row in rows
+        ])
+        pq.write_table(table, os.path.join(self.path, f"part-{self.parts:05d}.parquet"))
+        self.parts += 1
+        return {"parts": self.parts}
+
+
+class BulkScorer:
+    """
+    Runs every record of an input file through the decision engine.
+
+    - Input is streamed (JSONL or CSV/TSV, optionally gzipped)
+    - Worker concurrency follows the number of healthy API keys
+    - Results are written in input order; a checkpoint records the last
+      committed offset and output position, so a crash or quota exhaustion
+      resumes without re-paying for completed items
+    - Modes: 'full' runs coordinator.process; 'fast' runs only the ingredient
+      interpreter and the rule-based engine (one LLM call per item)
+    """
+
+    THROTTLE_INTERVAL = 0.5
+    COMMIT_INTERVAL = 10.0  # Seconds between commits when chunks fill slowly
+    MAX_WINDOW = 1000  # Max records in flight or waiting for an earlier record to finish
+
+    def __init__(
+        self,
+        input_path: str,
+        output_path: str,
+        mode: str = "full",
+        output_format: Optional[str] = None,
+        text_field: str = "text",
+        id_field: str = "id",
+        chunk_size: int = 200,
+        restart: bool = False
+    ):
+        if mode not in ("full", "fast"):
+            raise ValueError("mode must be 'full' or 'fast'")
+        self.input_path = input_path
+        self.output_path = output_path
+        self.mode = mode
+        self.output_format = output_format or ("parquet" if output_path.endswith(".parquet") else "jsonl")
+        self.text_field = text_field
+        self.id_field = id_field
+        self.chunk_size = min(chunk_size, self.MAX_WINDOW)
+        self.restart = restart
+        self.checkpoint_path = f"{output_path.rstrip('/')}.checkpoint.json"
+
+        self.stage_latencies: Dict[str, List[float]] = {}
+        self.counts = {"ok": 0, "error": 0}
+
+    # ------------------------------------------------------------------ checkpoint
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if self.restart or not os.path.exists(self.checkpoint_path):
+            if not self.restart and os.path.exists(self.output_path) and (
+                os.path.isdir(self.output_path) or os.path.getsize(self.output_path)
+            ):
+                raise ValueError(f"{self.output_path} exists without a checkpoint; use --restart to overwrite it")
+            return None
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("input") != os.path.abspath(self.input_path) or checkpoint.get("mode") != self.mode:
+            raise ValueError("Checkpoint belongs to a different input or mode; use --restart to start over")
+        return checkpoint
+
+    def _save_checkpoint(self, committed: int, sink_state: Dict[str, Any]):
+        checkpoint = {
+            "input": os.path.abspath(self.input_path),
+            "mode": self.mode,
+            "format": self.output_format,
+            "committed": committed,
+            "sink": sink_state,
+            "counts": self.counts,
+            "updated_at": time.time(),
+        }
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    # ------------------------------------------------------------------ scoring
+
+    @staticmethod
+    def _concurrency_limit() -> int:
+        if not key_manager:
+            return 1
+        return key_manager.recommended_concurrency(
+            per_key=BATCH_CONCURRENCY_PER_KEY,
+            maximum=BATCH_MAX_CONCURRENCY
+        )
+
+    def _record_stage(self, stage: str, seconds: float):
+        self.stage_latencies.setdefault(stage, []).append(seconds)
+
+    async def _run_full(self, request: DecisionRequest) -> Tuple[Any, float, List[str]]:
+        """coordinator.process, timing each stage from its progress events"""
+        started = stage_started = time.perf_counter()
+        result = None
+        async for event in run_with_progress(lambda: coordinator.process(request)):
+            now = time.perf_counter()
+            if event["event"] == "stage_start":
+                stage_started = now
+            elif event["event"] == "stage_complete":
+                self._record_stage(event["stage"], now - stage_started)
+            elif event["event"] == "error":
+                raise RuntimeError(event["error"]["error"])
+            elif event["event"] == "complete":
+                result = event["result"]
+        self._record_stage("total", time.perf_counter() - started)
+
+        score = decision_engine.decide(result.structured_analysis).score if result.structured_analysis else None
+        return result.dict(), score, result.key_signals
+
+    async def _run_fast(self, request: DecisionRequest) -> Tuple[Any, float, List[str]]:
+        """Ingredient interpretation plus local rules only"""
+        started = time.perf_counter()
+        structured = await ingredient_interpreter.interpret(
+            ingredient_text=request.text,
+            nutrition_info=request.include_nutrition
+        )
+        interpreted = time.perf_counter()
+        decision = decision_engine.decide(structured)
+        finished = time.perf_counter()
+        self._record_stage("interpretation", interpreted - started)
+        self._record_stage("decision", finished - interpreted)
+        self._record_stage("total", finished - started)
+        return {"structured_analysis": structured.dict(), "decision": decision.dict()}, decision.score, decision.key_signals
+
+    async def _score(self, offset: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one record; raises QuotaExhausted instead of recording quota failures"""
+        text = str(record.get(self.text_field) or "").strip()
+        row = {"offset": offset, "id": record.get(self.id_field)}
+        if not text:
+            return {**row, "status": "error", "error": f"Missing '{self.text_field}'"}
+
+        request = DecisionRequest(
+            text=text,
+            user_intent=record.get("user_intent") or None,
+            include_nutrition=record.get("include_nutrition") or None
+        )
+        try:
+            run = self._run_full if self.mode == "full" else self._run_fast
+            result, score, key_signals = await run(request)
+        except Exception as e:
+            if is_key_issue(e):
+                raise QuotaExhausted(str(e))
+            return {**row, "status": "error", "error": str(e)}
+
+        # Agents degrade gracefully on key errors; don't commit results produced without keys
+        if key_manager and key_manager.available_key_count() == 0:
+            raise QuotaExhausted("All API keys are cooling down")
+        return {**row, "status": "ok", "score": score, "key_signals": key_signals, "result": result}
+
+    # ------------------------------------------------------------------ run
+
+    def _records(self, skip: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        return itertools.islice(enumerate(iter_dump(self.input_path)), skip, None)
+
+    async def run(self) -> Dict[str, Any]:
+        """Score the input (resuming from the checkpoint) and return a run report"""
+        checkpoint = self._load_checkpoint()
+        committed = checkpoint["committed"] if checkpoint else 0
+        if checkpoint:
+            self.counts = checkpoint.get("counts", self.counts)
+            logger.info("⏩ Resuming from offset %s", committed)
+
+        sink = ParquetSink(self.output_path) if self.output_format == "parquet" else JsonlSink(self.output_path)
+        sink.restore(checkpoint["sink"] if checkpoint else None)
+        sink_state = checkpoint["sink"] if checkpoint else {}
+
+        cache_hits_before = (decision_cache.hits, ingredient_analysis_cache.hits, near_duplicate_index.hits)
+        records = self._records(committed)
+        completed: Dict[int, Dict[str, Any]] = {}
+        pulled = committed
+        stop_reason: Optional[str] = None
+        input_done = False
+        last_commit = time.perf_counter()
+        started = time.perf_counter()
+        processed = 0
+
+        def commit(force: bool = False):
+            """Write the contiguous run of finished records after the last commit"""
+            nonlocal committed, sink_state, last_commit
+            rows = []
+            while committed + len(rows) in completed:
+                rows.append(completed.pop(committed + len(rows)))
+            if not rows:
+                return
+            if not force and len(rows) < self.chunk_size and time.perf_counter() - last_commit < self.COMMIT_INTERVAL:
+                # Not worth a commit yet - put them back
+                for row in rows:
+                    completed[row["offset"]] = row
+                return
+            sink_state = sink.commit(rows)
+            committed += len(rows)
+            # Counted only once written: uncommitted results are rescored after a resume
+            for row in rows:
+                self.counts[row["status"]] += 1
+            self._save_checkpoint(committed, sink_state)
+            last_commit = time.perf_counter()
+            logger.info("✅ Committed through offset %s (%.1f items/s)", committed, processed / (last_commit - started))
+
+        async def worker(slot: int):
+            nonlocal pulled, stop_reason, processed, input_done
+            while stop_reason is None and not input_done:
+                # Idle above the key-pool limit, or when too far ahead of the commit point
+                if slot >= self._concurrency_limit() or pulled - committed >= self.MAX_WINDOW:
+                    await asyncio.sleep(self.THROTTLE_INTERVAL)
+                    commit()
+                    continue
+                try:
+                    offset, record = next(records)
+                except StopIteration:
+                    input_done = True
+                    return
+                pulled += 1
+                try:
+                    completed[offset] = await self._score(offset, record)
+                except QuotaExhausted as e:
+                    stop_reason = f"API quota exhausted: {str(e)[:200]}"
+                    return
+                processed += 1
+                commit()
+
+        workers = [asyncio.create_task(worker(slot)) for slot in range(BATCH_MAX_CONCURRENCY)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            commit(force=True)
+
+        elapsed = time.perf_counter() - started
+        report = {
+            "status": "stopped" if stop_reason else "complete",
+            "stop_reason": stop_reason,
+            "mode": self.mode,
+            "committed_offset": committed,
+            "processed_this_run": processed,
+            "counts": self.counts,
+            "seconds": round(elapsed, 2),
+            "items_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+            "cache_hits": {
+                "decision": decision_cache.hits - cache_hits_before[0],
+                "ingredient_analysis": ingredient_analysis_cache.hits - cache_hits_before[1],
+                "near_duplicate": near_duplicate_index.hits - cache_hits_before[2],
+            },
+            "stage_latency_ms": {
+                stage: {
+                    "count": len(values),
+                    "mean": round(1000 * sum(values) / len(values), 1),
+                    "p50": round(1000 * _percentile(values, 0.5), 1),
+                    "p95": round(1000 * _percentile(values, 0.95), 1),
+                }
+                for stage, values in self.stage_latencies.items()
+            },
+        }
+        return report
+
+
+def _print_report(report: Dict[str, Any]):
+    icon = "⏸️" if report["status"] == "stopped" else "🏁"
+    print(f"\n{icon} Bulk scoring {report['status']}: {report['committed_offset']} records committed")
+    if report["stop_reason"]:
+        print(f"   {report['stop_reason']} - rerun the same command to resume")
+    print(f"   This run: {report['processed_this_run']} items in {report['seconds']}s ({report['items_per_second']} items/s)")
+    print(f"   Totals: {report['counts']['ok']} ok, {report['counts']['error']} error(s)")
+    print(f"   Cache hits: {report['cache_hits']}")
+    print("   Stage latency (ms):")
+    for stage, latency in report["stage_latency_ms"].items():
+        print(f"     {stage:<15} n={latency['count']:<6} mean={latency['mean']:<8} p50={latency['p50']:<8} p95={latency['p95']}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score a product file through the decision engine with checkpoint/resume")
+    parser.add_argument("input", help="JSONL or CSV/TSV file (.gz ok), one product per record")
+    parser.add_argument("output", help="JSONL file, or a directory of Parquet part files when it ends in .parquet")
+    parser.add_argument("--mode", choices=("full", "fast"), default="full", help="full: whole multi-agent pipeline; fast: interpreter + rules only")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), help="Output format (default: from the output name)")
+    parser.add_argument("--text-field", default="text", help="Field holding the ingredient text (e.g. ingredients_text)")
+    parser.add_argument("--id-field", default="id", help="Field echoed back as the record id (e.g. code)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Records per commit")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and overwrite the output")
+    args = parser.parse_args()
+
+    scorer = BulkScorer(
+        args.input,
+        args.output,
+        mode=args.mode,
+        output_format=args.format,
+        text_field=args.text_field,
+        id_field=args.id_field,
+        chunk_size=args.chunk_size,
+        restart=args.restart
+    )
+    result = asyncio.run(scorer.run())
+    _print_report(result)
+    raise SystemExit(2 if result["status"] == "stopped" else 0)
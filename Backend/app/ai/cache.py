@@ -3,11 +3,48 @@ In-Memory Cache for AI Analysis Results
 Uses LRU (Least Recently Used) cache strategy
 """
 from functools import lru_cache
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable
+import asyncio
 import hashlib
 import json
+import logging
 import time
 from datetime import datetime, timedelta
+import orjson
+from config.settings import AUTONOMOUS_CACHE_TTL_SECONDS
+from config.log import log_sampled
+from app.ai.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_cache_text(text: str) -> str:
+    """Normalize text for cache keys (case and whitespace insensitive)"""
+    return " ".join(text.lower().split())
+
+
+def fingerprint_bytes(data: bytes) -> str:
+    """Stable fingerprint for binary inputs such as uploaded images"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_json(data: Any) -> bytes:
+    """Compact UTF-8 JSON, byte-for-byte what FastAPI's JSONResponse sends for the same data"""
+    return orjson.dumps(data)
+
+
+class EncodedResult:
+    """
+    A cached result's JSON bytes and its strong ETag: the normalized cache
+    key plus a digest of the bytes (the entry's content version), so every
+    instance serving the same result gives it the same tag.
+    """
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, key: str, body: bytes):
+        self.body = body
+        self.etag = f'"{key[:16]}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
 
 
 class AnalysisCache:
@@ -16,21 +53,29 @@ class AnalysisCache:
     Uses hash of ingredient text as cache key.
     """
     
-    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600):
+    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600, name: str = "analysis", store_encoded: bool = False):
         """
         Args:
             max_size: Maximum number of cached items
             ttl_seconds: Time-to-live in seconds (default: 1 hour)
+            name: Label for tracing spans
+            store_encoded: Also keep each result's JSON bytes and ETag, for get_encoded
         """
+        self.name = name
+        self.store_encoded = store_encoded
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds
         self.hits = 0
         self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._inflight: Dict[str, asyncio.Future] = {}  # In-progress computations by key
     
     def _generate_key(self, text: str) -> str:
         """Generate cache key from text using SHA256 hash"""
-        normalized_text = text.lower().strip()
+        normalized_text = normalize_cache_text(text)
         return hashlib.sha256(normalized_text.encode()).hexdigest()
     
     def _is_expired(self, timestamp: datetime) -> bool:
@@ -42,35 +87,68 @@ class AnalysisCache:
         if len(self.cache) >= self.max_size:
             oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k]['timestamp'])
             del self.cache[oldest_key]
-            print(f"Cache evicted: {oldest_key[:8]}...")
+            self.evictions += 1
+            log_sampled(logger, "cache.evict", "Cache evicted: %s...", oldest_key[:8])
     
     def get(self, text: str) -> Optional[Any]:
         """
         Retrieve cached analysis result.
         Returns None if not found or expired.
         """
-        key = self._generate_key(text)
-        
-        if key not in self.cache:
-            self.misses += 1
-            return None
-        
-        entry = self.cache[key]
-        
-        # Check if expired
-        if self._is_expired(entry['timestamp']):
-            del self.cache[key]
-            self.misses += 1
+        entry = self._lookup(text)
+        return entry['data'] if entry else None
+    
+    def get_encoded(self, text: str) -> Optional[EncodedResult]:
+        """
+        Retrieve the cached result as JSON bytes with its ETag, ready to send
+        as a response (needs store_encoded). Returns None if not found or expired.
+        """
+        entry = self._lookup(text)
+        return entry['encoded'] if entry else None
+    
+    def _lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """The unexpired entry for text, counting the hit or miss"""
+        with span(f"cache.{self.name}") as lookup:
+            key = self._generate_key(text)
+            
+            if key not in self.cache:
+                self.misses += 1
+                lookup.set_attribute("hit", False)
+                return None
+            
+            entry = self.cache[key]
+            
+            # Check if expired
+            if self._is_expired(entry['timestamp']):
+                del self.cache[key]
+                self.misses += 1
+                self.expirations += 1
+                lookup.set_attribute("hit", False)
+                return None
+            
+            # Cache hit
+            self.hits += 1
+            entry['access_count'] += 1
+            entry['last_accessed'] = datetime.now()
+            lookup.set_attribute("hit", True)
+            
+            log_sampled(logger, "cache.hit", "✅ Cache hit: %s... (hit rate: %.1f%%)", key[:8], 100 * self.get_hit_rate())
+            return entry
+    
+    def peek(self, text: str) -> Optional[Any]:
+        """Return an unexpired entry without counting a hit or miss"""
+        entry = self.cache.get(self._generate_key(text))
+        if entry is None or self._is_expired(entry['timestamp']):
             return None
-        
-        # Cache hit
-        self.hits += 1
-        entry['access_count'] += 1
-        entry['last_accessed'] = datetime.now()
-        
-        print(f"✅ Cache hit: {key[:8]}... (hit rate: {self.get_hit_rate():.1%})")
         return entry['data']
     
+    def peek_encoded(self, text: str) -> Optional[EncodedResult]:
+        """Like get_encoded, without counting a hit or miss"""
+        entry = self.cache.get(self._generate_key(text))
+        if entry is None or self._is_expired(entry['timestamp']):
+            return None
+        return entry['encoded']
+    
     def set(self, text: str, data: Any):
         """Store analysis result in cache"""
         key = self._generate_key(text)
@@ -82,24 +160,79 @@ class AnalysisCache:
             'data': data,
             'timestamp': datetime.now(),
             'last_accessed': datetime.now(),
-            'access_count': 0
+            'access_count': 0,
+            'encoded': EncodedResult(key, encode_json(data)) if self.store_encoded else None
         }
         
-        print(f"💾 Cache stored: {key[:8]}... (total: {len(self.cache)})")
+        log_sampled(logger, "cache.store", "💾 Cache stored: %s... (total: %d)", key[:8], len(self.cache))
+    
+    async def get_or_compute(
+        self,
+        text: str,
+        compute: Callable[[], Awaitable[Any]],
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Return the cached result for text, or compute and store it.
+        
+        Concurrent calls for the same key are collapsed into a single
+        computation: later callers await the first caller's result.
+        
+        Args:
+            text: Cache key text
+            compute: Coroutine factory producing the result on a miss
+            should_cache: Optional predicate; results failing it are returned but not stored
+        """
+        cached = self.get(text)
+        if cached is not None:
+            return cached
+        
+        key = self._generate_key(text)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            log_sampled(logger, "cache.coalesced", "🔗 Cache coalesced: %s... (waiting on in-flight computation)", key[:8])
+            try:
+                with span(f"cache.{self.name}.coalesced_wait"):
+                    return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if pending.cancelled():
+                    # The owning request went away - compute it ourselves
+                    return await self.get_or_compute(text, compute, should_cache)
+                raise
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so unawaited failures aren't logged
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        
+        if should_cache is None or should_cache(result):
+            self.set(text, result)
+        future.set_result(result)
+        return result
     
     def invalidate(self, text: str):
         """Remove specific entry from cache"""
         key = self._generate_key(text)
         if key in self.cache:
             del self.cache[key]
-            print(f"🗑️ Cache invalidated: {key[:8]}...")
+            logger.info("🗑️ Cache invalidated: %s...", key[:8])
     
     def clear(self):
         """Clear entire cache"""
         self.cache.clear()
         self.hits = 0
         self.misses = 0
-        print("🧹 Cache cleared")
+        logger.info("🧹 Cache cleared")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
@@ -109,6 +242,7 @@ class AnalysisCache:
             'hits': self.hits,
             'misses': self.misses,
             'hit_rate': self.get_hit_rate(),
+            'coalesced': self.coalesced,
             'ttl_seconds': self.ttl_seconds
         }
     
@@ -119,5 +253,9 @@ class AnalysisCache:
 
 
 # Global cache instances
-ingredient_analysis_cache = AnalysisCache(max_size=1000, ttl_seconds=3600)  # 1 hour TTL
-decision_cache = AnalysisCache(max_size=500, ttl_seconds=1800)  # 30 min TTL
+ingredient_analysis_cache = AnalysisCache(max_size=1000, ttl_seconds=3600, name="ingredient_analysis")  # 1 hour TTL
+decision_cache = AnalysisCache(max_size=500, ttl_seconds=1800, name="decision", store_encoded=True)  # 30 min TTL, served as bytes on hits
+vision_cache = AnalysisCache(max_size=500, ttl_seconds=3600, name="vision")  # Label extractions by image fingerprint
+autonomous_cache = AnalysisCache(max_size=200, ttl_seconds=AUTONOMOUS_CACHE_TTL_SECONDS, name="autonomous")  # Whole autonomous runs
+
+ALL_CACHES = (ingredient_analysis_cache, decision_cache, vision_cache, autonomous_cache)
@@ -3,7 +3,7 @@ Comparison Schemas for comparing multiple products
 """
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from app.ai.schemas import DecisionEngineResponse
+from app.ai.schemas import DecisionEngineResponse, LLMUsage
 
 
 class ComparisonRequest(BaseModel):
@@ -21,6 +21,12 @@ class ComparisonInsight(BaseModel):
     key_differences: List[str] = Field(..., description="Top 3 key differences")
 
 
+class RankingNarrative(BaseModel):
+    """Model-written explanation of a ranking"""
+    summary: str = Field(..., description="Why the top product leads and what separates it from the rest")
+    key_differences: List[str] = Field(..., description="Top differences between the leading products")
+
+
 class ComparisonResponse(BaseModel):
     """Response comparing two products"""
     product_a_name: str
@@ -29,3 +35,33 @@ class ComparisonResponse(BaseModel):
     product_b_analysis: DecisionEngineResponse
     comparison_insight: ComparisonInsight
     recommendation: str = Field(..., description="Recommendation based on comparison")
+    usage: Optional[LLMUsage] = Field(None, description="LLM usage for this request (LLM_USAGE_IN_RESPONSE only)")
+
+
+class RankingProduct(BaseModel):
+    """One product to rank"""
+    text: str = Field(..., description="Ingredient/nutrition text for the product")
+    name: Optional[str] = Field(None, description="Optional product name")
+
+
+class RankingRequest(BaseModel):
+    """Request to rank several products"""
+    products: List[RankingProduct] = Field(..., description="Products to rank (at least two)")
+
+
+class RankedProduct(BaseModel):
+    """A product with its position in the ranking"""
+    rank: int
+    name: str
+    score: float = Field(..., description="Decision engine score (higher = better for daily use)")
+    key_signals: List[str]
+    analysis: DecisionEngineResponse
+
+
+class RankingResponse(BaseModel):
+    """Products ordered best-first, with one narrated summary"""
+    ranked_products: List[RankedProduct]
+    summary: str = Field(..., description="One-paragraph narrative of the ranking")
+    key_differences: List[str] = Field(..., description="Top differences between the leading products")
+    failed_products: List[str] = Field(default_factory=list, description="Products that could not be analyzed")
+    usage: Optional[LLMUsage] = Field(None, description="LLM usage for this request (LLM_USAGE_IN_RESPONSE only)")
@@ -1,14 +1,29 @@
 """
 Product Comparison Service
-Compares two products side-by-side
+Compares two products side-by-side, or ranks many
 """
 import asyncio
+import logging
+from typing import List
 from app.ai.coordinator import coordinator
+from app.ai.decision_engine import decision_engine
 from app.ai.schemas import DecisionRequest
-from app.ai.comparison_schemas import ComparisonRequest, ComparisonResponse, ComparisonInsight
-import google.generativeai as genai
+from app.ai.comparison_schemas import (
+    ComparisonRequest,
+    ComparisonResponse,
+    ComparisonInsight,
+    RankingRequest,
+    RankingResponse,
+    RankedProduct,
+    RankingNarrative
+)
+from config.settings import BATCH_CONCURRENCY_PER_KEY, BATCH_MAX_CONCURRENCY
 from app.ai.key_manager import key_manager
-import json
+from app.ai.prompts import COMPARISON, COMPARISON_RECOMMENDATION, RANKING_NARRATIVE
+from app.ai.llm import generate
+from app.ai.structured_output import generate_structured
+
+logger = logging.getLogger(__name__)
 
 
 class ComparisonService:
@@ -23,7 +38,6 @@ class ComparisonService:
             self.use_key_manager = False
             return
         self.use_key_manager = True
-        print("✅ ComparisonService initialized with key_manager (multi-key fallback enabled)")
     
     async def compare_products(self, request: ComparisonRequest) -> ComparisonResponse:
         """
@@ -40,7 +54,7 @@ class ComparisonService:
         product_b_name = request.product_b_name or "Product B"
         
         # Step 1: Analyze both products in PARALLEL
-        print(f"🔍 Comparing: {product_a_name} vs {product_b_name}")
+        logger.info("🔍 Comparing: %s vs %s", product_a_name, product_b_name)
         
         async def analyze_a():
             req = DecisionRequest(text=request.product_a_text)
@@ -91,55 +105,31 @@ class ComparisonService:
                 key_differences=["Unable to generate detailed comparison"]
             )
         
-        prompt = f"""Compare these two food products based on their analyses.
-
-PRODUCT A ({name_a}):
-- Quick Insight: {analysis_a.quick_insight.summary}
-- Key Signals: {', '.join(analysis_a.key_signals[:3])}
-- Intent: {analysis_a.intent_classified}
-
-PRODUCT B ({name_b}):
-- Quick Insight: {analysis_b.quick_insight.summary}
-- Key Signals: {', '.join(analysis_b.key_signals[:3])}
-- Intent: {analysis_b.intent_classified}
-
-Provide a comparison in JSON format:
-{{
-    "winner": "A" or "B" or "Similar" (which is better overall),
-    "summary": "One clear sentence comparing them (max 20 words)",
-    "key_differences": [
-        "First key difference (max 15 words)",
-        "Second key difference (max 15 words)",
-        "Third key difference (max 15 words)"
-    ]
-}}
-
-Focus on practical differences that matter to consumers.
-Be honest if they're similar.
-"""
+        prompt = COMPARISON.render(
+            name_a=name_a,
+            insight_a=analysis_a.quick_insight.summary,
+            signals_a=', '.join(analysis_a.key_signals[:3]),
+            intent_a=analysis_a.intent_classified,
+            name_b=name_b,
+            insight_b=analysis_b.quick_insight.summary,
+            signals_b=', '.join(analysis_b.key_signals[:3]),
+            intent_b=analysis_b.intent_classified
+        )
         
         try:
             async def execute_comparison(model):
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None,
-                    lambda: model.generate_content(
-                        prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            response_mime_type="application/json",
-                            temperature=0.4
-                        )
-                    )
+                return await generate_structured(
+                    model,
+                    prompt,
+                    ComparisonInsight,
+                    temperature=0.4,
+                    agent=COMPARISON.name
                 )
-                return response
-            
-            response = await key_manager.execute_with_fallback(execute_comparison)
             
-            data = json.loads(response.text.strip())
-            return ComparisonInsight(**data)
+            return await key_manager.execute_with_fallback(execute_comparison)
             
         except Exception as e:
-            print(f"Comparison insight generation error: {e}")
+            logger.warning("Comparison insight generation error: %s", e)
             # Fallback
             return ComparisonInsight(
                 winner="Similar",
@@ -164,35 +154,21 @@ Be honest if they're similar.
         if not self.use_key_manager:
             return f"Both products have distinct characteristics. Review the analyses to decide which fits your needs."
         
-        prompt = f"""Based on this comparison, provide a clear, actionable recommendation.
-
-COMPARISON WINNER: {comparison.winner}
-SUMMARY: {comparison.summary}
-KEY DIFFERENCES: {', '.join(comparison.key_differences)}
-
-{name_a} EXPLANATION:
-- Why it matters: {', '.join(analysis_a.explanation.why_this_matters[:2])}
-- When it makes sense: {analysis_a.explanation.when_it_makes_sense}
-
-{name_b} EXPLANATION:
-- Why it matters: {', '.join(analysis_b.explanation.why_this_matters[:2])}
-- When it makes sense: {analysis_b.explanation.when_it_makes_sense}
-
-Provide a recommendation (2-3 sentences, max 50 words total) that:
-1. States which is better and why
-2. Mentions when the other might be preferable
-3. Uses clear, consumer-friendly language
-
-Return ONLY the recommendation text, no JSON.
-"""
+        prompt = COMPARISON_RECOMMENDATION.render(
+            winner=comparison.winner,
+            summary=comparison.summary,
+            key_differences=', '.join(comparison.key_differences),
+            name_a=name_a,
+            why_a=', '.join(analysis_a.explanation.why_this_matters[:2]),
+            when_a=analysis_a.explanation.when_it_makes_sense,
+            name_b=name_b,
+            why_b=', '.join(analysis_b.explanation.why_this_matters[:2]),
+            when_b=analysis_b.explanation.when_it_makes_sense
+        )
         
         try:
             async def execute_recommendation(model):
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None,
-                    lambda: model.generate_content(prompt)
-                )
+                response = await generate(model, prompt, agent=COMPARISON_RECOMMENDATION.name)
                 return response
             
             response = await key_manager.execute_with_fallback(execute_recommendation)
@@ -200,7 +176,7 @@ Return ONLY the recommendation text, no JSON.
             return response.text.strip()
             
         except Exception as e:
-            print(f"Recommendation generation error: {e}")
+            logger.warning("Recommendation generation error: %s", e)
             if comparison.winner == "A":
                 return f"{name_a} appears to be the better choice overall. However, {name_b} may be preferable depending on your specific needs."
             elif comparison.winner == "B":
@@ -208,6 +184,104 @@ Return ONLY the recommendation text, no JSON.
             else:
                 return f"Both products are comparable. Choose based on your personal preferences and dietary goals."
 
+    
+    async def rank_products(self, request: RankingRequest) -> RankingResponse:
+        """
+        Rank many products best-first.
+        
+        Steps:
+        1. Analyze every product with the decision engine (cached, bounded concurrency)
+        2. Order locally by the rule-based decision score - no LLM involved
+        3. One LLM call narrates the top differences
+        """
+        names = [product.name or f"Product {i + 1}" for i, product in enumerate(request.products)]
+        logger.info("🏁 Ranking %s products", len(names))
+        
+        limit = key_manager.recommended_concurrency(
+            per_key=BATCH_CONCURRENCY_PER_KEY,
+            maximum=BATCH_MAX_CONCURRENCY
+        ) if key_manager else 1
+        semaphore = asyncio.Semaphore(limit)
+        
+        async def analyze(text: str):
+            async with semaphore:
+                return await coordinator.process(DecisionRequest(text=text))
+        
+        results = await asyncio.gather(
+            *(analyze(product.text) for product in request.products),
+            return_exceptions=True
+        )
+        
+        ranked, failed = [], []
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.warning("Ranking analysis failed for %s: %s", name, result)
+                failed.append(name)
+                continue
+            # Re-running the rules locally is cheap and gives the numeric score
+            score = decision_engine.decide(result.structured_analysis).score if result.structured_analysis else 0.0
+            ranked.append((name, score, result))
+        
+        # Stable sort keeps input order for ties
+        ranked.sort(key=lambda entry: entry[1], reverse=True)
+        ranked_products = [
+            RankedProduct(rank=i + 1, name=name, score=score, key_signals=analysis.key_signals, analysis=analysis)
+            for i, (name, score, analysis) in enumerate(ranked)
+        ]
+        
+        summary, key_differences = await self._generate_ranking_narrative(ranked_products)
+        
+        return RankingResponse(
+            ranked_products=ranked_products,
+            summary=summary,
+            key_differences=key_differences,
+            failed_products=failed
+        )
+    
+    async def _generate_ranking_narrative(self, ranked: List[RankedProduct]) -> tuple:
+        """Single LLM call narrating why the leaders lead (local fallback on failure)"""
+        if not ranked:
+            return "None of the products could be analyzed.", []
+        
+        top, bottom = ranked[0], ranked[-1]
+        fallback_summary = (
+            f"{top.name} ranks highest (score {top.score:g})"
+            + (f" and {bottom.name} lowest (score {bottom.score:g})." if len(ranked) > 1 else ".")
+        )
+        fallback_differences = [
+            f"{product.name}: {product.key_signals[0] if product.key_signals else 'No data'}"
+            for product in ranked[:3]
+        ]
+        
+        if not self.use_key_manager or len(ranked) < 2:
+            return fallback_summary, fallback_differences
+        
+        # Leaders plus the last place keep the prompt small however long the shelf is
+        shown = ranked[:5] + ([bottom] if len(ranked) > 5 else [])
+        lines = "\n".join(
+            f"{p.rank}. {p.name} (score {p.score:g}): {', '.join(p.key_signals[:3])}"
+            for p in shown
+        )
+        
+        prompt = RANKING_NARRATIVE.render(count=len(ranked), lines=lines)
+        
+        try:
+            async def execute_narrative(model):
+                return await generate_structured(
+                    model,
+                    prompt,
+                    RankingNarrative,
+                    temperature=0.4,
+                    agent=RANKING_NARRATIVE.name
+                )
+            
+            narrative = await key_manager.execute_with_fallback(execute_narrative)
+            return narrative.summary or fallback_summary, narrative.key_differences or fallback_differences
+            
+        except Exception as e:
+            logger.warning("Ranking narrative generation error: %s", e)
+            return fallback_summary, fallback_differences
+
 
 # Singleton instance
 comparison_service = ComparisonService()
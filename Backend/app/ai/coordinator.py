@@ -2,6 +2,8 @@
 Multi-Agent Coordinator
 Orchestrates the decision engine workflow with caching
 """
+import logging
+from typing import Union
 from app.ai.intent_classifier import intent_classifier
 from app.ai.ingredient_interpreter import ingredient_interpreter
 from app.ai.decision_engine import decision_engine
@@ -9,7 +11,13 @@ from app.ai.explanation_agent import explanation_agent
 from app.ai.ingredient_translator import ingredient_translator
 from app.ai.service import ai_service
 from app.ai.schemas import DecisionRequest, DecisionEngineResponse, QuickInsight
-from app.ai.cache import decision_cache
+from app.ai.cache import EncodedResult, decision_cache
+from app.ai.near_duplicate import near_duplicate_index
+from app.ai.progress import report_progress
+from app.ai.tracing import span
+
+logger = logging.getLogger(__name__)
+
 
 class DecisionEngineCoordinator:
     """
@@ -17,16 +25,41 @@ class DecisionEngineCoordinator:
     Flow: Intent Classification -> Ingredient Interpretation -> Decision -> Explanation + Translation
     """
     
-    async def process(self, request: DecisionRequest, conversation_context: str = None) -> DecisionEngineResponse:
+    async def process(
+        self,
+        request: DecisionRequest,
+        conversation_context: str = None,
+        encoded: bool = False
+    ) -> Union[DecisionEngineResponse, EncodedResult]:
         """
         Main orchestration method with parallel processing optimization and caching.
+        
+        With encoded=True, a result in the exact cache (a hit, or one just
+        computed and stored) comes back as its stored JSON bytes and ETag
+        instead of a model, for endpoints that send them as the response body
+        unchanged.
         """
         # Check cache first (skip if conversation context is provided for personalized responses)
         if not conversation_context and not request.conversation_context:
-            cached_result = decision_cache.get(request.text)
-            if cached_result:
-                print(f"⚡ Returning cached decision for: {request.text[:50]}...")
-                return DecisionEngineResponse(**cached_result)
+            if encoded:
+                cached_body = decision_cache.get_encoded(request.text)
+                if cached_body is not None:
+                    logger.debug("⚡ Returning cached decision bytes for: %.50s...", request.text)
+                    return cached_body
+            else:
+                cached_result = decision_cache.get(request.text)
+                if cached_result:
+                    logger.debug("⚡ Returning cached decision for: %.50s...", request.text)
+                    return DecisionEngineResponse(**cached_result)
+            
+            # Nutrition info changes the verdict, so only plain ingredient lists are reused
+            if not request.include_nutrition:
+                with span("near_duplicate_lookup"):
+                    match = near_duplicate_index.lookup(request.text, decision_cache.peek)
+                if match:
+                    cached_result, similarity, tokens = match
+                    logger.info("♻️ Reusing near-duplicate decision (Jaccard %.2f, hit rate: %.1f%%)", similarity, 100 * near_duplicate_index.get_hit_rate())
+                    return self._adapt_near_duplicate(cached_result, request, similarity, len(tokens))
         
         # Use conversation context from request if available, otherwise use parameter
         context = request.conversation_context or conversation_context
@@ -42,26 +75,39 @@ class DecisionEngineCoordinator:
         
         async def classify_intent_task():
             """Task wrapper for intent classification"""
-            if request.user_intent:
-                return request.user_intent
-            return await intent_classifier.classify(intent_text)
+            with span("stage.intent"):
+                if request.user_intent:
+                    intent = request.user_intent
+                else:
+                    intent = await intent_classifier.classify(intent_text)
+            report_progress("stage_complete", stage="intent", result={"intent_classified": intent})
+            return intent
         
         async def legacy_analysis_task():
             """Task wrapper for legacy insight generation"""
             try:
-                return await ai_service.analyze_text(request.text)
+                with span("stage.quick_insight"):
+                    analysis = await ai_service.analyze_text(request.text)
+                report_progress("stage_complete", stage="quick_insight", result={
+                    "quick_insight": {"summary": analysis.insight, "uncertainty_reason": analysis.uncertainty_note}
+                })
+                return analysis
             except Exception as e:
-                print(f"Legacy insight generation failed: {e}")
+                logger.warning("Legacy insight generation failed: %s", e)
                 return None
         
         async def interpret_ingredients_task():
             """Task wrapper for ingredient interpretation"""
-            return await ingredient_interpreter.interpret(
-                ingredient_text=request.text,
-                nutrition_info=request.include_nutrition
-            )
+            with span("stage.interpretation"):
+                analysis = await ingredient_interpreter.interpret(
+                    ingredient_text=request.text,
+                    nutrition_info=request.include_nutrition
+                )
+            report_progress("stage_complete", stage="interpretation", result={"structured_analysis": analysis.dict()})
+            return analysis
         
         # Execute all three tasks in parallel
+        report_progress("stage_start", stage="analysis", message="Classifying intent and interpreting ingredients...")
         intent, legacy_analysis, structured_analysis = await asyncio.gather(
             classify_intent_task(),
             legacy_analysis_task(),
@@ -69,10 +115,16 @@ class DecisionEngineCoordinator:
         )
         
         # Step 4: Apply rule-based decision engine (depends on structured_analysis)
-        decision = decision_engine.decide(structured_analysis)
+        report_progress("stage_start", stage="decision", message="Applying decision rules...")
+        with span("stage.decision"):
+            decision = decision_engine.decide(structured_analysis)
+        report_progress("stage_complete", stage="decision", result={"key_signals": decision.key_signals})
         
         # Step 5: Generate consumer-friendly explanation (depends on decision)
-        explanation = await explanation_agent.explain(decision)
+        report_progress("stage_start", stage="explanation", message="Explaining what matters...")
+        with span("stage.explanation"):
+            explanation = await explanation_agent.explain(decision)
+        report_progress("stage_complete", stage="explanation", result={"explanation": explanation.dict()})
         
         # Step 6: Use legacy insight as headline, or generate quick insight as fallback
         if legacy_analysis and legacy_analysis.insight:
@@ -81,10 +133,16 @@ class DecisionEngineCoordinator:
                 uncertainty_reason=legacy_analysis.uncertainty_note
             )
         else:
-            quick_insight = await explanation_agent.generate_quick_insight(decision, structured_analysis)
+            with span("stage.quick_insight_fallback"):
+                quick_insight = await explanation_agent.generate_quick_insight(decision, structured_analysis)
         
         # Step 7: Translate complex ingredients
-        ingredient_translations = await ingredient_translator.translate_ingredients(request.text)
+        report_progress("stage_start", stage="translation", message="Translating complex ingredients...")
+        with span("stage.translation"):
+            ingredient_translations = await ingredient_translator.translate_ingredients(request.text)
+        report_progress("stage_complete", stage="translation", result={
+            "ingredient_translations": [t.dict() for t in ingredient_translations]
+        })
         
         # Create response
         response = DecisionEngineResponse(
@@ -100,9 +158,39 @@ class DecisionEngineCoordinator:
         # Store in cache (skip if conversation context is provided for personalized responses)
         if not conversation_context and not request.conversation_context:
             decision_cache.set(request.text, response.dict())
-            print(f"💾 Cached decision for: {request.text[:50]}...")
+            if not request.include_nutrition:
+                near_duplicate_index.add(request.text)
+            logger.debug("💾 Cached decision for: %.50s...", request.text)
+            if encoded:
+                return decision_cache.peek_encoded(request.text) or response
         
         return response
+    
+    @staticmethod
+    def _adapt_near_duplicate(
+        cached_result: dict,
+        request: DecisionRequest,
+        similarity: float,
+        ingredient_count: int
+    ) -> DecisionEngineResponse:
+        """
+        Reuse a near-identical product's analysis, recomputing only what can be
+        derived locally: ingredient count, rule-based signals, the requested
+        intent and which ingredient translations apply.
+        """
+        response = DecisionEngineResponse(**cached_result)
+        if response.structured_analysis:
+            response.structured_analysis.ingredient_summary.ingredient_count = ingredient_count
+            response.key_signals = decision_engine.decide(response.structured_analysis).key_signals
+        if request.user_intent:
+            response.intent_classified = request.user_intent
+        text = request.text.lower()
+        response.ingredient_translations = [
+            t for t in response.ingredient_translations if t.term.lower() in text
+        ]
+        response.near_duplicate = True
+        response.near_duplicate_similarity = round(similarity, 3)
+        return response
 
 coordinator = DecisionEngineCoordinator()
 
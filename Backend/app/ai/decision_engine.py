@@ -2,96 +2,182 @@
 Rule-based Decision Engine
 Takes structured signals and makes decisions
 """
-from app.ai.schemas import StructuredIngredientAnalysis, Decision
+from typing import List, Sequence
+from app.ai.schemas import StructuredIngredientAnalysis, Decision, RuleContribution
+
+# Rule tables: category -> (score contribution, signal shown to the user or None)
+PROCESSING_RULE = {
+    "low": (3.0, "Minimally processed"),
+    "moderate": (1.0, "Moderately processed"),
+    "high": (-2.0, "Highly processed"),
+}
+SUGAR_DOMINANT_RULE = {
+    True: (-2.0, "Sugar-dominant formulation"),
+    False: (1.0, None),
+}
+ADDED_SUGARS_RULE = {
+    True: (-1.5, "Contains added sugars"),
+    False: (0.0, None),
+}
+FIBER_PROTEIN_RULE = {
+    "none": (-1.0, "No fiber/protein support"),
+    "weak": (-0.5, "Weak fiber/protein support"),
+    "moderate": (1.0, "Moderate fiber/protein support"),
+    "strong": (2.0, "Strong fiber/protein support"),
+}
+ENERGY_RULE = {
+    "rapid": (-1.0, "Rapid energy release"),
+    "mixed": (0.5, None),
+    "slow": (1.5, "Slow energy release"),
+}
+SATIETY_RULE = {
+    "low": (-0.5, "Low satiety support"),
+    "moderate": (0.5, None),
+    "high": (1.5, "High satiety support"),
+}
+ULTRA_PROCESSED_MARKER_WEIGHT = -0.5
+SIMPLE_INGREDIENT_COUNT = 5  # At or below: +0.5
+HIGH_INGREDIENT_COUNT = 15  # Above: -0.5
+
+# Column order of the feature matrix used for batch scoring
+FEATURE_COLUMNS = (
+    "processing_level",
+    "ultra_processed_markers",
+    "sugar_dominant",
+    "added_sugars_present",
+    "fiber_protein_support",
+    "energy_release_pattern",
+    "satiety_support",
+    "ingredient_count",
+)
+PROCESSING_LEVELS = ("low", "moderate", "high")
+FIBER_PROTEIN_LEVELS = ("none", "weak", "moderate", "strong")
+ENERGY_LEVELS = ("rapid", "mixed", "slow")
+SATIETY_LEVELS = ("low", "moderate", "high")
+
 
 class DecisionEngine:
     """
     Transparent, rule-based decision engine.
     Processes structured ingredient analysis and produces verdicts.
     """
-    
+
     def decide(self, analysis: StructuredIngredientAnalysis) -> Decision:
         """
         Apply rules to structured analysis and produce a decision.
+        Every rule's contribution is reported; key signals are the most
+        impactful ones by absolute contribution.
         """
-        signals = []
-        score = 0  # Higher = better for daily use
-        
+        summary = analysis.ingredient_summary
+        properties = analysis.food_properties
+        contributions: List[RuleContribution] = []
+
+        def apply(rule: str, outcome: tuple):
+            contribution, signal = outcome
+            contributions.append(RuleContribution(rule=rule, contribution=contribution, signal=signal))
+
         # Rule 1: Processing Level
-        if analysis.ingredient_summary.processing_level == "low":
-            score += 3
-            signals.append("Minimally processed")
-        elif analysis.ingredient_summary.processing_level == "moderate":
-            score += 1
-            signals.append("Moderately processed")
-        else:  # high
-            score -= 2
-            signals.append("Highly processed")
-        
+        apply("processing_level", PROCESSING_RULE[summary.processing_level])
+
         # Rule 2: Ultra-processed markers
-        if len(analysis.ingredient_summary.ultra_processed_markers) > 0:
-            score -= len(analysis.ingredient_summary.ultra_processed_markers) * 0.5
-            signals.append(f"Contains {len(analysis.ingredient_summary.ultra_processed_markers)} ultra-processed marker(s)")
-        
+        marker_count = len(summary.ultra_processed_markers)
+        apply("ultra_processed_markers", (
+            marker_count * ULTRA_PROCESSED_MARKER_WEIGHT,
+            f"Contains {marker_count} ultra-processed marker(s)" if marker_count else None
+        ))
+
         # Rule 3: Sugar dominance
-        if analysis.food_properties.sugar_dominant:
-            score -= 2
-            signals.append("Sugar-dominant formulation")
-        else:
-            score += 1
-        
+        apply("sugar_dominant", SUGAR_DOMINANT_RULE[properties.sugar_dominant])
+
         # Rule 4: Added sugars
-        if analysis.ingredient_summary.added_sugars_present:
-            score -= 1.5
-            signals.append("Contains added sugars")
-        
+        apply("added_sugars", ADDED_SUGARS_RULE[summary.added_sugars_present])
+
         # Rule 5: Fiber/Protein support
-        if analysis.food_properties.fiber_protein_support == "strong":
-            score += 2
-            signals.append("Strong fiber/protein support")
-        elif analysis.food_properties.fiber_protein_support == "moderate":
-            score += 1
-            signals.append("Moderate fiber/protein support")
-        elif analysis.food_properties.fiber_protein_support == "weak":
-            score -= 0.5
-            signals.append("Weak fiber/protein support")
-        else:  # none
-            score -= 1
-            signals.append("No fiber/protein support")
-        
+        apply("fiber_protein_support", FIBER_PROTEIN_RULE[properties.fiber_protein_support])
+
         # Rule 6: Energy release pattern
-        if analysis.food_properties.energy_release_pattern == "slow":
-            score += 1.5
-            signals.append("Slow energy release")
-        elif analysis.food_properties.energy_release_pattern == "mixed":
-            score += 0.5
-        else:  # rapid
-            score -= 1
-            signals.append("Rapid energy release")
-        
+        apply("energy_release_pattern", ENERGY_RULE[properties.energy_release_pattern])
+
         # Rule 7: Satiety support
-        if analysis.food_properties.satiety_support == "high":
-            score += 1.5
-            signals.append("High satiety support")
-        elif analysis.food_properties.satiety_support == "moderate":
-            score += 0.5
-        else:  # low
-            score -= 0.5
-            signals.append("Low satiety support")
-        
+        apply("satiety_support", SATIETY_RULE[properties.satiety_support])
+
         # Rule 8: Ingredient count (simpler = generally better)
-        if analysis.ingredient_summary.ingredient_count <= 5:
-            score += 0.5
-        elif analysis.ingredient_summary.ingredient_count > 15:
-            score -= 0.5
-            signals.append("High ingredient count")
-        
-        # Keep top 3 most impactful signals
-        key_signals = signals[:3] if len(signals) <= 3 else signals[:3]
-        
+        if summary.ingredient_count <= SIMPLE_INGREDIENT_COUNT:
+            apply("ingredient_count", (0.5, None))
+        elif summary.ingredient_count > HIGH_INGREDIENT_COUNT:
+            apply("ingredient_count", (-0.5, "High ingredient count"))
+        else:
+            apply("ingredient_count", (0.0, None))
+
+        score = sum(c.contribution for c in contributions)
+
+        # Keep top 3 most impactful signals (stable sort keeps rule order for ties)
+        ranked = sorted(
+            (c for c in contributions if c.signal),
+            key=lambda c: abs(c.contribution),
+            reverse=True
+        )
+        key_signals = [c.signal for c in ranked[:3]]
+
         return Decision(
-            key_signals=key_signals
+            key_signals=key_signals,
+            score=score,
+            contributions=contributions
         )
 
-decision_engine = DecisionEngine()
+    def encode_batch(self, analyses: Sequence[StructuredIngredientAnalysis]):
+        """
+        Encode analyses into an int32 feature matrix (one row per product,
+        columns in FEATURE_COLUMNS order) for score_features.
+        """
+        import numpy as np
+
+        processing = {level: i for i, level in enumerate(PROCESSING_LEVELS)}
+        fiber_protein = {level: i for i, level in enumerate(FIBER_PROTEIN_LEVELS)}
+        energy = {level: i for i, level in enumerate(ENERGY_LEVELS)}
+        satiety = {level: i for i, level in enumerate(SATIETY_LEVELS)}
+
+        features = np.empty((len(analyses), len(FEATURE_COLUMNS)), dtype=np.int32)
+        for row, analysis in enumerate(analyses):
+            summary = analysis.ingredient_summary
+            properties = analysis.food_properties
+            features[row] = (
+                processing[summary.processing_level],
+                len(summary.ultra_processed_markers),
+                properties.sugar_dominant,
+                summary.added_sugars_present,
+                fiber_protein[properties.fiber_protein_support],
+                energy[properties.energy_release_pattern],
+                satiety[properties.satiety_support],
+                summary.ingredient_count,
+            )
+        return features
 
+    def score_features(self, features):
+        """
+        Score a feature matrix in one vectorized pass.
+        Produces the same totals as decide() for every row.
+        """
+        import numpy as np
+
+        def weights(rule: dict, levels: Sequence) -> "np.ndarray":
+            return np.array([rule[level][0] for level in levels], dtype=np.float64)
+
+        features = np.asarray(features)
+        counts = features[:, 7]
+        return (
+            weights(PROCESSING_RULE, PROCESSING_LEVELS)[features[:, 0]]
+            + features[:, 1] * ULTRA_PROCESSED_MARKER_WEIGHT
+            + weights(SUGAR_DOMINANT_RULE, (False, True))[features[:, 2]]
+            + weights(ADDED_SUGARS_RULE, (False, True))[features[:, 3]]
+            + weights(FIBER_PROTEIN_RULE, FIBER_PROTEIN_LEVELS)[features[:, 4]]
+            + weights(ENERGY_RULE, ENERGY_LEVELS)[features[:, 5]]
+            + weights(SATIETY_RULE, SATIETY_LEVELS)[features[:, 6]]
+            + np.where(counts <= SIMPLE_INGREDIENT_COUNT, 0.5, np.where(counts > HIGH_INGREDIENT_COUNT, -0.5, 0.0))
+        )
+
+    def score_batch(self, analyses: Sequence[StructuredIngredientAnalysis]):
+        """Score many analyses at once (for catalogue ranking and offline jobs)"""
+        return self.score_features(self.encode_batch(analyses))
+
+decision_engine = DecisionEngine()
@@ -0,0 +1,116 @@
+"""
+Image Preprocessing Pipeline
+Decodes each upload once, off the event loop, into a compact label-legible image
+"""
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+from app.ai.cache import fingerprint_bytes
+from config.settings import IMAGE_MAX_DIMENSION, IMAGE_OUTPUT_FORMAT, IMAGE_QUALITY, IMAGE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedImage:
+    """
+    An upload that has been decoded, oriented, downscaled and re-encoded.
+    Shared by every vision call for the same request.
+    """
+
+    def __init__(self, data: bytes, mime_type: str, width: int, height: int, original_size: int, fingerprint: str):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_size = original_size
+        self.fingerprint = fingerprint  # SHA-256 of the original upload bytes
+
+    def as_part(self) -> Dict[str, Any]:
+        """Inline blob for generate_content (no re-encoding by the SDK)"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def __repr__(self) -> str:
+        return (
+            f"PreparedImage({self.width}x{self.height}, {self.mime_type}, "
+            f"{self.original_size} -> {len(self.data)} bytes)"
+        )
+
+
+# Dedicated pool so image work never queues behind blocking LLM calls
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-prep")
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+_EXIF_ORIENTATION = 0x0112
+
+
+def prepare_image(raw: bytes) -> PreparedImage:
+    """
+    Decode an uploaded image once and produce a compact copy for vision calls.
+
+    - Applies EXIF orientation so rotated phone photos read upright
+    - Downscales so the longest side is at most IMAGE_MAX_DIMENSION
+    - Re-encodes to IMAGE_OUTPUT_FORMAT, keeping the original if it is already smaller
+
+    Raises:
+        ValueError: If the bytes are not a decodable image (including truncated
+            pixel data and decompression bombs)
+    """
+    import PIL.Image
+    import PIL.ImageOps
+
+    try:
+        image = PIL.Image.open(io.BytesIO(raw))
+        original_format = image.format
+        original_dimension = max(image.size)
+        # Let the JPEG decoder skip detail we'd throw away anyway
+        image.draft("RGB", (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        # PIL decodes lazily: force it here so truncated or corrupt pixel data fails as a bad upload
+        image.load()
+        was_rotated = image.getexif().get(_EXIF_ORIENTATION, 1) != 1
+        oriented = PIL.ImageOps.exif_transpose(image)
+    except (PIL.UnidentifiedImageError, PIL.Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"Could not decode image: {e}")
+
+    needs_resize = original_dimension > IMAGE_MAX_DIMENSION
+
+    if oriented.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white so labels stay readable in JPEG
+        rgba = oriented.convert("RGBA")
+        background = PIL.Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        oriented = background
+    elif oriented.mode not in ("RGB", "L"):
+        oriented = oriented.convert("RGB")
+
+    if max(oriented.size) > IMAGE_MAX_DIMENSION:
+        oriented.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), PIL.Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    oriented.save(buffer, format=IMAGE_OUTPUT_FORMAT, quality=IMAGE_QUALITY, optimize=True)
+    data = buffer.getvalue()
+    mime_type = _MIME_TYPES.get(IMAGE_OUTPUT_FORMAT, "image/jpeg")
+
+    # Already compact and upright: sending the original is cheaper than our re-encode
+    if not needs_resize and not was_rotated and original_format in _MIME_TYPES and len(raw) <= len(data):
+        data = raw
+        mime_type = _MIME_TYPES[original_format]
+
+    width, height = oriented.size
+    return PreparedImage(
+        data=data,
+        mime_type=mime_type,
+        width=width,
+        height=height,
+        original_size=len(raw),
+        fingerprint=fingerprint_bytes(raw)
+    )
+
+
+async def prepare_image_async(raw: bytes) -> PreparedImage:
+    """Run prepare_image in the image worker pool, keeping the event loop free"""
+    loop = asyncio.get_running_loop()
+    prepared = await loop.run_in_executor(_image_executor, prepare_image, raw)
+    logger.info("🖼️ Prepared image: %s", prepared)
+    return prepared
@@ -2,10 +2,15 @@
 User Intent Classifier Agent
 Very lightweight classification before processing
 """
-import google.generativeai as genai
-import json
+import logging
 from typing import Literal
 from app.ai.key_manager import key_manager
+from app.ai.schemas import IntentClassification
+from app.ai.structured_output import generate_structured
+from app.ai.prompts import INTENT_CLASSIFIER
+
+logger = logging.getLogger(__name__)
+
 
 class IntentClassifier:
     def __init__(self):
@@ -23,55 +28,23 @@ class IntentClassifier:
             # Default to curiosity if AI not available
             return "curiosity"
 
-        prompt = f"""
-Classify the user's intent from this input:
-
-"{user_input}"
-
-Return ONLY a JSON object with this exact structure:
-{{
-    "intent": "quick_yes_no | comparison | risk_check | curiosity"
-}}
-
-Intent definitions:
-- quick_yes_no: Simple yes/no questions like "Is this healthy?", "Should I eat this?"
-- comparison: Comparing products or asking "better than X?"
-- risk_check: Asking about risks, allergies, concerns, "Is this safe?"
-- curiosity: General questions, "What's in this?", "Tell me about this"
-
-Return JSON only, no other text.
-"""
+        prompt = INTENT_CLASSIFIER.render(user_input=user_input)
 
         try:
             # Use key manager with automatic fallback
             async def classify_with_model(model):
-                import asyncio
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None,
-                    lambda: model.generate_content(
-                        prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            response_mime_type="application/json",
-                            temperature=0.1  # Low temperature for deterministic classification
-                        )
-                    )
+                return await generate_structured(
+                    model,
+                    prompt,
+                    IntentClassification,
+                    temperature=0.1,  # Low temperature for deterministic classification
+                    agent=INTENT_CLASSIFIER.name
                 )
-                return response
-            
-            response = await key_manager.execute_with_fallback(classify_with_model)
-            
-            data = json.loads(response.text.strip())
-            intent = data.get("intent", "curiosity")
-            
-            # Validate intent
-            valid_intents = ["quick_yes_no", "comparison", "risk_check", "curiosity"]
-            if intent not in valid_intents:
-                return "curiosity"
             
-            return intent
+            classification = await key_manager.execute_with_fallback(classify_with_model)
+            return classification.intent
         except Exception as e:
-            print(f"Intent classification error: {e}")
+            logger.warning("Intent classification error: %s", e)
             return "curiosity"  # Default fallback
 
 intent_classifier = IntentClassifier()
@@ -2,12 +2,34 @@
 Gemini API Key Manager
 Handles automatic fallback and rotation across multiple API keys
 """
-import google.generativeai as genai
+from app.ai.model_backend import create_model
+from app.ai.tracing import span
+from app.ai.metrics import key_requests, key_errors
 from config.settings import GEMINI_API_KEYS
 from typing import Optional, Callable, Any
 import asyncio
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
+# Error fragments that mean the key (not the request) is the problem
+KEY_ISSUE_TERMS = (
+    'rate limit',
+    'quota',
+    'resource exhausted',
+    '429',
+    'too many requests',
+    'invalid api key',
+    'api_key_invalid'
+)
+
+
+def is_key_issue(error: Exception) -> bool:
+    """Whether an error was caused by a rate limit, exhausted quota or bad key"""
+    error_message = str(error).lower()
+    return any(term in error_message for term in KEY_ISSUE_TERMS)
+
 
 class GeminiKeyManager:
     """
@@ -29,7 +51,7 @@ class GeminiKeyManager:
         if not self.api_keys:
             raise ValueError("No API keys provided to GeminiKeyManager")
         
-        print(f"🔑 GeminiKeyManager initialized with {len(self.api_keys)} key(s)")
+        logger.info("🔑 GeminiKeyManager initialized with %d key(s)", len(self.api_keys))
     
     def get_current_key(self) -> str:
         """Get the currently active API key"""
@@ -48,7 +70,7 @@ class GeminiKeyManager:
             self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
         
         # All keys failed recently - use the oldest failure
-        print("⚠️ All API keys failed recently. Using least-recently-failed key...")
+        logger.warning("⚠️ All API keys failed recently. Using least-recently-failed key...")
         oldest_failure_idx = min(self.failed_keys.keys(), key=lambda k: self.failed_keys[k])
         self.current_key_index = oldest_failure_idx
         del self.failed_keys[oldest_failure_idx]  # Give it another chance
@@ -62,20 +84,19 @@ class GeminiKeyManager:
         self.failed_keys[key_index] = time.time()
         next_index = (key_index + 1) % len(self.api_keys)
         
-        print(f"❌ API Key #{key_index + 1} failed. Rotating to key #{next_index + 1}...")
+        logger.warning("❌ API Key #%d failed. Rotating to key #%d...", key_index + 1, next_index + 1)
         self.current_key_index = next_index
     
-    def create_model(self, model_name: str = 'gemini-2.5-flash'):
-        """Create a GenerativeModel with the current API key"""
-        current_key = self.get_current_key()
-        genai.configure(api_key=current_key)
-        return genai.GenerativeModel(model_name)
+    def create_model(self, model_name: str = 'gemini-2.5-flash', system_instruction: Optional[str] = None):
+        """Create a model (per MODEL_BACKEND) with the current API key"""
+        return create_model(model_name, self.get_current_key(), system_instruction)
     
     async def execute_with_fallback(
         self, 
         func: Callable, 
         *args, 
         max_retries: int = None,
+        system_instruction: Optional[str] = None,
         **kwargs
     ) -> Any:
         """
@@ -84,6 +105,7 @@ class GeminiKeyManager:
         Args:
             func: The function to execute (can be sync or async)
             max_retries: Maximum number of keys to try (default: all keys)
+            system_instruction: System instruction for the model passed to func
             *args, **kwargs: Arguments to pass to func
         
         Returns:
@@ -99,47 +121,39 @@ class GeminiKeyManager:
         
         for attempt in range(max_retries):
             try:
-                # Get fresh model with current key
-                model = self.create_model()
-                
-                # Execute the function
-                if asyncio.iscoroutinefunction(func):
-                    result = await func(model, *args, **kwargs)
-                else:
-                    result = func(model, *args, **kwargs)
+                key_requests.inc(str(self.current_key_index + 1))
+                with span("key_attempt", attempt=attempt, key_index=self.current_key_index):
+                    # Get fresh model with current key
+                    model = self.create_model(system_instruction=system_instruction)
+                    
+                    # Execute the function
+                    if asyncio.iscoroutinefunction(func):
+                        result = await func(model, *args, **kwargs)
+                    else:
+                        result = func(model, *args, **kwargs)
                 
                 # Success!
                 if attempt > 0:
-                    print(f"✅ Succeeded with API Key #{self.current_key_index + 1} after {attempt} fallback(s)")
+                    logger.info("✅ Succeeded with API Key #%d after %d fallback(s)", self.current_key_index + 1, attempt)
                 
                 return result
                 
             except Exception as e:
-                error_message = str(e).lower()
-                
                 # Check if it's a rate limit / quota error
-                is_key_issue = any(term in error_message for term in [
-                    'rate limit',
-                    'quota',
-                    'resource exhausted',
-                    '429',
-                    'too many requests',
-                    'invalid api key',
-                    'api_key_invalid'
-                ])
-                
-                if is_key_issue:
-                    print(f"⚠️ API Key #{self.current_key_index + 1} hit limit: {str(e)[:100]}")
+                key_issue = is_key_issue(e)
+                key_errors.inc(str(self.current_key_index + 1), "quota" if key_issue else "other")
+                if key_issue:
+                    logger.warning("⚠️ API Key #%d hit limit: %.100s", self.current_key_index + 1, e)
                     self.mark_key_failed()
                     last_exception = e
                     
                     # If we have more keys to try, continue
                     if attempt < max_retries - 1:
-                        print(f"🔄 Retrying with next API key...")
+                        logger.info("🔄 Retrying with next API key...")
                         continue
                 else:
                     # Not a key issue - probably a real error (bad input, etc.)
-                    print(f"❌ Non-key error: {str(e)[:200]}")
+                    logger.error("❌ Non-key error: %.200s", e)
                     raise e
         
         # All keys failed
@@ -147,6 +161,23 @@ class GeminiKeyManager:
             f"All {max_retries} API key(s) failed. Last error: {last_exception}"
         )
     
+    def available_key_count(self) -> int:
+        """Number of keys not currently in their failure cooldown"""
+        current_time = time.time()
+        cooling = sum(
+            1 for timestamp in self.failed_keys.values()
+            if current_time - timestamp < self.cooldown_period
+        )
+        return len(self.api_keys) - cooling
+    
+    def recommended_concurrency(self, per_key: int = 2, maximum: int = None) -> int:
+        """
+        How many pipelines can run at once without overrunning key quotas:
+        per_key concurrent pipelines for every key that is not cooling down.
+        """
+        concurrency = max(1, self.available_key_count() * per_key)
+        return min(concurrency, maximum) if maximum else concurrency
+    
     def get_stats(self) -> dict:
         """Get statistics about key usage"""
         return {
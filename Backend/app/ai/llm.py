@@ -0,0 +1,44 @@
+"""
+LLM Call Helper
+Single place where agents run generate_content off the event loop
+"""
+import asyncio
+import time
+from typing import Any
+from app.ai.tracing import span, record_span
+from app.ai.metrics import llm_call_duration, llm_executor_wait, llm_errors, llm_in_flight
+from app.ai.usage import record_usage
+
+
+async def generate(model: Any, contents: Any, generation_config: Any = None, agent: str = "llm") -> Any:
+    """
+    Run model.generate_content in the default executor.
+
+    Traced as 'llm.<agent>', with a child 'executor_wait' span for the time
+    the call sat queued before a worker thread picked it up; both durations
+    also feed the per-agent latency histograms. Token usage is recorded
+    per agent and for the current request.
+    """
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+    picked_up = []
+
+    def call():
+        picked_up.append(time.perf_counter())
+        return model.generate_content(contents, generation_config=generation_config)
+
+    llm_in_flight.inc()
+    with span(f"llm.{agent}", model=getattr(model, "model_name", "")):
+        try:
+            response = await loop.run_in_executor(None, call)
+            record_usage(agent, contents, response)
+            return response
+        except Exception:
+            llm_errors.inc(agent)
+            raise
+        finally:
+            llm_in_flight.dec()
+            llm_call_duration.observe(time.perf_counter() - submitted, agent)
+            if picked_up:
+                llm_executor_wait.observe(picked_up[0] - submitted, agent)
+                record_span("executor_wait", submitted, picked_up[0])
@@ -0,0 +1,270 @@
+"""
+Prometheus Metrics
+Counters, gauges and histograms rendered in the Prometheus text format
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from config.settings import METRICS_ENABLED, LLM_USAGE_IN_RESPONSE
+
+# Seconds; LLM calls dominate, so buckets reach well past typical model latency
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {value:g}"
+    return f"{name} {value:g}"
+
+
+class _Metric:
+    """
+    Base for labelled metrics.
+
+    Updates are plain dict/int operations without locks: they happen on the
+    event loop thread (middleware, agents, key manager), so they never race
+    and cost about as much as an attribute increment.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Labels) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[Sample]:
+        return []
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, self._labels(labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+        # Per label set: [per-bucket counts (+Inf last), sum]
+        self._values: Dict[Labels, List] = {}
+
+    def observe(self, value: float, *labels: str):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, (counts, total) in self._values.items():
+            base = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**base, "le": "+Inf" if bound == float("inf") else f"{bound:g}"}, cumulative
+            yield f"{self.name}_sum", base, total
+            yield f"{self.name}_count", base, cumulative
+
+
+class MetricsRegistry:
+    """Metrics updated on the hot path plus collectors that read existing stats at scrape time"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, kind: str, help_text: str):
+        """Register a function yielding (labels, value) pairs, evaluated on each scrape"""
+        def register(func):
+            self._collectors.append((name, kind, help_text, func))
+            return func
+        return register
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format_sample(name, labels, value) for name, labels, value in metric.samples())
+        for name, kind, help_text, func in self._collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(_format_sample(name, labels, value) for labels, value in func())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")
+)
+llm_call_duration = registry.histogram(
+    "llm_call_duration_seconds", "generate_content latency per agent, including executor queueing", ("agent",)
+)
+llm_executor_wait = registry.histogram(
+    "llm_executor_wait_seconds", "Time LLM calls waited for an executor thread", ("agent",)
+)
+llm_errors = registry.counter("llm_errors_total", "Failed generate_content calls per agent", ("agent",))
+llm_in_flight = registry.gauge("llm_in_flight", "generate_content calls currently running or queued")
+llm_repairs = registry.counter(
+    "llm_output_repairs_total", "Responses that failed schema validation, by repair retry outcome", ("agent", "outcome")
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens per agent by kind (prompt/output) and source (reported/estimated)", ("agent", "kind", "source")
+)
+llm_cost = registry.counter("llm_cost_usd_total", "Estimated spend per agent at the configured token prices", ("agent",))
+route_llm_calls = registry.counter("route_llm_calls_total", "LLM calls made while serving each route", ("route",))
+route_llm_tokens = registry.counter("route_llm_tokens_total", "LLM tokens spent while serving each route", ("route", "kind"))
+key_requests = registry.counter("gemini_key_requests_total", "Attempts per API key (1-based index)", ("key",))
+key_errors = registry.counter("gemini_key_errors_total", "Failed attempts per API key by kind", ("key", "kind"))
+
+
+@registry.collector("analysis_cache_events_total", "counter", "Cache lookups and evictions per cache")
+def _cache_events():
+    from app.ai.cache import ALL_CACHES
+    for cache in ALL_CACHES:
+        for event, value in (
+            ("hit", cache.hits),
+            ("miss", cache.misses),
+            ("eviction", cache.evictions),
+            ("expired", cache.expirations),
+            ("coalesced", cache.coalesced),
+        ):
+            yield {"cache": cache.name, "event": event}, value
+
+
+@registry.collector("analysis_cache_entries", "gauge", "Entries currently held per cache")
+def _cache_entries():
+    from app.ai.cache import ALL_CACHES
+    for cache in ALL_CACHES:
+        yield {"cache": cache.name}, len(cache.cache)
+
+
+@registry.collector("gemini_key_cooling_down", "gauge", "1 while an API key is in its failure cooldown")
+def _key_cooldown():
+    from app.ai.key_manager import key_manager
+    if key_manager is None:
+        return
+    now = time.time()
+    for index in range(len(key_manager.api_keys)):
+        failed_at = key_manager.failed_keys.get(index)
+        cooling = failed_at is not None and now - failed_at < key_manager.cooldown_period
+        yield {"key": str(index + 1)}, 1 if cooling else 0
+
+
+@registry.collector("prompt_template_tokens", "gauge", "Estimated static tokens per prompt template, by part (system/template)")
+def _prompt_sizes():
+    from app.ai.prompts import prompts
+    for prompt in prompts:
+        yield {"prompt": prompt.name, "part": "system"}, prompt.system_tokens
+        yield {"prompt": prompt.name, "part": "template"}, prompt.static_tokens
+
+
+@registry.collector("log_records_dropped_total", "counter", "Log records dropped because the logging queue was full")
+def _log_dropped():
+    from config.log import get_stats
+    yield {}, get_stats()["dropped"]
+
+
+@registry.collector("log_queue_depth", "gauge", "Log records waiting for the logging thread")
+def _log_queue_depth():
+    from config.log import get_stats
+    yield {}, get_stats()["queued"]
+
+
+@registry.collector("executor_queue_depth", "gauge", "Work items waiting for a thread in the default executor")
+def _executor_queue_depth():
+    try:
+        executor = asyncio.get_running_loop()._default_executor
+    except RuntimeError:
+        return
+    queue = getattr(executor, "_work_queue", None)
+    if queue is not None:
+        yield {}, queue.qsize()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency and LLM token usage by route
+    template (not raw path, to bound label cardinality). Also opens the
+    per-request usage ledger behind the optional 'usage' response field.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (METRICS_ENABLED or LLM_USAGE_IN_RESPONSE):
+            await self.app(scope, receive, send)
+            return
+        from app.ai.usage import usage_scope
+
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        with usage_scope() as usage:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                if METRICS_ENABLED:
+                    route = getattr(scope.get("route"), "path", "unmatched")
+                    http_request_duration.observe(time.perf_counter() - started, scope["method"], route, status[0])
+                    if usage.calls:
+                        route_llm_calls.inc(route, amount=usage.calls)
+                        route_llm_tokens.inc(route, "prompt", amount=usage.prompt_tokens)
+                        route_llm_tokens.inc(route, "output", amount=usage.output_tokens)
+
+
+def render_metrics() -> Optional[str]:
+    """Current metrics in Prometheus text format, or None when disabled"""
+    return registry.render() if METRICS_ENABLED else None
@@ -0,0 +1,480 @@
+"""
+Model Backend Factory
+Creates the generative model used by every agent: real Gemini or a local stand-in
+"""
+import dataclasses
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from config.settings import (
+    MODEL_BACKEND,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_LATENCY_SIGMA,
+    FAKE_LLM_ERROR_RATE_429,
+    FAKE_LLM_ERROR_RATE_5XX,
+    FAKE_LLM_KEY_RPM,
+    CASSETTE_PATH,
+    CASSETTE_REPLAY_LATENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_text(contents: Any) -> str:
+    """Text parts of generate_content contents (inline image blobs are skipped)"""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, dict):
+        return "" if "data" in contents else json.dumps(contents, default=str)
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(prompt_text(part) for part in contents)
+    return str(contents)
+
+
+class FakeUsage:
+    """Mirrors the token counts on a Gemini response"""
+
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    """Just enough of GenerateContentResponse for the agents"""
+
+    def __init__(self, text: str, usage: FakeUsage):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeModelStats:
+    """Call counters shared by all fake models (thread-safe: calls run in executor threads)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests_by_key: Dict[str, Deque[float]] = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors_429 = 0
+            self.errors_5xx = 0
+            self.quota_rejections = 0
+            self.calls_by_prompt: Dict[str, int] = {}
+            self._requests_by_key.clear()
+
+    def record_call(self, kind: str):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_prompt[kind] = self.calls_by_prompt.get(kind, 0) + 1
+
+    def record_error(self, status: int):
+        with self._lock:
+            if status == 429:
+                self.errors_429 += 1
+            else:
+                self.errors_5xx += 1
+
+    def admit(self, api_key: str, rpm: int) -> bool:
+        """Sliding one-minute request quota per API key"""
+        if rpm <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._requests_by_key.setdefault(api_key, deque())
+            while window and now - window[0] > 60:
+                window.popleft()
+            if len(window) >= rpm:
+                self.quota_rejections += 1
+                return False
+            window.append(now)
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors_429": self.errors_429,
+                "errors_5xx": self.errors_5xx,
+                "quota_rejections": self.quota_rejections,
+                "calls_by_prompt": dict(self.calls_by_prompt),
+            }
+
+
+fake_model_stats = FakeModelStats()
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+
+    Recognizes each agent's prompt and returns schema-valid output for it,
+    after a log-normal latency. Can inject 429 and 5xx errors and enforce
+    a per-key requests-per-minute quota, raising the same google.api_core
+    exceptions as the real client so key fallback behaves as in production.
+    """
+
+    def __init__(self, model_name: str, api_key: Optional[str] = None, system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.api_key = api_key or "default"
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents: Any, generation_config: Any = None, **kwargs) -> FakeResponse:
+        from google.api_core import exceptions as google_exceptions
+
+        prompt = prompt_text(contents)
+        # Same prompt -> same answer, so runs are repeatable
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+        kind, output = _fake_output(prompt, rng)
+        fake_model_stats.record_call(kind)  # Failed attempts count too: they cost a round trip
+        time.sleep(random.lognormvariate(0, FAKE_LLM_LATENCY_SIGMA) * FAKE_LLM_LATENCY_MS / 1000)
+
+        if not fake_model_stats.admit(self.api_key, FAKE_LLM_KEY_RPM):
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (e.g. check quota). [fake per-key quota]")
+        roll = random.random()
+        if roll < FAKE_LLM_ERROR_RATE_429:
+            fake_model_stats.record_error(429)
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (e.g. check quota). [fake injected]")
+        if roll < FAKE_LLM_ERROR_RATE_429 + FAKE_LLM_ERROR_RATE_5XX:
+            fake_model_stats.record_error(500)
+            raise google_exceptions.InternalServerError("An internal error has occurred. [fake injected]")
+
+        text = output if isinstance(output, str) else json.dumps(output)
+        prompt_chars = len(prompt) + len(self.system_instruction or "")  # Gemini bills the system instruction as input
+        return FakeResponse(text, FakeUsage((prompt_chars + 3) // 4, (len(text) + 3) // 4))
+
+
+def _fake_output(prompt: str, rng: random.Random):
+    """(prompt kind, output) for the agent prompt this looks like"""
+    text = prompt.lower()
+    sugary = any(term in text for term in ("sugar", "syrup", "dextrose"))
+    processed = any(term in text for term in ("lecithin", "flavor", "flavour", "emulsifier", "modified", "maltodextrin"))
+
+    if "transcribe the label" in text:
+        return "vision_extraction", {
+            "ingredients_text": "Whole grain oats, sugar, corn syrup, salt, soy lecithin, natural flavor",
+            "nutrition_text": "Serving size 30g\nCalories 120\nTotal Sugars 9g\nProtein 3g\nDietary Fiber 2g",
+            "other_text": "Honey Oat Crunch",
+            **_fake_analysis(rng, sugary=True, processed=True),
+        }
+    if "next best action" in text:
+        completed = re.search(r'"completed_actions":\[(.*?)\]', prompt)
+        done = completed.group(1) if completed else ""
+        for action in ("decision_engine", "generate_recommendations"):
+            if action not in done:
+                return "planner", action
+        return "planner", "complete"
+    if "classify the user's intent" in text:
+        return "intent", {"intent": rng.choice(["quick_yes_no", "risk_check", "curiosity", "curiosity"])}
+    if "convert the input into structured food properties" in text:
+        return "interpretation", _fake_structured_analysis(rng, sugary, processed)
+    if "translate complex terms" in text:
+        terms = [
+            {"term": "soy lecithin", "simple_explanation": "A plant-based emulsifier that keeps ingredients blended.", "category": "emulsifier"},
+            {"term": "natural flavor", "simple_explanation": "Flavorings derived from natural sources.", "category": "flavor"},
+            {"term": "maltodextrin", "simple_explanation": "A starch-derived powder used as a thickener.", "category": "other"},
+        ]
+        return "translation", [t for t in terms if t["term"] in text] or terms[:rng.randint(0, 2)]
+    if "why_this_matters" in text:
+        return "explanation", {
+            "why_this_matters": [
+                "Added sugars give quick but short-lived energy",
+                "Processing level affects how filling it is",
+                "Fiber content supports steadier energy",
+            ],
+            "when_it_makes_sense": "Works as a convenient snack when you need fast energy.",
+            "what_to_know": "Pair it with protein for longer-lasting fullness.",
+        }
+    if "create a one-sentence summary for this product" in text:
+        return "quick_insight", {"summary": "Convenient grain snack with added sugars for quick energy.", "uncertainty_reason": None}
+    if "were ranked by a rule-based" in text:
+        return "ranking_narrative", {
+            "summary": "The top product leads on lower processing and less added sugar than the rest.",
+            "key_differences": ["Less added sugar", "Fewer additives", "More fiber"],
+        }
+    if "compare these two food products" in text:
+        return "comparison", {
+            "winner": rng.choice(["A", "B", "Similar"]),
+            "summary": "One product is less processed with less added sugar.",
+            "key_differences": ["Added sugar content differs", "Processing level differs", "Fiber content differs"],
+        }
+    if "provide a clear, actionable recommendation" in text:
+        return "comparison_recommendation", "Product A is the better everyday choice thanks to less added sugar. Product B may suit you when you want something sweeter."
+    if "executive_summary" in text:
+        return "synthesis", {
+            "executive_summary": "A convenient, moderately processed product whose added sugars make it better as an occasional quick-energy option.",
+            "key_takeaways": ["Contains added sugars", "Moderate processing", "Some fiber from whole grains"],
+            "confidence_level": rng.choice(["high", "medium"]),
+            "next_steps": ["Compare with a lower-sugar option", "Check the serving size"],
+        }
+    if "recommendations" in text:
+        return "recommendations", {
+            "recommendations": [
+                {"title": "Watch the serving size", "description": "Stick to one serving to limit added sugar.", "priority": "high"},
+                {"title": "Add protein", "description": "Pair with yogurt or nuts for steadier energy.", "priority": "medium"},
+                {"title": "Compare labels", "description": "Look for options with more fiber.", "priority": "low"},
+            ]
+        }
+    return "analysis", _fake_analysis(rng, sugary, processed)
+
+
+def _fake_analysis(rng: random.Random, sugary: bool, processed: bool) -> Dict[str, Any]:
+    cons: List[str] = (["Contains added sugars"] if sugary else []) + (["Includes processing aids"] if processed else [])
+    return {
+        "insight": rng.choice([
+            "A convenient everyday product with a simple ingredient base.",
+            "Quick energy from refined carbohydrates with modest fiber.",
+        ]),
+        "detailed_reasoning": "The ingredient order suggests grains form the base, with sweeteners and processing aids in smaller amounts.",
+        "trade_offs": {"pros": ["Whole grain base", "Convenient"], "cons": cons or ["Limited protein"]},
+        "uncertainty_note": None if rng.random() < 0.7 else "Exact sugar content is not listed.",
+    }
+
+
+def _fake_structured_analysis(rng: random.Random, sugary: bool, processed: bool) -> Dict[str, Any]:
+    markers = ["emulsifier", "natural flavor"] if processed else []
+    return {
+        "ingredient_summary": {
+            "primary_components": ["whole grain oats"],
+            "added_sugars_present": sugary,
+            "sweetener_type": "added" if sugary else "none",
+            "fiber_level": rng.choice(["low", "moderate"]),
+            "protein_level": rng.choice(["low", "moderate"]),
+            "fat_level": "low",
+            "processing_level": "high" if processed else rng.choice(["low", "moderate"]),
+            "ultra_processed_markers": markers,
+            "ingredient_count": rng.randint(3, 18),
+        },
+        "food_properties": {
+            "sugar_dominant": sugary and rng.random() < 0.5,
+            "fiber_protein_support": rng.choice(["weak", "moderate"]),
+            "energy_release_pattern": "rapid" if sugary else "mixed",
+            "satiety_support": rng.choice(["low", "moderate"]),
+            "formulation_complexity": "complex" if processed else "simple",
+        },
+        "confidence_notes": {"data_completeness": "high", "ambiguity_flags": []},
+    }
+
+
+class CassetteMiss(Exception):
+    """Replay mode got a request that was never recorded"""
+
+
+def _fingerprint(contents: Any) -> Any:
+    """JSON-safe form of generate_content contents; image bytes are reduced to a digest"""
+    if isinstance(contents, (list, tuple)):
+        return [_fingerprint(part) for part in contents]
+    if isinstance(contents, dict):
+        if isinstance(contents.get("data"), (bytes, bytearray)):
+            return {"mime_type": contents.get("mime_type"), "sha256": hashlib.sha256(contents["data"]).hexdigest()}
+        return {key: _fingerprint(value) for key, value in contents.items()}
+    if contents is None or isinstance(contents, (str, int, float, bool)):
+        return contents
+    return str(contents)
+
+
+def _config_dict(generation_config: Any) -> Optional[Dict[str, Any]]:
+    """GenerationConfig (dataclass) or plain dict, without unset fields"""
+    if generation_config is None:
+        return None
+    if dataclasses.is_dataclass(generation_config):
+        generation_config = dataclasses.asdict(generation_config)
+    if isinstance(generation_config, dict):
+        return {key: value for key, value in generation_config.items() if value is not None}
+    return {"repr": str(generation_config)}
+
+
+def request_key(model_name: str, contents: Any, generation_config: Any = None, system_instruction: Optional[str] = None) -> str:
+    """Cassette key: hash of model, system instruction, prompt and generation config (never the API key)"""
+    payload = {
+        "model": model_name,
+        "contents": _fingerprint(contents),
+        "config": _config_dict(generation_config),
+    }
+    if system_instruction:
+        payload["system"] = system_instruction
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Gzip-compressed JSONL file of recorded generate_content calls.
+
+    Each entry is appended as its own gzip member, so a run that crashes
+    mid-recording keeps everything captured before the crash. Identical
+    requests recorded more than once are replayed in recording order.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._takes: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursor: Dict[str, int] = {}
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        takes: Dict[str, List[Dict[str, Any]]] = {}
+        count = 0
+        if os.path.exists(self.path):
+            try:
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            takes.setdefault(entry["key"], []).append(entry)
+                            count += 1
+            except (EOFError, OSError, json.JSONDecodeError) as e:
+                logger.warning("⚠️  Cassette %s is truncated after %s entries: %s", self.path, count, e)
+        logger.info("📼 Loaded %s recorded calls (%s distinct requests) from %s", count, len(takes), self.path)
+        return takes
+
+    def next_take(self, key: str) -> Optional[Dict[str, Any]]:
+        """Next recording for a request key, cycling when a request repeats more often than recorded"""
+        with self._lock:
+            if self._takes is None:
+                self._takes = self._load()
+            takes = self._takes.get(key)
+            if not takes:
+                self.misses += 1
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            self.replayed += 1
+            return takes[index % len(takes)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+            }
+
+
+cassette = Cassette(CASSETTE_PATH)
+
+
+class RecordingModel:
+    """Real Gemini model that appends every successful call to the cassette"""
+
+    def __init__(self, model: Any, model_name: str, system_instruction: Optional[str] = None):
+        self._model = model
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents: Any, generation_config: Any = None, **kwargs):
+        started = time.perf_counter()
+        response = self._model.generate_content(contents, generation_config=generation_config, **kwargs)
+        latency_ms = 1000 * (time.perf_counter() - started)
+
+        usage = getattr(response, "usage_metadata", None)
+        cassette.append({
+            "key": request_key(self.model_name, contents, generation_config, self.system_instruction),
+            "model": self.model_name,
+            "text": response.text,
+            "latency_ms": round(latency_ms, 1),
+            "usage": {
+                "prompt_token_count": getattr(usage, "prompt_token_count", 0),
+                "candidates_token_count": getattr(usage, "candidates_token_count", 0),
+            },
+        })
+        return response
+
+
+class ReplayModel:
+    """Serves recorded responses offline, with the recorded latency or none"""
+
+    def __init__(self, model_name: str, system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents: Any, generation_config: Any = None, **kwargs) -> FakeResponse:
+        key = request_key(self.model_name, contents, generation_config, self.system_instruction)
+        take = cassette.next_take(key)
+        if take is None:
+            raise CassetteMiss(f"No recording for {self.model_name} request {key[:12]} in {cassette.path}")
+        if CASSETTE_REPLAY_LATENCY == "recorded":
+            time.sleep(take["latency_ms"] / 1000)
+        usage = take.get("usage") or {}
+        return FakeResponse(
+            take["text"],
+            FakeUsage(usage.get("prompt_token_count", 0), usage.get("candidates_token_count", 0))
+        )
+
+
+def backend_call_count() -> Optional[int]:
+    """Model calls made so far by a local backend (None for plain Gemini)"""
+    if MODEL_BACKEND == "fake":
+        return fake_model_stats.get_stats()["calls"]
+    if MODEL_BACKEND == "replay":
+        stats = cassette.get_stats()
+        return stats["replayed"] + stats["misses"]
+    if MODEL_BACKEND == "record":
+        return cassette.get_stats()["recorded"]
+    return None
+
+
+def create_model(model_name: str = 'gemini-2.5-flash', api_key: Optional[str] = None, system_instruction: Optional[str] = None):
+    """
+    Create the generative model for an agent, honoring MODEL_BACKEND:
+    'gemini' (real API), 'fake' (local stand-in), 'record' (real API,
+    captured to CASSETTE_PATH) or 'replay' (served from CASSETTE_PATH).
+
+    system_instruction is sent through Gemini's system_instruction field
+    rather than as prompt content, keeping it a stable request prefix.
+    """
+    if MODEL_BACKEND == "fake":
+        return FakeGenerativeModel(model_name, api_key, system_instruction)
+    if MODEL_BACKEND == "replay":
+        return ReplayModel(model_name, system_instruction)
+
+    import google.generativeai as genai
+    if api_key:
+        genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+    if MODEL_BACKEND == "record":
+        return RecordingModel(model, model_name, system_instruction)
+    return model
+
+
+class LazyModel:
+    """
+    Defers create_model until the first call, so building an agent at import
+    time costs nothing (the Gemini SDK import alone takes most of a second).
+    Calls run in executor threads, hence the lock around creation.
+    """
+
+    def __init__(self, model_name: str = 'gemini-2.5-flash', api_key: Optional[str] = None, system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self._model = None
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents: Any, generation_config: Any = None, **kwargs):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = create_model(self.model_name, self.api_key, self.system_instruction)
+        return self._model.generate_content(contents, generation_config=generation_config, **kwargs)
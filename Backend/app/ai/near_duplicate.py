@@ -0,0 +1,193 @@
+"""
+Near-Duplicate Ingredient Index
+MinHash LSH over analyzed ingredient lists, for reusing analyses of near-identical products
+"""
+import random
+import re
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+from app.ai.cache import decision_cache
+from config.settings import (
+    NEAR_DUPLICATE_ENABLED,
+    NEAR_DUPLICATE_THRESHOLD,
+    NEAR_DUPLICATE_NUM_PERM,
+    NEAR_DUPLICATE_BANDS,
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_INGREDIENT_SPLIT = re.compile(r"[,;:()\[\]{}\n]+")
+# Standalone quantities ("38%", "0.5 %", "12g") and marker characters; digits inside
+# codes and names ("e471", "vitamin b12", "omega-3") are part of the ingredient
+_NOISE = re.compile(r"(?<![\w-])\d+(?:\.\d+)?(?:\s*%|\s*(?:mg|kg|ml|g|l)\b|(?![\w-]))|[%*_.]")
+_LEADING_LABELS = re.compile(r"^(ingredients?|contains|may contain( traces of)?)\s+")
+
+# Lists shorter than this are too small for a one-ingredient difference to be "near"
+MIN_TOKENS = 4
+
+
+def canonical_ingredient_tokens(text: str) -> FrozenSet[str]:
+    """
+    Order-insensitive set of normalized ingredient names.
+    Quantities, case and labels like "Ingredients:" are ignored; additive
+    codes such as E471 stay distinct tokens.
+    """
+    tokens = set()
+    for part in _INGREDIENT_SPLIT.split(text.lower()):
+        token = " ".join(_NOISE.sub(" ", part).split())
+        token = _LEADING_LABELS.sub("", token)
+        if token and token not in ("ingredients", "ingredient"):
+            tokens.add(token)
+    return frozenset(tokens)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of previously analyzed ingredient lists.
+
+    - Each list is reduced to a MinHash signature over its canonical tokens
+    - Signatures are split into bands; lists sharing any band bucket become candidates
+    - Candidates are confirmed with exact Jaccard similarity against the threshold
+    - Entries only point at source texts; the analyses themselves stay in the decision cache
+    """
+
+    def __init__(self, threshold: float, num_perm: int, bands: int, max_size: int = 500, enabled: bool = True):
+        if num_perm % bands:
+            raise ValueError("NEAR_DUPLICATE_NUM_PERM must be divisible by NEAR_DUPLICATE_BANDS")
+        self.enabled = enabled
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_size = max_size
+
+        rng = random.Random(0x5EED)  # Fixed seed: signatures stay comparable across restarts
+        self._permutations = [
+            (rng.randrange(1, 1 << 32), rng.randrange(0, 1 << 32)) for _ in range(num_perm)
+        ]
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[str], List[bytes]]]" = OrderedDict()
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+        self.lookups = 0
+        self.hits = 0
+        self.candidates_checked = 0
+
+    def signature(self, tokens: FrozenSet[str]) -> List[int]:
+        """MinHash signature: per permutation, the minimum hash over all tokens"""
+        hashes = [zlib.crc32(token.encode("utf-8")) for token in tokens]
+        return [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        ]
+
+    def _band_keys(self, signature: List[int]) -> List[bytes]:
+        return [
+            b"".join(value.to_bytes(8, "little") for value in signature[i * self.rows:(i + 1) * self.rows])
+            for i in range(self.bands)
+        ]
+
+    def add(self, text: str):
+        """Index an analyzed ingredient list (text is the decision cache key)"""
+        if not self.enabled:
+            return
+        tokens = canonical_ingredient_tokens(text)
+        if len(tokens) < MIN_TOKENS:
+            return
+        self.remove(text)
+        band_keys = self._band_keys(self.signature(tokens))
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, set()).add(text)
+        self._entries[text] = (tokens, band_keys)
+
+        while len(self._entries) > self.max_size:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, text: str):
+        """Drop an entry (e.g. when its cached analysis has expired)"""
+        entry = self._entries.pop(text, None)
+        if entry is None:
+            return
+        for band, key in enumerate(entry[1]):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(text)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def lookup(
+        self,
+        text: str,
+        resolve: Callable[[str], Optional[Any]]
+    ) -> Optional[Tuple[Any, float, FrozenSet[str]]]:
+        """
+        Find the most similar indexed list at or above the threshold.
+
+        Args:
+            text: Ingredient list to look up
+            resolve: Returns the stored analysis for a source text, or None if it
+                is gone (the entry is then dropped and the next candidate tried)
+
+        Returns:
+            (stored analysis, Jaccard similarity, canonical tokens of the query) or None
+        """
+        if not self.enabled:
+            return None
+        tokens = canonical_ingredient_tokens(text)
+        if len(tokens) < MIN_TOKENS:
+            return None
+        self.lookups += 1
+
+        candidates: Set[str] = set()
+        for band, key in enumerate(self._band_keys(self.signature(tokens))):
+            candidates |= self._buckets[band].get(key, set())
+        candidates.discard(text)
+        self.candidates_checked += len(candidates)
+
+        matches = sorted(
+            ((jaccard(tokens, self._entries[candidate][0]), candidate) for candidate in candidates),
+            reverse=True
+        )
+        for similarity, candidate in matches:
+            if similarity < self.threshold:
+                break
+            data = resolve(candidate)
+            if data is None:
+                self.remove(candidate)
+                continue
+            self.hits += 1
+            return data, similarity, tokens
+        return None
+
+    def get_hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index statistics"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "num_perm": self.num_perm,
+            "bands": self.bands,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.get_hit_rate(),
+            "candidates_checked": self.candidates_checked,
+        }
+
+
+# Global index instance (sized like the decision cache it points into)
+near_duplicate_index = NearDuplicateIndex(
+    threshold=NEAR_DUPLICATE_THRESHOLD,
+    num_perm=NEAR_DUPLICATE_NUM_PERM,
+    bands=NEAR_DUPLICATE_BANDS,
+    max_size=decision_cache.max_size,
+    enabled=NEAR_DUPLICATE_ENABLED,
+)
@@ -0,0 +1,339 @@
+"""
+Local Product Catalog
+SQLite FTS5 index over an Open Food Facts dump, keyed by barcode
+"""
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from config.settings import PRODUCT_CATALOG_PATH
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    barcode TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    brands TEXT,
+    categories TEXT,
+    main_category TEXT,
+    ingredients_text TEXT,
+    ingredients_n INTEGER,
+    additives_n INTEGER,
+    nova_group INTEGER,
+    nutriscore_grade TEXT,
+    energy_kcal_100g REAL,
+    sugars_100g REAL,
+    fiber_100g REAL,
+    proteins_100g REAL,
+    salt_100g REAL
+);
+CREATE INDEX IF NOT EXISTS idx_products_main_category ON products(main_category);
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, brands, ingredients_text,
+    content='products', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+COLUMNS = (
+    "barcode", "name", "brands", "categories", "main_category",
+    "ingredients_text", "ingredients_n", "additives_n", "nova_group", "nutriscore_grade",
+    "energy_kcal_100g", "sugars_100g", "fiber_100g", "proteins_100g", "salt_100g",
+)
+
+# Relative weight of name, brands and ingredients matches in bm25 ranking
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+MAX_QUERY_TERMS = 16
+BARCODE_PATTERN = re.compile(r"^\d{8,14}$")
+
+
+def _number(value: Any) -> Optional[float]:
+    """Parse a dump value as a float (dumps mix numbers, strings and blanks)"""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _integer(value: Any) -> Optional[int]:
+    number = _number(value)
+    return int(number) if number is not None else None
+
+
+def _category_label(tag: str) -> str:
+    """'en:breakfast-cereals' and 'Breakfast cereals' both become 'breakfast cereals'"""
+    tag = tag.split(":", 1)[-1] if re.match(r"^[a-z]{2}:", tag) else tag
+    return " ".join(tag.replace("-", " ").lower().split())
+
+
+def product_row(record: Dict[str, Any]) -> Optional[tuple]:
+    """
+    Map one Open Food Facts record (JSONL object or CSV row) to a catalog row.
+    Returns None for records without a barcode or anything to search on.
+    """
+    barcode = str(record.get("code") or "").strip()
+    name = (record.get("product_name") or record.get("product_name_en") or "").strip()
+    ingredients = (record.get("ingredients_text") or record.get("ingredients_text_en") or "").strip()
+    if not barcode or not (name or ingredients):
+        return None
+
+    # JSONL nests nutrient values, the CSV export flattens them into columns
+    nutriments = record.get("nutriments")
+    if not isinstance(nutriments, dict):
+        nutriments = record
+
+    tags = record.get("categories_tags")
+    main_category = record.get("main_category_en") or record.get("main_category") or ""
+    if not main_category and isinstance(tags, list) and tags:
+        main_category = tags[-1]  # Most specific category
+
+    return (
+        barcode,
+        name,
+        (record.get("brands") or "").strip(),
+        record.get("categories_en") or record.get("categories") or "",
+        _category_label(main_category) if main_category else None,
+        ingredients,
+        _integer(record.get("ingredients_n")),
+        _integer(record.get("additives_n")),
+        _integer(record.get("nova_group")),
+        (record.get("nutriscore_grade") or "").strip().lower() or None,
+        _number(nutriments.get("energy-kcal_100g")),
+        _number(nutriments.get("sugars_100g")),
+        _number(nutriments.get("fiber_100g")),
+        _number(nutriments.get("proteins_100g")),
+        _number(nutriments.get("salt_100g")),
+    )
+
+
+def iter_dump(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from an Open Food Facts JSONL or CSV/TSV dump
+    (optionally gzip-compressed) without loading it into memory.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace", newline="") as f:
+        base = path[:-3] if path.endswith(".gz") else path
+        if base.endswith((".jsonl", ".json", ".ndjson")):
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+            return
+
+        header = f.readline()
+        # The official export is tab-separated with unescaped quotes
+        if "\t" in header:
+            reader = csv.DictReader(itertools.chain([header], f), delimiter="\t", quoting=csv.QUOTE_NONE)
+        else:
+            reader = csv.DictReader(itertools.chain([header], f))
+        yield from reader
+
+
+def fts_terms(text: str) -> List[str]:
+    """Distinct quoted search terms from free text (quoting keeps FTS5 syntax out of user input)"""
+    terms = []
+    for term in re.findall(r"\w+", text.lower()):
+        if len(term) > 1 and f'"{term}"' not in terms:
+            terms.append(f'"{term}"')
+        if len(terms) >= MAX_QUERY_TERMS:
+            break
+    return terms
+
+
+class ProductCatalog:
+    """
+    Local product index built from an Open Food Facts dump.
+
+    - Products are keyed by barcode; names, brands and ingredients are
+      full-text indexed with FTS5 and ranked by bm25
+    - Ingestion streams the dump in batches, so multi-GB files use constant memory
+    - Lookups run against a read-only connection per thread and make no network calls
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def available(self) -> bool:
+        """Whether a catalog has been built at the configured path"""
+        return os.path.exists(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Read-only connection for the current thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def ingest(self, dump_path: str, batch_size: int = 5000) -> Dict[str, Any]:
+        """
+        Stream a dump into the catalog, replacing products with the same barcode,
+        then rebuild the full-text index in one pass.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+        conn = sqlite3.connect(self.path)
+        conn.executescript(SCHEMA)
+        # Bulk load settings: the catalog can always be rebuilt from the dump
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        insert = f"INSERT OR REPLACE INTO products ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+        started = time.perf_counter()
+        read = stored = 0
+        batch: List[tuple] = []
+        try:
+            for record in iter_dump(dump_path):
+                read += 1
+                row = product_row(record)
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= batch_size:
+                    conn.executemany(insert, batch)
+                    conn.commit()
+                    stored += len(batch)
+                    batch.clear()
+                if read % 100000 == 0:
+                    logger.info("📦 Catalog ingest: %s records read, %s stored (%.0f/s)", read, stored, read / (time.perf_counter() - started))
+            if batch:
+                conn.executemany(insert, batch)
+                stored += len(batch)
+            conn.commit()
+
+            logger.info("🔎 Rebuilding full-text index...")
+            conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+            conn.commit()
+            total = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        logger.info("✅ Catalog ingest complete: %s of %s records stored, %s products total (%.1fs)", stored, read, total, elapsed)
+        return {"records_read": read, "products_stored": stored, "total_products": total, "seconds": round(elapsed, 2)}
+
+    def lookup_barcode(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Exact barcode lookup"""
+        if not self.available:
+            return None
+        row = self._connection().execute(
+            "SELECT rowid, * FROM products WHERE barcode = ?", (barcode.strip(),)
+        ).fetchone()
+        return self._to_match(row) if row else None
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find products by barcode or by free text over name, brands and ingredients.
+        Returns best matches first.
+        """
+        if not self.available or not query.strip():
+            return []
+        if BARCODE_PATTERN.match(query.strip()):
+            match = self.lookup_barcode(query)
+            return [match] if match else []
+
+        terms = fts_terms(query)
+        if not terms:
+            return []
+        # All terms first (selective and cheap); any term only if nothing matches them all
+        rows = self._match(" ".join(terms), limit)
+        if not rows and len(terms) > 1:
+            rows = self._match(" OR ".join(terms), limit)
+        return [self._to_match(row) for row in rows]
+
+    def _match(self, match_query: str, limit: int) -> List[sqlite3.Row]:
+        # Rank inside the FTS table, then join only the winners
+        return self._connection().execute(
+            f"""
+            SELECT p.rowid, p.*, m.rank
+            FROM (
+                SELECT rowid, bm25(products_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS rank
+                FROM products_fts WHERE products_fts MATCH ?
+                ORDER BY rank LIMIT ?
+            ) m JOIN products p ON p.rowid = m.rowid
+            ORDER BY m.rank
+            """,
+            (match_query, limit)
+        ).fetchall()
+
+    def get_by_rowids(self, rowids: List[int]) -> List[Dict[str, Any]]:
+        """Fetch products by internal row id, in the order given"""
+        if not self.available or not rowids:
+            return []
+        placeholders = ", ".join("?" * len(rowids))
+        rows = self._connection().execute(
+            f"SELECT rowid, * FROM products WHERE rowid IN ({placeholders})", list(rowids)
+        ).fetchall()
+        by_id = {row["rowid"]: self._to_match(row) for row in rows}
+        return [by_id[rowid] for rowid in rowids if rowid in by_id]
+
+    @staticmethod
+    def _to_match(row: sqlite3.Row) -> Dict[str, Any]:
+        match = {column: row[column] for column in COLUMNS}
+        match["rowid"] = row["rowid"]
+        if match["ingredients_text"] and len(match["ingredients_text"]) > 300:
+            match["ingredients_text"] = match["ingredients_text"][:300] + "…"
+        return match
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Catalog size and location"""
+        if not self.available:
+            return {"available": False, "path": self.path}
+        total = self._connection().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        return {"available": True, "path": self.path, "products": total}
+
+
+# Global catalog instance
+product_catalog = ProductCatalog(PRODUCT_CATALOG_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the local product catalog")
+    parser.add_argument("--db", default=PRODUCT_CATALOG_PATH, help="Catalog database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="Stream an Open Food Facts JSONL/CSV dump (.gz ok) into the catalog")
+    ingest_parser.add_argument("dump")
+    ingest_parser.add_argument("--skip-vectors", action="store_true", help="Do not rebuild the similarity index")
+    commands.add_parser("build-vectors", help="Rebuild the ingredient similarity index")
+    search_parser = commands.add_parser("search", help="Search by barcode or free text")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    catalog = ProductCatalog(args.db)
+    if args.command in ("ingest", "build-vectors"):
+        from app.ai.product_vectors import ProductVectorIndex
+        from config.settings import PRODUCT_VECTOR_DIM
+
+        if args.command == "ingest":
+            catalog.ingest(args.dump)
+        if args.command == "build-vectors" or not args.skip_vectors:
+            ProductVectorIndex(args.db, PRODUCT_VECTOR_DIM).build()
+    else:
+        started = time.perf_counter()
+        matches = catalog.search(args.query, limit=args.limit)
+        for match in matches:
+            print(f"{match['barcode']}  {match['name']} ({match['brands'] or 'no brand'})  [{match['main_category'] or '-'}]")
+        print(f"{len(matches)} match(es) in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,326 @@
+"""
+Product Similarity Index
+Memory-mapped ingredient vectors for finding healthier alternatives in the local catalog
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from app.ai.decision_engine import decision_engine, FIBER_PROTEIN_LEVELS, ENERGY_LEVELS, SATIETY_LEVELS
+from config.settings import PRODUCT_CATALOG_PATH, PRODUCT_VECTOR_DIM
+
+logger = logging.getLogger(__name__)
+
+# Added-sugar words used to approximate the decision engine's added_sugars signal from catalog text
+ADDED_SUGAR_TERMS = ("sugar", "syrup", "dextrose", "glucose", "fructose", "sucrose", "maltodextrin", "honey")
+HIGH_SUGAR_PER_100G = 22.5  # UK front-of-pack "high" sugar threshold
+
+_INGREDIENT_SPLIT = re.compile(r"[,;:()\[\]{}]+")
+_NOISE = re.compile(r"[\d%.*_]+")
+
+
+def ingredient_vector(ingredients_text: str, dim: int):
+    """
+    Signed feature-hashed vector of an ingredient list (L2-normalized float32).
+    Each ingredient contributes its full phrase and its words; earlier
+    (larger) ingredients weigh more.
+    """
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=np.float32)
+    ingredients = [
+        " ".join(_NOISE.sub(" ", part).lower().split())
+        for part in _INGREDIENT_SPLIT.split(ingredients_text or "")
+    ]
+    position = 0
+    for ingredient in ingredients:
+        if not ingredient:
+            continue
+        weight = 1.0 / (1.0 + position) ** 0.5
+        words = ingredient.split()
+        for feature in ([ingredient] + words if len(words) > 1 else words):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % dim] += weight if h & 0x80000000 else -weight
+        position += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def catalog_feature_row(
+    ingredients_text: Optional[str],
+    ingredients_n: Optional[int],
+    additives_n: Optional[int],
+    nova_group: Optional[int],
+    sugars: Optional[float],
+    fiber: Optional[float],
+    proteins: Optional[float]
+) -> Tuple[int, ...]:
+    """
+    Approximate the decision engine's features from catalog data
+    (NOVA group, additives and nutrients instead of an LLM analysis).
+    Row layout follows decision_engine.FEATURE_COLUMNS.
+    """
+    text = (ingredients_text or "").lower()
+    processing = {1: 0, 2: 0, 3: 1, 4: 2}.get(nova_group, 1)
+    sugar_dominant = sugars is not None and sugars >= HIGH_SUGAR_PER_100G
+    added_sugars = any(term in text for term in ADDED_SUGAR_TERMS)
+    fiber_value, protein_value = fiber or 0.0, proteins or 0.0
+
+    if fiber_value >= 6 or protein_value >= 12:
+        fiber_protein = "strong"
+    elif fiber_value >= 3 or protein_value >= 6:
+        fiber_protein = "moderate"
+    elif fiber is not None and proteins is not None and fiber_value == 0 and protein_value == 0:
+        fiber_protein = "none"
+    else:
+        fiber_protein = "weak"
+
+    if sugar_dominant:
+        energy = "rapid"
+    elif fiber_value >= 3:
+        energy = "slow"
+    else:
+        energy = "mixed"
+
+    if protein_value >= 10 or fiber_value >= 5:
+        satiety = "high"
+    elif sugar_dominant:
+        satiety = "low"
+    else:
+        satiety = "moderate"
+
+    if ingredients_n is None:
+        ingredients_n = len([part for part in _INGREDIENT_SPLIT.split(text) if part.strip()])
+
+    return (
+        processing,
+        additives_n or 0,
+        int(sugar_dominant),
+        int(added_sugars),
+        FIBER_PROTEIN_LEVELS.index(fiber_protein),
+        ENERGY_LEVELS.index(energy),
+        SATIETY_LEVELS.index(satiety),
+        ingredients_n,
+    )
+
+
+class _MappedIndex:
+    """One consistent set of mapped index arrays; replaced whole, never mutated"""
+
+    __slots__ = ("vectors", "rowids", "scores", "dim", "category_ranges")
+
+    def __init__(self, vectors, rowids, scores, dim: int, category_ranges: Dict[str, Tuple[int, int]]):
+        self.vectors = vectors
+        self.rowids = rowids
+        self.scores = scores
+        self.dim = dim
+        self.category_ranges = category_ranges
+
+
+class ProductVectorIndex:
+    """
+    Nearest-neighbour index over catalog ingredient lists.
+
+    - One float32 row per product, stored as .npy files next to the catalog
+      and opened with mmap, so every worker process shares the same pages
+    - Rows are sorted by category: a same-category query scans one contiguous slice
+    - Each row carries a precomputed rule-based score, so "healthier" is a
+      vectorized mask rather than a per-candidate analysis
+    """
+
+    def __init__(self, catalog_path: str, dim: int):
+        base = os.path.splitext(catalog_path)[0]
+        self.catalog_path = catalog_path
+        self.dim = dim
+        self.vectors_path = f"{base}.vectors.npy"
+        self.rowids_path = f"{base}.rowids.npy"
+        self.scores_path = f"{base}.scores.npy"
+        self.meta_path = f"{base}.vectors.json"
+        self._loaded_mtime: Optional[float] = None
+        self._index: Optional[_MappedIndex] = None
+        self._lock = threading.Lock()  # Queries run on executor threads
+
+    @property
+    def available(self) -> bool:
+        """Whether vectors have been built for the catalog"""
+        return os.path.exists(self.meta_path)
+
+    def _load(self) -> _MappedIndex:
+        """
+        The mapped index, mapped again if it was rebuilt since the last load.
+        Callers keep the returned snapshot for a whole query, so a reload on
+        another thread never mixes arrays from two builds.
+        """
+        import numpy as np
+
+        with self._lock:
+            mtime = os.path.getmtime(self.meta_path)
+            if self._index is not None and self._loaded_mtime == mtime:
+                return self._index
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            vectors = np.load(self.vectors_path, mmap_mode="r")
+            rowids = np.load(self.rowids_path, mmap_mode="r")
+            scores = np.load(self.scores_path, mmap_mode="r")
+            if not len(vectors) == len(rowids) == len(scores) == meta["products"] and self._index is not None:
+                # Caught between a rebuild's file swaps: keep the previous build until its meta file lands
+                return self._index
+            self._index = _MappedIndex(
+                vectors,
+                rowids,
+                scores,
+                meta["dim"],
+                {name: (start, end) for name, start, end in meta["categories"]}
+            )
+            self._loaded_mtime = mtime
+            return self._index
+
+    def build(self, chunk_size: int = 20000) -> Dict[str, Any]:
+        """Vectorize and score every catalog product (run after ingesting a dump)"""
+        import numpy as np
+
+        started = time.perf_counter()
+        # Serving processes may have the current files mapped: write new ones
+        # aside and swap them in with os.replace, never truncate in place
+        paths = [self.vectors_path, self.rowids_path, self.scores_path]
+        temporary = {path: f"{path[:-len('.npy')]}.tmp.npy" for path in paths}
+        conn = sqlite3.connect(f"file:{self.catalog_path}?mode=ro", uri=True)
+        try:
+            total = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            vectors = np.lib.format.open_memmap(temporary[self.vectors_path], mode="w+", dtype=np.float32, shape=(total, self.dim))
+            rowids = np.lib.format.open_memmap(temporary[self.rowids_path], mode="w+", dtype=np.int64, shape=(total,))
+            scores = np.lib.format.open_memmap(temporary[self.scores_path], mode="w+", dtype=np.float32, shape=(total,))
+            categories: List[list] = []
+
+            cursor = conn.execute(
+                """
+                SELECT rowid, main_category, ingredients_text, ingredients_n, additives_n,
+                       nova_group, sugars_100g, fiber_100g, proteins_100g
+                FROM products ORDER BY main_category, rowid
+                """
+            )
+            offset = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                end = offset + len(rows)
+                for i, row in enumerate(rows):
+                    vectors[offset + i] = ingredient_vector(row[2], self.dim)
+                    category = row[1]
+                    if not categories or categories[-1][0] != category:
+                        categories.append([category, offset + i, offset + i])
+                    categories[-1][2] = offset + i + 1
+                rowids[offset:end] = [row[0] for row in rows]
+                features = np.array([catalog_feature_row(*row[2:]) for row in rows], dtype=np.int32)
+                scores[offset:end] = decision_engine.score_features(features)
+                offset = end
+                logger.info("🧮 Vectorized %s/%s products", offset, total)
+
+            vectors.flush()
+            rowids.flush()
+            scores.flush()
+            del vectors, rowids, scores
+        except BaseException:
+            for path in temporary.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        finally:
+            conn.close()
+
+        for path in paths:
+            os.replace(temporary[path], path)
+
+        # Written last, also via a rename: its presence (and mtime) marks a complete index
+        meta_temporary = f"{self.meta_path}.tmp"
+        with open(meta_temporary, "w") as f:
+            json.dump({"dim": self.dim, "products": total, "categories": categories}, f)
+        os.replace(meta_temporary, self.meta_path)
+
+        elapsed = time.perf_counter() - started
+        logger.info("✅ Vector index built: %s products, %s categories (%.1fs)", total, len(categories), elapsed)
+        return {"products": total, "categories": len(categories), "seconds": round(elapsed, 2)}
+
+    def nearest(
+        self,
+        ingredients_text: str,
+        k: int = 5,
+        category: Optional[str] = None,
+        min_score: Optional[float] = None,
+        exclude_rowid: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k products with the most similar ingredient lists.
+
+        Args:
+            ingredients_text: Ingredient list of the reference product
+            k: Number of results
+            category: Only search this catalog category (whole catalog if unknown)
+            min_score: Only return products scoring strictly higher than this
+            exclude_rowid: Catalog row of the reference product itself
+
+        Returns:
+            [{"rowid", "similarity", "score"}], most similar first
+        """
+        import numpy as np
+
+        if not self.available:
+            return []
+        index = self._load()
+        query = ingredient_vector(ingredients_text, index.dim)
+        if not query.any():
+            return []
+
+        start, end = index.category_ranges.get(category, (0, len(index.rowids))) if category else (0, len(index.rowids))
+        similarities = index.vectors[start:end] @ query
+        mask = np.ones(end - start, dtype=bool)
+        if min_score is not None:
+            mask &= index.scores[start:end] > min_score
+        if exclude_rowid is not None:
+            mask &= index.rowids[start:end] != exclude_rowid
+        similarities = np.where(mask, similarities, -np.inf)
+
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return [
+            {
+                "rowid": int(index.rowids[start + i]),
+                "similarity": round(float(similarities[i]), 4),
+                "score": round(float(index.scores[start + i]), 2)
+            }
+            for i in top
+        ]
+
+    @staticmethod
+    def score_text(ingredients_text: str) -> float:
+        """
+        Score a product known only by its label text with the same catalog
+        encoder as the indexed rows, so it can be used as nearest()'s min_score
+        """
+        import numpy as np
+
+        features = np.array([catalog_feature_row(ingredients_text, None, None, None, None, None, None)], dtype=np.int32)
+        return float(decision_engine.score_features(features)[0])
+
+    def score_of(self, rowid: int) -> Optional[float]:
+        """Precomputed rule-based score of a catalog product"""
+        import numpy as np
+
+        if not self.available:
+            return None
+        index = self._load()
+        positions = np.flatnonzero(index.rowids == rowid)
+        return float(index.scores[positions[0]]) if len(positions) else None
+
+
+# Global index instance (files live next to the product catalog)
+product_vectors = ProductVectorIndex(PRODUCT_CATALOG_PATH, PRODUCT_VECTOR_DIM)
@@ -0,0 +1,82 @@
+"""
+Request-Scoped Progress Events
+Delivers workflow progress to the request that started the work
+"""
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressChannel:
+    """
+    Async event channel owned by a single request.
+
+    Producers publish events without blocking; the request's stream
+    consumes them in order until the channel is closed.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def publish(self, event: str, **data: Any):
+        """Queue an event for the consumer"""
+        self._queue.put_nowait({"event": event, **data})
+
+    def close(self):
+        """Signal that no more events will be published"""
+        self._queue.put_nowait(self._CLOSED)
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events until the channel is closed"""
+        while True:
+            item = await self._queue.get()
+            if item is self._CLOSED:
+                return
+            yield item
+
+
+# The channel for the current request. Context variables are copied into
+# tasks, so concurrent requests never see each other's channel.
+_current_channel: ContextVar[Optional[ProgressChannel]] = ContextVar("progress_channel", default=None)
+
+
+def report_progress(event: str, **data: Any):
+    """Publish an event to the current request's channel (no-op when nobody is listening)"""
+    channel = _current_channel.get()
+    if channel is not None:
+        channel.publish(event, **data)
+
+
+async def run_with_progress(work: Callable[[], Awaitable[Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run work with a fresh progress channel and yield its events.
+
+    The stream always ends with either a 'complete' event carrying the
+    result or an 'error' event. If the consumer stops early (e.g. client
+    disconnect), the work is cancelled.
+    """
+    channel = ProgressChannel()
+
+    async def runner():
+        _current_channel.set(channel)
+        try:
+            result = await work()
+            channel.publish("complete", result=result)
+        except Exception as e:
+            logger.exception("Streamed work failed")
+            channel.publish("error", error={"error": str(e), "error_type": type(e).__name__})
+        finally:
+            channel.close()
+
+    task = asyncio.create_task(runner())
+    try:
+        async for event in channel.events():
+            yield event
+    finally:
+        if not task.done():
+            task.cancel()
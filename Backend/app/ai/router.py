@@ -1,35 +1,129 @@
-from fastapi import APIRouter, HTTPException, File, UploadFile, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, File, UploadFile, Query, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from app.ai.schemas import (
     IngredientAnalysisRequest, 
     AnalysisResponse,
     DecisionRequest,
-    DecisionEngineResponse
+    DecisionEngineResponse,
+    DecisionBatchRequest,
+    LLMUsage
 )
-from app.ai.comparison_schemas import ComparisonRequest, ComparisonResponse
+from app.ai.comparison_schemas import ComparisonRequest, ComparisonResponse, RankingRequest, RankingResponse
 from app.ai.service import ai_service
 from app.ai.coordinator import coordinator
 from app.ai.autonomous_agent import autonomous_agent
 from app.ai.comparison_service import comparison_service
+from app.ai.progress import run_with_progress
+from app.ai.vision_extractor import vision_extractor, VisionExtractionFailed
+from app.ai.batch_service import batch_service
+from app.ai.cache import EncodedResult, decision_cache
+from app.ai.near_duplicate import near_duplicate_index
+from app.ai.usage import current_usage
+from config.settings import (
+    MAX_IMAGES_PER_REQUEST, BATCH_MAX_ITEMS, RANKING_MAX_PRODUCTS, LLM_USAGE_IN_RESPONSE, HTTP_CACHE_MAX_AGE_SECONDS
+)
+from typing import List, Optional
 import json
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/analyze", tags=["AI Analysis"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+    "Connection": "keep-alive"
+}
+
+
+def _sse_event(payload: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"data: {json.dumps(jsonable_encoder(payload))}\n\n"
+
+
+async def _read_images(file: Optional[UploadFile], files: Optional[List[UploadFile]]) -> List[bytes]:
+    """Collect uploads from the single 'file' field and/or the repeated 'files' field"""
+    uploads = ([file] if file else []) + list(files or [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="At least one image is required")
+    if len(uploads) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+    for upload in uploads:
+        if not (upload.content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+    return [await upload.read() for upload in uploads]
+
+
+def _with_usage(result):
+    """
+    Attach this request's LLM usage when LLM_USAGE_IN_RESPONSE is enabled.
+    Returns a copy: results may be shared cache entries.
+    """
+    usage = current_usage() if LLM_USAGE_IN_RESPONSE else None
+    if usage is None:
+        return result
+    if isinstance(result, dict):
+        return {**result, "usage": usage}
+    return result.copy(update={"usage": LLMUsage(**usage)})
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check: '*' or any listed tag (weak comparison, as RFC 9110 specifies for it)"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _decision_result(result, if_none_match: Optional[str] = None, cache_control: Optional[str] = None):
+    """
+    Response for a decision from coordinator.process(..., encoded=True).
+    
+    Results from the exact cache go out as their stored JSON bytes in a raw
+    Response (skipping response_model validation and encoding) with their
+    ETag, or as an empty 304 when If-None-Match already names that ETag.
+    """
+    headers = {"Cache-Control": cache_control} if cache_control else {}
+    if isinstance(result, EncodedResult):
+        headers["ETag"] = result.etag
+        if if_none_match and _etag_matches(if_none_match, result.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(result.body, media_type="application/json", headers=headers)
+    result = _with_usage(result)
+    if headers:
+        return JSONResponse(jsonable_encoder(result), headers=headers)
+    return result
+
+
+def _progress_stream(work) -> StreamingResponse:
+    """Stream a workflow's request-scoped progress events as SSE"""
+    async def event_generator():
+        async for event in run_with_progress(work):
+            yield _sse_event(event)
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # ============================================================================
 # AUTONOMOUS AGENT ENDPOINTS (Multi-step orchestration)
 # ============================================================================
 
 @router.post("/autonomous/image")
 async def autonomous_analyze_image(
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
     user_query: str = Query(None, description="Optional user query for context")
 ):
     """
     AUTONOMOUS AI AGENT - Image Analysis
     
+    Accepts one image ('file') or several photos of the same product
+    ('files': front of pack, ingredient panel, nutrition panel), which are
+    read together in a single vision call.
+    
     This endpoint orchestrates a multi-step autonomous workflow:
-    1. Analyzes image to extract summary and key takeaways
+    1. Analyzes image(s) to extract summary and key takeaways
     2. Autonomously decides next steps based on initial analysis
     3. Executes follow-up actions (decision engine, product search, etc.
     4. Synthesizes all information into comprehensive response
@@ -38,38 +132,31 @@ async def autonomous_analyze_image(
     information would be most valuable to the user.
     """
     import traceback
-    import sys
     
-    print(f"📸 Autonomous image analysis request received")
-    print(f"   File: {file.filename}, Content-Type: {file.content_type}")
-    print(f"   User query: {user_query}")
+    logger.info("📸 Autonomous image analysis request received (user query: %s)", user_query)
     
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    images = await _read_images(file, files)
     
     try:
-        contents = await file.read()
-        print(f"   Image size: {len(contents)} bytes")
+        logger.info("   Images: %d, total size: %d bytes", len(images), sum(len(i) for i in images))
         
         # Check if autonomous_agent is properly initialized
         if not hasattr(autonomous_agent, 'model') or autonomous_agent.model is None:
             error_msg = "Autonomous agent not initialized. Check API key configuration."
-            print(f"❌ ERROR: {error_msg}")
-            print(f"   - Has model attr: {hasattr(autonomous_agent, 'model')}")
-            if hasattr(autonomous_agent, 'model'):
-                print(f"   - Model is None: {autonomous_agent.model is None}")
+            logger.error("❌ %s (has model attr: %s)", error_msg, hasattr(autonomous_agent, 'model'))
             raise HTTPException(status_code=500, detail=error_msg)
         
-        print(f"✅ Autonomous agent model is initialized")
         result = await autonomous_agent.analyze_autonomously(
-            image_data=contents,
+            images=images,
             user_query=user_query
         )
-        print(f"✅ Analysis complete, returning result")
-        return result
+        logger.info("✅ Analysis complete, returning result")
+        return _with_usage(result)
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except VisionExtractionFailed as e:
+        raise HTTPException(status_code=502, detail=f"Image analysis is temporarily unavailable: {str(e)}")
     except Exception as e:
         # Log full error details
         error_details = {
@@ -78,14 +165,7 @@ async def autonomous_analyze_image(
             "traceback": traceback.format_exc()
         }
         
-        print(f"\n{'='*60}")
-        print(f"❌ AUTONOMOUS AGENT ERROR")
-        print(f"{'='*60}")
-        print(f"Error Type: {error_details['error_type']}")
-        print(f"Error Message: {error_details['error_message']}")
-        print(f"\nFull Traceback:")
-        print(error_details['traceback'])
-        print(f"{'='*60}\n")
+        logger.exception("❌ Autonomous agent error: %s: %s", error_details['error_type'], error_details['error_message'])
         
         # Return more detailed error in development
         from config.settings import ENV
@@ -120,10 +200,9 @@ async def autonomous_analyze_text(
             text_data=text,
             user_query=user_query
         )
-        return result
+        return _with_usage(result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Autonomous agent error")
         raise HTTPException(status_code=500, detail=f"Autonomous agent error: {str(e)}")
 
 
@@ -141,93 +220,38 @@ async def autonomous_analyze_text_stream(
     Events:
     - step_start: New step beginning
     - step_complete: Step finished with results
+    - stage_start / stage_complete: Decision engine stages (partial results)
     - complete: Final comprehensive result
     - error: Error occurred
     """
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
-    async def event_generator():
-        try:
-            # Step 1: Initial Analysis
-            yield f"data: {json.dumps({'event': 'step_start', 'step': 1, 'name': 'initial_analysis',  'message': 'Analyzing ingredients...'})}\n\n"
-            
-            initial_result = await ai_service.analyze_text(text)
-            
-            key_takeaways = []
-            if initial_result.trade_offs.pros:
-                key_takeaways.extend([f"✓ {pro}" for pro in initial_result.trade_offs.pros[:2]])
-            if initial_result.trade_offs.cons:
-                key_takeaways.extend([f"⚠ {con}" for con in initial_result.trade_offs.cons[:2]])
-            
-            initial_analysis = {
-                "insight": initial_result.insight,
-                "detailed_reasoning": initial_result.detailed_reasoning,
-                "trade_offs": initial_result.trade_offs.dict(),
-                "key_takeaways": key_takeaways,
-                "uncertainty_note": initial_result.uncertainty_note,
-                "text": text
-            }
-            
-            yield f"data: {json.dumps({'event': 'step_complete', 'step': 1, 'name': 'initial_analysis', 'result': initial_analysis})}\n\n"
-            
-            # Step 2: Decision Engine
-            yield f"data: {json.dumps({'event': 'step_start', 'step': 2, 'name': 'decision_engine', 'message': 'Running decision engine...'})}\n\n"
-            
-            request = DecisionRequest(text=text, conversation_context=user_query)
-            decision_result = await coordinator.process(request)
-            
-            decision_data = {
-                "quick_insight": decision_result.quick_insight.dict(),
-                "explanation": decision_result.explanation.dict(),
-                "intent_classified": decision_result.intent_classified,
-                "key_signals": decision_result.key_signals,
-                "ingredient_translations": [t.dict() for t in decision_result.ingredient_translations],
-                "uncertainty_flags": decision_result.uncertainty_flags,
-                "structured_analysis": decision_result.structured_analysis.dict() if decision_result.structured_analysis else None
-            }
-            
-            yield f"data: {json.dumps({'event': 'step_complete', 'step': 2, 'name': 'decision_engine', 'result': decision_data})}\n\n"
-            
-            # Step 3: Synthesis
-            yield f"data: {json.dumps({'event': 'step_start', 'step': 3, 'name': 'synthesis', 'message': 'Creating summary...'})}\n\n"
-            
-            synthesis = {
-                "executive_summary": decision_result.quick_insight.summary,
-                "key_takeaways": decision_result.explanation.why_this_matters[:3],
-                "confidence_level": "low" if len(decision_result.uncertainty_flags) > 2 else "medium" if len(decision_result.uncertainty_flags) > 0 else "high",
-                "next_steps": ["Review ingredient translations for details", "Check structured analysis for technical information"]
-            }
-            
-            yield f"data: {json.dumps({'event': 'step_complete', 'step': 3, 'name': 'synthesis', 'result': synthesis})}\n\n"
-            
-            # Send final complete result
-            final_result = {
-                "initial_analysis": initial_analysis,
-                "workflow_steps": [
-                    {"action": "analyze_text", "description": "Initial text analysis", "result": initial_analysis, "reasoning": "Extracted summary and key takeaways"},
-                    {"action": "decision_engine", "description": "Deep analysis with multi-agent decision engine", "result": decision_data, "reasoning": "Complete ingredient interpretation and intent classification"}
-                ],
-                "synthesis": synthesis,
-                "total_steps": 2
-            }
-            
-            yield f"data: {json.dumps({'event': 'complete', 'result': final_result})}\n\n"
-            
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            error_data = {"error": str(e), "traceback": traceback.format_exc()}
-            yield f"data: {json.dumps({'event': 'error', 'error': error_data})}\n\n"
+    return _progress_stream(
+        lambda: autonomous_agent.analyze_autonomously(text_data=text, user_query=user_query)
+    )
+
+
+@router.post("/autonomous/image/stream")
+async def autonomous_analyze_image_stream(
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
+    user_query: str = Query(None, description="Optional user query for context")
+):
+    """
+    AUTONOMOUS AI AGENT - Image Analysis (Streaming)
     
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-            "Connection": "keep-alive"
-        }
+    Same workflow as /autonomous/image, delivered as Server-Sent Events
+    (see /autonomous/text/stream for the event types).
+    """
+    # Read the uploads before streaming starts (files are closed once the endpoint returns)
+    images = await _read_images(file, files)
+    
+    if autonomous_agent.model is None:
+        raise HTTPException(status_code=500, detail="Autonomous agent not initialized. Check API key configuration.")
+    
+    return _progress_stream(
+        lambda: autonomous_agent.analyze_autonomously(images=images, user_query=user_query)
     )
 
 # ============================================================================
@@ -250,81 +274,124 @@ async def compare_products(request: ComparisonRequest):
     
     try:
         result = await comparison_service.compare_products(request)
-        return result
+        return _with_usage(result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Comparison error")
         raise HTTPException(status_code=500, detail=f"Comparison error: {str(e)}")
 
+@router.post("/compare/rank", response_model=RankingResponse)
+async def rank_products(request: RankingRequest):
+    """
+    PRODUCT RANKING
+    
+    Rank many products (e.g. a shelf of cereals) best-first:
+    - Analyzes every product with the decision engine (cached, in parallel)
+    - Orders them locally by the decision engine's numeric score
+    - Makes a single AI call to narrate the top differences
+    """
+    if len(request.products) < 2:
+        raise HTTPException(status_code=400, detail="At least two products are required")
+    if len(request.products) > RANKING_MAX_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {RANKING_MAX_PRODUCTS} products can be ranked at once")
+    if any(not product.text.strip() for product in request.products):
+        raise HTTPException(status_code=400, detail="All product texts must be provided")
+    
+    try:
+        return _with_usage(await comparison_service.rank_products(request))
+    except Exception as e:
+        logger.exception("Ranking error")
+        raise HTTPException(status_code=500, detail=f"Ranking error: {str(e)}")
+
 # ============================================================================
 # Decision engine endpoints (more specific routes first)
 # ============================================================================
 @router.post("/decision/image", response_model=DecisionEngineResponse)
 async def analyze_decision_image(
-    file: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
     conversation_context: str = Query(None, description="Previous conversation context for follow-up queries")
 ):
     """
     Decision engine endpoint for image input.
-    Extracts ingredient/nutrition info from image, then processes through decision engine.
+    Extracts ingredient/nutrition info from one or more photos of the same
+    product in a single vision call, then runs the merged text through the
+    decision engine once.
     """
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    images = await _read_images(file, files)
     
     try:
-        import google.generativeai as genai
-        import PIL.Image
-        import io
-        from config.settings import GEMINI_API_KEY
-        
-        if not GEMINI_API_KEY:
-            raise HTTPException(status_code=500, detail="AI service not configured")
+        # A single (cached) vision call extracts the label text from all photos
+        extraction = await vision_extractor.extract(images)
+        extracted_text = extraction.label_text
         
-        # Read image
-        contents = await file.read()
-        image = PIL.Image.open(io.BytesIO(contents))
-        
-        # Extract text from image using Gemini Vision
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        extraction_prompt = """Extract all ingredient and nutrition information from this food label image.
-
-Return ONLY the following information in a clear, structured format:
-1. Ingredients list (if visible)
-2. Nutrition facts (if visible) - include all values like calories, carbs, sugars, protein, fiber, fat, etc.
-3. Any other relevant product information
-
-Format your response as:
-INGREDIENTS:
-[list all ingredients]
-
-NUTRITION FACTS:
-[all nutrition information]
-
-If any information is unclear or missing, note that in your response."""
-        
-        import asyncio
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: model.generate_content([extraction_prompt, image])
-        )
-        
-        extracted_text = response.text.strip()
+        if not extracted_text:
+            # The model read the photo but found no label text
+            raise HTTPException(
+                status_code=422,
+                detail=f"No ingredient or nutrition text could be read from the image. {extraction.uncertainty_note or ''}".strip()
+            )
         
         # Create DecisionRequest with extracted text
         decision_request = DecisionRequest(text=extracted_text, conversation_context=conversation_context)
         
         # Process through decision engine
-        result = await coordinator.process(decision_request, conversation_context=conversation_context)
-        return result
+        result = await coordinator.process(
+            decision_request,
+            conversation_context=conversation_context,
+            encoded=not LLM_USAGE_IN_RESPONSE
+        )
+        return _decision_result(result)
         
+    except HTTPException:
+        raise
+    except VisionExtractionFailed as e:
+        raise HTTPException(status_code=502, detail=f"Image analysis is temporarily unavailable: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Decision engine image processing error")
         raise HTTPException(status_code=500, detail=f"Decision engine image processing error: {str(e)}")
 
+@router.post("/decision/batch")
+async def analyze_decision_batch(request: DecisionBatchRequest):
+    """
+    Batch decision engine endpoint for catalogue ingestion.
+    
+    Accepts up to BATCH_MAX_ITEMS products. Duplicates (by normalized text)
+    are analyzed once, cache hits are returned immediately and misses run
+    with key-pool-aware concurrency. Results stream back as NDJSON, one line
+    per input item in completion order:
+    
+    {"index": 0, "id": "...", "status": "ok", "cached": false, "deduplicated": false, "result": {...}}
+    {"index": 1, "id": "...", "status": "error", "error": "..."}
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch cannot exceed {BATCH_MAX_ITEMS} items")
+    
+    async def line_generator():
+        async for line in batch_service.run(request.items):
+            yield json.dumps(jsonable_encoder(line)) + "\n"
+    
+    return StreamingResponse(line_generator(), media_type="application/x-ndjson")
+
+@router.post("/decision/stream")
+async def analyze_decision_stream(request: DecisionRequest):
+    """
+    Decision engine endpoint (Streaming).
+    
+    Streams Server-Sent Events as each decision engine stage finishes
+    (stage_start / stage_complete), followed by a 'complete' event carrying
+    the full DecisionEngineResponse, or an 'error' event.
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    
+    return _progress_stream(
+        lambda: coordinator.process(request, conversation_context=request.conversation_context)
+    )
+
 @router.post("/decision", response_model=DecisionEngineResponse)
 async def analyze_decision(request: DecisionRequest):
     """
@@ -339,12 +406,56 @@ async def analyze_decision(request: DecisionRequest):
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
     try:
-        result = await coordinator.process(request, conversation_context=request.conversation_context)
-        return result
+        # Cached results come back as stored JSON bytes with an ETag (not with LLM_USAGE_IN_RESPONSE,
+        # which adds this request's usage to the body)
+        result = await coordinator.process(
+            request,
+            conversation_context=request.conversation_context,
+            encoded=not LLM_USAGE_IN_RESPONSE
+        )
+        return _decision_result(result)
+    except Exception as e:
+        logger.exception("Decision engine error")
+        raise HTTPException(status_code=500, detail=f"Decision engine error: {str(e)}")
+
+@router.get("/decision", response_model=DecisionEngineResponse)
+async def analyze_decision_get(
+    text: str = Query(..., description="Ingredient text"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Cacheable decision engine endpoint for plain ingredient lists (no
+    conversation context, so the result is the same for every caller).
+    
+    Results from the exact decision cache carry an ETag and a public
+    Cache-Control, so browsers and CDNs can reuse them; a matching
+    If-None-Match gets an empty 304 straight from the decision cache, without
+    running the pipeline. Anything else (near-duplicate reuse, usage mode)
+    is sent with no-store.
+    """
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    
+    try:
+        result = await coordinator.process(DecisionRequest(text=text), encoded=not LLM_USAGE_IN_RESPONSE)
+        # Only exact-cache results (with an ETag) are shared; near-duplicate
+        # adaptations and per-request usage must not be stored under this URL
+        if isinstance(result, EncodedResult):
+            cache_control = f"public, max-age={HTTP_CACHE_MAX_AGE_SECONDS}"
+        else:
+            cache_control = "no-store"
+        return _decision_result(result, if_none_match=if_none_match, cache_control=cache_control)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Decision engine error")
         raise HTTPException(status_code=500, detail=f"Decision engine error: {str(e)}")
 
+@router.get("/decision/cache/stats")
+async def decision_cache_stats():
+    """Hit rates of the exact decision cache and the near-duplicate reuse layer"""
+    return {
+        "decision_cache": decision_cache.get_stats(),
+        "near_duplicate": near_duplicate_index.get_stats()
+    }
+
 # Legacy endpoints have been removed.
 # Use /autonomous/text, /autonomous/image, or /decision instead.
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Literal
+from pydantic import BaseModel, PrivateAttr
+from typing import Dict, List, Optional, Literal
 
 # Legacy schemas (kept for backward compatibility)
 class IngredientAnalysisRequest(BaseModel):
@@ -14,6 +14,42 @@ class AnalysisResponse(BaseModel):
     detailed_reasoning: str
     trade_offs: TradeOff
     uncertainty_note: Optional[str] = None
+    # Set on the fallback returned when generation failed (not in the schema or the JSON)
+    _degraded: bool = PrivateAttr(default=False)
+
+    @property
+    def degraded(self) -> bool:
+        return self._degraded
+
+class LabelExtraction(BaseModel):
+    """Single vision pass over a label: verbatim text plus the initial analysis"""
+    ingredients_text: str = ""  # Verbatim ingredient list
+    nutrition_text: str = ""  # Verbatim nutrition facts
+    other_text: str = ""  # Product name, claims, allergen statements
+    insight: str
+    detailed_reasoning: str
+    trade_offs: TradeOff
+    uncertainty_note: Optional[str] = None
+
+    @property
+    def label_text(self) -> str:
+        """Extracted text in the format downstream text agents expect"""
+        sections = []
+        if self.ingredients_text.strip():
+            sections.append(f"INGREDIENTS:\n{self.ingredients_text.strip()}")
+        if self.nutrition_text.strip():
+            sections.append(f"NUTRITION FACTS:\n{self.nutrition_text.strip()}")
+        if self.other_text.strip():
+            sections.append(f"OTHER PRODUCT INFORMATION:\n{self.other_text.strip()}")
+        return "\n\n".join(sections)
+
+    def to_analysis(self) -> AnalysisResponse:
+        return AnalysisResponse(
+            insight=self.insight,
+            detailed_reasoning=self.detailed_reasoning,
+            trade_offs=self.trade_offs,
+            uncertainty_note=self.uncertainty_note
+        )
 
 # New Decision Engine Schemas
 class IngredientSummary(BaseModel):
@@ -49,8 +85,25 @@ class DecisionRequest(BaseModel):
     include_nutrition: Optional[str] = None  # Optional nutrition info
     conversation_context: Optional[str] = None  # Previous messages for follow-up queries
 
+class DecisionBatchItem(BaseModel):
+    """One product in a batch decision request"""
+    id: Optional[str] = None  # Caller's identifier, echoed back in the result line
+    text: str
+    user_intent: Optional[Literal["quick_yes_no", "comparison", "risk_check", "curiosity"]] = None
+    include_nutrition: Optional[str] = None
+
+class DecisionBatchRequest(BaseModel):
+    items: List[DecisionBatchItem]
+
+class RuleContribution(BaseModel):
+    rule: str
+    contribution: float  # Points this rule added to (or removed from) the score
+    signal: Optional[str] = None  # User-facing signal, if the rule produced one
+
 class Decision(BaseModel):
-    key_signals: List[str]
+    key_signals: List[str]  # Top 3 signals by absolute contribution
+    score: float = 0.0  # Rule-based total, higher = better for daily use
+    contributions: List[RuleContribution] = []
 
 class ConsumerExplanation(BaseModel):
     why_this_matters: List[str]  # Max 3 bullet points
@@ -63,11 +116,28 @@ class IngredientTranslation(BaseModel):
     simple_explanation: str
     category: str  # e.g., "preservative", "sweetener", "emulsifier"
 
+class IntentClassification(BaseModel):
+    intent: Literal["quick_yes_no", "comparison", "risk_check", "curiosity"]
+
 class QuickInsight(BaseModel):
     """One-line summary for instant understanding"""
     summary: str  # One clear sentence
     uncertainty_reason: Optional[str] = None
 
+class AgentUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+class LLMUsage(BaseModel):
+    """LLM calls, tokens and estimated cost spent on one request (debug field)"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    estimated_calls: int = 0  # Calls without usage metadata, counted with the local estimate
+    cost_usd: float = 0.0
+    by_agent: Dict[str, AgentUsage] = {}
+
 class DecisionEngineResponse(BaseModel):
     # Instant understanding (show first)
     quick_insight: QuickInsight
@@ -87,4 +157,11 @@ class DecisionEngineResponse(BaseModel):
     
     # Technical details (optional, for transparency/debugging)
     structured_analysis: Optional[StructuredIngredientAnalysis] = None
+    
+    # Set when the analysis was reused from a near-identical ingredient list
+    near_duplicate: bool = False
+    near_duplicate_similarity: Optional[float] = None  # Jaccard similarity of the ingredient sets
+    
+    # LLM usage for this request, only when LLM_USAGE_IN_RESPONSE is enabled
+    usage: Optional[LLMUsage] = None
 
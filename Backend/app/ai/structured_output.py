@@ -0,0 +1,121 @@
+"""
+Structured Output
+Gemini response schemas derived from the Pydantic models, validated parsing and a single repair retry
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from pydantic import TypeAdapter, ValidationError
+from app.ai.llm import generate
+from app.ai.metrics import llm_repairs
+from app.ai.prompts import JSON_REPAIR
+
+logger = logging.getLogger(__name__)
+
+# Invalid output quoted back to the model in the repair prompt
+REPAIR_MAX_OUTPUT_CHARS = 4000
+REPAIR_MAX_ERRORS = 10
+
+
+def _gemini_schema(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert one JSON Schema node from Pydantic into the OpenAPI subset Gemini
+    accepts: $refs inlined, Optional[X] as nullable X, and no titles or
+    defaults (fields with defaults are simply not required).
+    """
+    if "$ref" in node:
+        node = defs[node["$ref"].rsplit("/", 1)[-1]]
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        if len(options) != 1:
+            raise ValueError(f"Only Optional[...] unions can be expressed as a Gemini schema: {node}")
+        schema = _gemini_schema(options[0], defs)
+        if len(options) < len(node["anyOf"]):
+            schema["nullable"] = True
+        return schema
+
+    schema: Dict[str, Any] = {}
+    for key in ("type", "format", "enum"):
+        if key in node:
+            schema[key] = node[key]
+    if "const" in node:
+        schema["enum"] = [node["const"]]
+    if "items" in node:
+        schema["items"] = _gemini_schema(node["items"], defs)
+    if node.get("type") == "object":
+        # Model docstrings are for developers; only field descriptions go to the model
+        schema["properties"] = {name: _gemini_schema(prop, defs) for name, prop in node.get("properties", {}).items()}
+        if node.get("required"):
+            schema["required"] = list(node["required"])
+    elif "description" in node:
+        schema["description"] = node["description"]
+    return schema
+
+
+@lru_cache(maxsize=None)
+def _adapter(output_type: Any) -> TypeAdapter:
+    return TypeAdapter(output_type)
+
+
+@lru_cache(maxsize=None)
+def response_schema(output_type: Any) -> Dict[str, Any]:
+    """Gemini response_schema for a Pydantic model or List[Model], built once per type"""
+    json_schema = _adapter(output_type).json_schema()
+    return _gemini_schema(json_schema, json_schema.get("$defs", {}))
+
+
+def json_config(output_type: Any, temperature: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Generation config constraining the response to output_type's schema
+    (a plain dict, which generate_content accepts, so the SDK is not imported here)
+    """
+    config = {"response_mime_type": "application/json", "response_schema": response_schema(output_type)}
+    if temperature is not None:
+        config["temperature"] = temperature
+    return config
+
+
+def _describe_errors(error: ValidationError) -> str:
+    lines = []
+    for detail in error.errors()[:REPAIR_MAX_ERRORS]:
+        location = ".".join(str(part) for part in detail["loc"]) or "(root)"
+        lines.append(f"- {location}: {detail['msg']}")
+    return "\n".join(lines)
+
+
+async def generate_structured(
+    model: Any,
+    contents: Any,
+    output_type: Any,
+    temperature: Optional[float] = None,
+    agent: str = "llm"
+) -> Any:
+    """
+    Generate under output_type's response schema and validate the JSON text
+    straight into output_type (no intermediate json.loads).
+
+    If the output still fails validation, the model gets one repair attempt:
+    the original request plus its invalid output and the validation errors.
+    A second failure raises the ValidationError.
+    """
+    adapter = _adapter(output_type)
+    generation_config = json_config(output_type, temperature)
+    response = await generate(model, contents, generation_config=generation_config, agent=agent)
+    try:
+        return adapter.validate_json(response.text)
+    except ValidationError as e:
+        logger.warning("⚠️  %s output failed validation (%s error(s)), retrying once with the errors", agent, e.error_count())
+        repair = JSON_REPAIR.render(
+            previous_output=response.text[:REPAIR_MAX_OUTPUT_CHARS],
+            errors=_describe_errors(e)
+        )
+
+    parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    response = await generate(model, [*parts, repair], generation_config=generation_config, agent=agent)
+    try:
+        result = adapter.validate_json(response.text)
+    except ValidationError:
+        llm_repairs.inc(agent, "failed")
+        raise
+    llm_repairs.inc(agent, "repaired")
+    return result
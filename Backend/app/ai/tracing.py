@@ -0,0 +1,252 @@
+"""
+Request Tracing
+Request-scoped spans for agent calls, key attempts, cache lookups and executor waits
+"""
+import itertools
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from config.settings import TRACING_ENABLED, OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME
+from config.log import bind_request_id
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_METRIC_NAME = re.compile(r"[^A-Za-z0-9._-]")
+
+# Server-Timing entries per response; spans beyond this are only exported
+SERVER_TIMING_MAX_ENTRIES = 20
+
+
+class Span:
+    """One timed operation inside a request (times are perf_counter seconds)"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], start: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return 1000 * ((self.end or time.perf_counter()) - self.start)
+
+
+class _NoopSpan:
+    """Stands in for a span when no request is being traced"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """All spans of one request, under a root span for the request itself"""
+
+    def __init__(self, request_id: str, name: str, traceparent: Optional[str] = None):
+        self.request_id = request_id
+        self.traceparent = traceparent
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        # Anchor perf_counter readings to wall-clock time for exporters
+        self._epoch_ns = time.time_ns()
+        self._perf_origin = time.perf_counter()
+        self.root = self.start_span(name, None, {"request.id": request_id})
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any], start: Optional[float] = None) -> Span:
+        span = Span(
+            name,
+            next(self._ids),
+            parent.span_id if parent else None,
+            time.perf_counter() if start is None else start,
+            attributes
+        )
+        self.spans.append(span)
+        return span
+
+    def epoch_ns(self, perf_time: float) -> int:
+        return self._epoch_ns + int((perf_time - self._perf_origin) * 1e9)
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: total duration per span name so far
+        (e.g. 'stage.interpretation;dur=812.4, llm.interpreter;dur=806.1')
+        """
+        totals: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            if span.end is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        entries = [f"total;dur={self.root.duration_ms:.1f}"]
+        for name, duration in sorted(totals.items(), key=lambda item: -item[1])[:SERVER_TIMING_MAX_ENTRIES - 1]:
+            entries.append(f"{_METRIC_NAME.sub('_', name)};dur={duration:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    """Request ID of the request being handled, if any"""
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+bind_request_id(current_request_id)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Time a block as a child of the current span.
+    Outside a traced request this does nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+    current = trace.start_span(name, _current_span.get() or trace.root, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def record_span(name: str, start: float, end: float, **attributes: Any):
+    """Add an already-finished span (e.g. time a call spent queued for an executor thread)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    finished = trace.start_span(name, _current_span.get() or trace.root, attributes, start=start)
+    finished.end = end
+
+
+class OTelExporter:
+    """
+    Mirrors finished traces to OpenTelemetry when OTEL_EXPORTER_OTLP_ENDPOINT is set
+    (e.g. a local collector at http://localhost:4318). Needs the optional
+    opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http packages.
+    """
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.tracer = None
+        if not endpoint:
+            return
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("⚠️  OTEL_EXPORTER_OTLP_ENDPOINT is set but OpenTelemetry is not installed; spans stay local")
+            return
+
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))  # Reads the OTEL_* endpoint variables
+        self.tracer = provider.get_tracer("unlabel.tracing")
+        logger.info("🔭 Exporting traces to %s", endpoint)
+
+    def export(self, trace: Trace):
+        """Replay a finished trace as OpenTelemetry spans (the batch processor sends them off-thread)"""
+        if self.tracer is None:
+            return
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.propagate import extract
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+
+        parent_context = extract({"traceparent": trace.traceparent}) if trace.traceparent else None
+        exported = {}
+        for span in trace.spans:
+            parent = exported.get(span.parent_id)
+            otel_span = self.tracer.start_span(
+                span.name,
+                context=otel_trace.set_span_in_context(parent) if parent else parent_context,
+                kind=SpanKind.SERVER if span is trace.root else SpanKind.INTERNAL,
+                start_time=trace.epoch_ns(span.start),
+                attributes={
+                    key: value for key, value in span.attributes.items()
+                    if isinstance(value, (str, bool, int, float))
+                },
+            )
+            if span.error:
+                otel_span.set_status(Status(StatusCode.ERROR, span.error))
+            exported[span.span_id] = otel_span
+        for span in trace.spans:
+            exported[span.span_id].end(end_time=trace.epoch_ns(span.end or trace.root.end))
+
+
+exporter = OTelExporter(OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME) if TRACING_ENABLED else None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that traces each HTTP request.
+
+    Accepts or assigns an X-Request-ID, and adds X-Request-ID and
+    Server-Timing to the response headers. For streaming responses the
+    headers go out before the body, so Server-Timing only covers the work
+    done before streaming started; the full trace is still exported.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        if not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+
+        trace = Trace(request_id, f"{scope['method']} {scope['path']}", traceparent)
+        trace.root.set_attribute("http.method", scope["method"])
+        trace.root.set_attribute("http.target", scope["path"])
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                trace.root.set_attribute("http.status_code", message["status"])
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [
+                        (b"x-request-id", request_id.encode("latin-1")),
+                        (b"server-timing", trace.server_timing().encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        except BaseException as e:
+            trace.root.error = type(e).__name__
+            raise
+        finally:
+            trace.root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if exporter is not None:
+                exporter.export(trace)
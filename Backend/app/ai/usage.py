@@ -0,0 +1,114 @@
+"""
+LLM Token Usage
+Per-call token accounting, aggregated per agent, per route and per request
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.ai.agent_context import estimate_tokens
+from app.ai.metrics import llm_tokens, llm_cost
+from app.ai.model_backend import prompt_text
+from config.settings import LLM_PRICE_INPUT_PER_MTOK, LLM_PRICE_OUTPUT_PER_MTOK
+
+# Gemini bills an inline image at a flat token count
+IMAGE_TOKEN_ESTIMATE = 258
+
+
+def _count_images(contents: Any) -> int:
+    if isinstance(contents, dict):
+        return 1 if "data" in contents else 0
+    if isinstance(contents, (list, tuple)):
+        return sum(_count_images(part) for part in contents)
+    return 0
+
+
+def call_cost(prompt_tokens: int, output_tokens: int) -> float:
+    """USD cost of one call at the configured per-million-token prices"""
+    return (prompt_tokens * LLM_PRICE_INPUT_PER_MTOK + output_tokens * LLM_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+
+
+def token_counts(contents: Any, response: Any) -> Tuple[int, int, bool]:
+    """
+    (prompt tokens, output tokens, estimated) for one call.
+    Uses the response's usage metadata when present, else a local estimate.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    if prompt_tokens:
+        return prompt_tokens, output_tokens, False
+
+    prompt_tokens = estimate_tokens(prompt_text(contents)) + IMAGE_TOKEN_ESTIMATE * _count_images(contents)
+    try:
+        output_tokens = estimate_tokens(response.text or "")
+    except Exception:
+        output_tokens = 0  # Blocked or empty responses have no text
+    return prompt_tokens, output_tokens, True
+
+
+class UsageLedger:
+    """Token totals for the LLM calls made while handling one request"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.estimated_calls = 0
+        self.by_agent: Dict[str, Dict[str, int]] = {}
+
+    def add(self, agent: str, prompt_tokens: int, output_tokens: int, estimated: bool):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.output_tokens += output_tokens
+        self.estimated_calls += estimated
+        entry = self.by_agent.setdefault(agent, {"calls": 0, "prompt_tokens": 0, "output_tokens": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["output_tokens"] += output_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "estimated_calls": self.estimated_calls,
+            "cost_usd": round(call_cost(self.prompt_tokens, self.output_tokens), 6),
+            "by_agent": {agent: dict(entry) for agent, entry in self.by_agent.items()},
+        }
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar("usage_ledger", default=None)
+
+
+@contextmanager
+def usage_scope() -> Iterator[UsageLedger]:
+    """Collect usage for the enclosed work (joins an enclosing scope if there is one)"""
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        yield ledger
+        return
+    ledger = UsageLedger()
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+def record_usage(agent: str, contents: Any, response: Any):
+    """Account one successful call to the agent's metrics and the current request's ledger"""
+    prompt_tokens, output_tokens, estimated = token_counts(contents, response)
+    source = "estimated" if estimated else "reported"
+    llm_tokens.inc(agent, "prompt", source, amount=prompt_tokens)
+    llm_tokens.inc(agent, "output", source, amount=output_tokens)
+    llm_cost.inc(agent, amount=call_cost(prompt_tokens, output_tokens))
+
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.add(agent, prompt_tokens, output_tokens, estimated)
+
+
+def current_usage() -> Optional[Dict[str, Any]]:
+    """Usage so far for the current request, or None outside a usage scope"""
+    ledger = _current_ledger.get()
+    return ledger.as_dict() if ledger is not None else None
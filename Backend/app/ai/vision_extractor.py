@@ -0,0 +1,128 @@
+"""
+Vision Label Extractor
+One vision call per product: verbatim label text plus the initial food analysis
+"""
+import asyncio
+import logging
+from typing import List
+from pydantic import ValidationError
+from app.ai.key_manager import key_manager
+from app.ai.structured_output import generate_structured
+from app.ai.schemas import LabelExtraction
+from app.ai.image_pipeline import prepare_image_async
+from app.ai.prompts import VISION_EXTRACTION
+from app.ai.cache import vision_cache, fingerprint_bytes
+
+logger = logging.getLogger(__name__)
+
+MULTI_IMAGE_NOTE = """
+These {count} images are different photos of the SAME product (e.g. front of pack,
+ingredient panel, nutrition panel). Combine them into one transcription: where
+photos overlap, include each piece of text only once.
+"""
+
+
+# Lines shorter than this are never treated as partial crops of a longer line
+MIN_CONTAINED_LINE_LENGTH = 25
+
+
+class VisionExtractionFailed(Exception):
+    """The vision call failed on every key, or its output stayed invalid after the repair retry"""
+
+
+def _merge_lines(text: str) -> str:
+    """
+    De-duplicate overlapping transcriptions: drops repeated lines and long
+    lines that are fully contained in a longer line (partial crops of the
+    same panel). Short lines such as "Fat 1g" are only dropped on exact repeats,
+    since they legitimately appear inside other lines ("Saturated Fat 1g").
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    normalized = [" ".join(line.lower().split()) for line in lines]
+    kept = []
+    for idx, line in enumerate(lines):
+        norm = normalized[idx]
+        duplicate = any(
+            (norm == other and j < idx)
+            or (len(norm) >= MIN_CONTAINED_LINE_LENGTH and norm != other and norm in other)
+            for j, other in enumerate(normalized)
+            if j != idx
+        )
+        if not duplicate:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+class VisionExtractor:
+    """
+    Extracts label text and the AnalysisResponse fields from one or more
+    photos of a product in a single structured vision call. Results are
+    cached by image fingerprints, so repeated uploads of the same photos
+    cost no vision calls at all.
+    """
+
+    def __init__(self):
+        if not key_manager:
+            self.use_key_manager = False
+            return
+        self.use_key_manager = True
+
+    @staticmethod
+    def cache_key(images: List[bytes]) -> str:
+        """Order-independent key for a set of photos"""
+        return "images:" + ",".join(sorted(fingerprint_bytes(image) for image in images))
+
+    async def extract(self, images: List[bytes]) -> LabelExtraction:
+        """
+        Extract text and analysis from the raw upload bytes of one or more
+        photos of the same product.
+        Raises VisionExtractionFailed when the model call fails, so callers
+        can tell an outage apart from a photo with no readable text.
+        """
+        if not self.use_key_manager:
+            raise ValueError("AI Service not configured (Missing API Key)")
+        if not images:
+            raise ValueError("At least one image is required")
+
+        try:
+            data = await vision_cache.get_or_compute(
+                self.cache_key(images),
+                lambda: self._extract_uncached(images)
+            )
+            return LabelExtraction(**data)
+        except ValidationError as e:
+            # Still invalid after the repair retry (checked before ValueError, its base class)
+            logger.warning("Vision extraction returned invalid output: %s", e)
+            raise VisionExtractionFailed(str(e)) from e
+        except ValueError:
+            # Undecodable upload - let the endpoint report it
+            raise
+        except Exception as e:
+            logger.warning("Vision extraction error (all keys failed): %s", e)
+            raise VisionExtractionFailed(str(e)) from e
+
+    async def _extract_uncached(self, images: List[bytes]) -> dict:
+        """Prepare all images concurrently and run one batched vision call"""
+        prepared = await asyncio.gather(*(prepare_image_async(image) for image in images))
+        multi_image_note = MULTI_IMAGE_NOTE.format(count=len(prepared)) if len(prepared) > 1 else ""
+        prompt = VISION_EXTRACTION.render(multi_image_note=multi_image_note)
+        contents = [prompt, *(image.as_part() for image in prepared)]
+
+        async def execute_extraction(model):
+            return await generate_structured(
+                model,
+                contents,
+                LabelExtraction,
+                temperature=0.2,
+                agent=VISION_EXTRACTION.name
+            )
+
+        extraction = await key_manager.execute_with_fallback(execute_extraction, system_instruction=VISION_EXTRACTION.system)
+        extraction.ingredients_text = _merge_lines(extraction.ingredients_text)
+        extraction.nutrition_text = _merge_lines(extraction.nutrition_text)
+        extraction.other_text = _merge_lines(extraction.other_text)
+        logger.info("   → Vision extraction completed (%s image(s)), label text length: %s", len(prepared), len(extraction.label_text))
+        return extraction.dict()
+
+
+vision_extractor = VisionExtractor()
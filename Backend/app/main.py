@@ -1,4 +1,6 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 
 app = FastAPI(
     title="AI-Native Food Intelligence Backend"
@@ -8,9 +10,7 @@ app = FastAPI(
 try:
     from app.ai.router import router as ai_router
 except ImportError as e:
-    import traceback
-    print(f"Failed to import routers: {e}")
-    print(traceback.format_exc())
+    logging.getLogger(__name__).exception("Failed to import routers: %s", e)
     # Create empty router to prevent crash
     from fastapi import APIRouter
     ai_router = APIRouter()
@@ -39,14 +39,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID", "ETag"],
 )
 
+# Request latency per route for /metrics
+from app.ai.metrics import MetricsMiddleware, render_metrics
+app.add_middleware(MetricsMiddleware)
+
+# Outermost: request IDs, spans and Server-Timing for every request
+from app.ai.tracing import TracingMiddleware
+app.add_middleware(TracingMiddleware)
+
 # Health check endpoint (no dependencies)
 @app.get("/")
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "message": "API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (async: renders on the event loop thread that updates the metrics)"""
+    body = render_metrics()
+    if body is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 app.include_router(ai_router, prefix="/api")
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+"""
+Benchmark Fixtures
+Realistic payloads for the per-request local hot paths
+"""
+import os
+import sys
+
+# Benchmarks never reach a real model: agents get the local stand-in and placeholder keys
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from app.ai.decision_engine import decision_engine
+from app.ai.schemas import DecisionEngineResponse, StructuredIngredientAnalysis
+
+INGREDIENT_TEXT = (
+    "Ingredients: whole grain oats (38%), sugar, corn syrup, rice flour, palm oil, honey, salt, "
+    "soy lecithin, natural flavor, cinnamon, tocopherols, calcium carbonate, iron, vitamin b12"
+)
+
+STRUCTURED_ANALYSIS = {
+    "ingredient_summary": {
+        "primary_components": ["whole grain oats", "sugar", "corn syrup"],
+        "added_sugars_present": True,
+        "sweetener_type": "added",
+        "fiber_level": "moderate",
+        "protein_level": "low",
+        "fat_level": "low",
+        "processing_level": "high",
+        "ultra_processed_markers": ["emulsifier", "natural flavor"],
+        "ingredient_count": 14,
+    },
+    "food_properties": {
+        "sugar_dominant": False,
+        "fiber_protein_support": "weak",
+        "energy_release_pattern": "rapid",
+        "satiety_support": "low",
+        "formulation_complexity": "complex",
+    },
+    "confidence_notes": {"data_completeness": "high", "ambiguity_flags": ["sugar amount not listed"]},
+}
+
+
+@pytest.fixture(scope="session")
+def structured_analysis() -> StructuredIngredientAnalysis:
+    return StructuredIngredientAnalysis(**STRUCTURED_ANALYSIS)
+
+
+@pytest.fixture(scope="session")
+def decision_result(structured_analysis) -> dict:
+    """A decision engine response as stored in the decision cache"""
+    decision = decision_engine.decide(structured_analysis)
+    return DecisionEngineResponse(
+        quick_insight={
+            "summary": "Whole grain cereal with added sugars - quick energy that may not last long.",
+            "uncertainty_reason": None,
+        },
+        explanation={
+            "why_this_matters": [
+                "Added sugars give quick but short-lived energy",
+                "High processing makes it less filling",
+                "Whole grain oats add some fiber",
+            ],
+            "when_it_makes_sense": "A convenient breakfast when you need fast energy before activity.",
+            "what_to_know": "Pair it with yogurt or nuts for protein to stay full longer.",
+        },
+        intent_classified="curiosity",
+        key_signals=decision.key_signals,
+        ingredient_translations=[
+            {"term": "soy lecithin", "simple_explanation": "A plant-based emulsifier that keeps ingredients blended.", "category": "emulsifier"},
+            {"term": "tocopherols", "simple_explanation": "Vitamin E compounds used to keep oils fresh.", "category": "preservative"},
+            {"term": "calcium carbonate", "simple_explanation": "A mineral added for calcium fortification.", "category": "other"},
+        ],
+        uncertainty_flags=["sugar amount not listed"],
+        structured_analysis=structured_analysis,
+    ).dict()
+
+
+@pytest.fixture(scope="session")
+def autonomous_result(decision_result) -> dict:
+    """The final result of an autonomous text run, as sent in the SSE 'complete' event"""
+    initial_analysis = {
+        "insight": "A sweetened whole grain cereal: convenient, but the added sugars dominate its energy profile.",
+        "detailed_reasoning": "Oats lead the list, followed by two sweeteners and refined rice flour. Emulsifiers and flavorings indicate industrial processing.",
+        "trade_offs": {"pros": ["Whole grain base", "Fortified with iron and B12"], "cons": ["Two added sweeteners", "Highly processed"]},
+        "key_takeaways": ["✓ Whole grain base", "✓ Fortified with iron and B12", "⚠ Two added sweeteners", "⚠ Highly processed"],
+        "uncertainty_note": None,
+        "text": INGREDIENT_TEXT,
+    }
+    return {
+        "initial_analysis": initial_analysis,
+        "workflow_steps": [
+            {"action": "analyze_text", "description": "Initial text analysis", "result": initial_analysis, "reasoning": "Extracted summary and key takeaways"},
+            {"action": "decision_engine", "description": "Rule-based decision analysis", "result": decision_result, "reasoning": "Transparent multi-agent decision"},
+            {"action": "generate_recommendations", "description": "Personalized recommendations", "result": {"recommendations": [
+                {"title": "Watch the serving size", "description": "Stick to one serving to limit added sugar.", "priority": "high"},
+                {"title": "Add protein", "description": "Pair with yogurt or nuts for steadier energy.", "priority": "medium"},
+                {"title": "Compare labels", "description": "Look for options with more fiber and less sugar.", "priority": "low"},
+            ]}, "reasoning": "Actionable next steps"},
+        ],
+        "synthesis": {
+            "executive_summary": "A convenient whole grain cereal whose added sugars and processing make it better as an occasional quick-energy breakfast.",
+            "key_takeaways": ["Contains two added sweeteners", "Highly processed", "Whole grain oats provide some fiber"],
+            "confidence_level": "high",
+            "next_steps": ["Compare with a lower-sugar cereal", "Check the serving size"],
+        },
+        "total_steps": 3,
+    }
@@ -0,0 +1,43 @@
+"""
+Autonomous Agent Checks
+Runs that fell back somewhere must never reach the autonomous cache
+"""
+import asyncio
+from app.ai import autonomous_agent as agent_module
+from app.ai.autonomous_agent import AutonomousAgent, autonomous_agent
+from app.ai.prompts import PLANNER, SYNTHESIS
+from conftest import INGREDIENT_TEXT
+
+
+def _fail_agent(monkeypatch, failing: str):
+    """Make every generate() call for one agent raise, as when all keys fail"""
+    generate = agent_module.generate
+
+    async def flaky_generate(model, contents, agent="llm", **kwargs):
+        if agent == failing:
+            raise RuntimeError(f"{agent} unavailable")
+        return await generate(model, contents, agent=agent, **kwargs)
+
+    monkeypatch.setattr(agent_module, "generate", flaky_generate)
+
+
+def _run() -> dict:
+    return asyncio.run(autonomous_agent._run_workflow(None, INGREDIENT_TEXT, None))
+
+
+def test_complete_run_is_cacheable():
+    assert AutonomousAgent._is_cacheable_run(_run())
+
+
+def test_planner_failure_is_not_cached(monkeypatch):
+    _fail_agent(monkeypatch, PLANNER.name)
+    result = _run()
+    assert result["workflow_steps"][-1]["result"] == {"error": f"{PLANNER.name} unavailable"}
+    assert not AutonomousAgent._is_cacheable_run(result)
+
+
+def test_synthesis_fallback_is_not_cached(monkeypatch):
+    _fail_agent(monkeypatch, SYNTHESIS.name)
+    result = _run()
+    assert result["synthesis"]["degraded"]
+    assert not AutonomousAgent._is_cacheable_run(result)
@@ -0,0 +1,40 @@
+"""
+Decision HTTP Caching Checks
+Only exact-cache results, which carry an ETag, may be stored by browsers and CDNs
+"""
+import pytest
+from fastapi.testclient import TestClient
+from app.ai.cache import decision_cache
+from app.ai.near_duplicate import near_duplicate_index
+from app.main import app
+from conftest import INGREDIENT_TEXT
+
+
+@pytest.fixture
+def client(monkeypatch, decision_result):
+    monkeypatch.setattr(near_duplicate_index, "enabled", True)
+    decision_cache.set(INGREDIENT_TEXT, decision_result)
+    near_duplicate_index.add(INGREDIENT_TEXT)
+    yield TestClient(app)
+    decision_cache.clear()
+    near_duplicate_index.remove(INGREDIENT_TEXT)
+
+
+def test_exact_hit_is_public(client):
+    response = client.get("/api/analyze/decision", params={"text": INGREDIENT_TEXT})
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("public")
+    assert client.get(
+        "/api/analyze/decision",
+        params={"text": INGREDIENT_TEXT},
+        headers={"If-None-Match": response.headers["etag"]}
+    ).status_code == 304
+
+
+def test_near_duplicate_is_not_stored(client):
+    # Same ingredients, different quantity: an exact-cache miss reused through the near-duplicate index
+    response = client.get("/api/analyze/decision", params={"text": INGREDIENT_TEXT.replace("(38%)", "(40%)")})
+    assert response.status_code == 200
+    assert response.json()["near_duplicate"] is True
+    assert "etag" not in response.headers
+    assert response.headers["cache-control"] == "no-store"
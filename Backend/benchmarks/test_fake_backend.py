@@ -0,0 +1,46 @@
+"""
+Fake Backend Checks
+Every agent prompt must get its own answer from MODEL_BACKEND=fake, in the format its agent parses, or load test numbers mean nothing
+"""
+import random
+import pytest
+from app.ai.model_backend import _fake_output
+from app.ai.prompts import prompts
+from conftest import INGREDIENT_TEXT
+
+# Registered prompt -> kind the fake backend must answer it as
+PROMPT_KINDS = {
+    "analysis": "analysis",
+    "vision_extraction": "vision_extraction",
+    "intent_classifier": "intent",
+    "interpreter": "interpretation",
+    "translator": "translation",
+    "quick_insight": "quick_insight",
+    "explanation": "explanation",
+    "comparison": "comparison",
+    "comparison_recommendation": "comparison_recommendation",
+    "ranking_narrative": "ranking_narrative",
+    "planner": "planner",
+    "recommendations": "recommendations",
+    "synthesis": "synthesis",
+}
+
+# Answered in plain text; every other agent parses JSON
+TEXT_KINDS = {"planner", "comparison_recommendation"}
+
+
+def test_every_prompt_has_a_kind():
+    """json_repair is appended to the original request, which keeps its own kind"""
+    assert {prompt.name for prompt in prompts} - {"json_repair"} == set(PROMPT_KINDS)
+
+
+@pytest.mark.parametrize("name", sorted(PROMPT_KINDS))
+def test_fake_output_parses(name):
+    prompt = prompts.get(name)
+    rendered = prompt.render(**{field: INGREDIENT_TEXT for field in prompt.fields})
+    kind, output = _fake_output(rendered, random.Random(0))
+    assert kind == PROMPT_KINDS[name]
+    if kind in TEXT_KINDS:
+        assert isinstance(output, str)
+    else:
+        assert isinstance(output, (dict, list))
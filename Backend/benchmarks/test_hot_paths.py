@@ -0,0 +1,124 @@
+"""
+Hot Path Benchmarks
+Pure-Python work done on every request, next to (or instead of) the LLM calls
+"""
+import asyncio
+import itertools
+import json
+from fastapi.encoders import jsonable_encoder
+from app.ai.cache import AnalysisCache
+from app.ai.decision_engine import decision_engine
+from app.ai.router import _sse_event
+from app.ai.schemas import DecisionEngineResponse, StructuredIngredientAnalysis
+from conftest import INGREDIENT_TEXT, STRUCTURED_ANALYSIS
+
+CACHE_SIZE = 500  # Decision cache default
+
+
+def _full_cache(data) -> AnalysisCache:
+    cache = AnalysisCache(max_size=CACHE_SIZE, ttl_seconds=3600)
+    for i in range(CACHE_SIZE):
+        cache.set(f"{INGREDIENT_TEXT}, variant {i}", data)
+    return cache
+
+
+def test_cache_get_hit(benchmark, decision_result):
+    cache = _full_cache(decision_result)
+    text = f"{INGREDIENT_TEXT}, variant {CACHE_SIZE // 2}"
+    assert benchmark(cache.get, text) is decision_result
+
+
+def test_cache_get_miss(benchmark, decision_result):
+    cache = _full_cache(decision_result)
+    assert benchmark(cache.get, "Ingredients: water, salt") is None
+
+
+def test_cache_set_full(benchmark, decision_result):
+    """Steady state of a full cache: every set evicts the oldest entry"""
+    cache = _full_cache(decision_result)
+    counter = itertools.count()
+    benchmark(lambda: cache.set(f"{INGREDIENT_TEXT}, new {next(counter)}", decision_result))
+    assert len(cache.cache) == CACHE_SIZE
+
+
+def test_decide(benchmark, structured_analysis):
+    decision = benchmark(decision_engine.decide, structured_analysis)
+    assert decision.key_signals
+
+
+def test_structured_analysis_validation(benchmark):
+    """Parsing the interpreter's JSON output into the schema"""
+    raw = json.dumps(STRUCTURED_ANALYSIS)
+    benchmark(lambda: StructuredIngredientAnalysis(**json.loads(raw)))
+
+
+def test_response_from_cache(benchmark, decision_result):
+    """DecisionEngineResponse(**cached_result) on every decision cache hit"""
+    response = benchmark(lambda: DecisionEngineResponse(**decision_result))
+    assert response.key_signals == decision_result["key_signals"]
+
+
+def test_response_dict(benchmark, decision_result):
+    """.dict() before caching and when embedding results in agent steps"""
+    response = DecisionEngineResponse(**decision_result)
+    assert benchmark(response.dict) == decision_result
+
+
+def test_response_json_encoding(benchmark, decision_result):
+    """FastAPI's response path: jsonable_encoder plus json.dumps"""
+    response = DecisionEngineResponse(**decision_result)
+    benchmark(lambda: json.dumps(jsonable_encoder(response)))
+
+
+def test_sse_complete_event(benchmark, autonomous_result):
+    """The final SSE event of autonomous_analyze_text_stream"""
+    event = benchmark(_sse_event, {"event": "complete", "result": autonomous_result})
+    assert event.startswith("data: ") and event.endswith("\n\n")
+
+
+def test_sse_stage_event(benchmark, decision_result):
+    """Intermediate progress events published while the decision engine runs"""
+    payload = {"event": "stage_complete", "stage": "interpretation", "result": {"structured_analysis": decision_result["structured_analysis"]}}
+    benchmark(_sse_event, payload)
+
+
+def test_cache_get_encoded(benchmark, decision_result):
+    """A decision cache hit as stored JSON bytes (replaces from_cache + json_encoding)"""
+    cache = AnalysisCache(max_size=CACHE_SIZE, ttl_seconds=3600, store_encoded=True)
+    cache.set(INGREDIENT_TEXT, decision_result)
+    assert json.loads(benchmark(cache.get_encoded, INGREDIENT_TEXT).body) == decision_result
+
+
+def test_decision_endpoint_cache_hit(benchmark, decision_result):
+    """POST /api/analyze/decision through the whole ASGI app (middlewares included) on a warm cache"""
+    from app.main import app
+    from app.ai.cache import decision_cache
+
+    decision_cache.set(INGREDIENT_TEXT, decision_result)
+    body = json.dumps({"text": INGREDIENT_TEXT}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/analyze/decision", "raw_path": b"/api/analyze/decision",
+        "root_path": "", "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1), "server": ("benchmark", 80),
+    }
+
+    async def request():
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(dict(scope), receive, send)
+        return sent
+
+    loop = asyncio.new_event_loop()
+    try:
+        sent = benchmark(lambda: loop.run_until_complete(request()))
+    finally:
+        loop.close()
+    assert sent[0]["status"] == 200
+    assert json.loads(sent[1]["body"]) == json.loads(DecisionEngineResponse(**decision_result).json())
@@ -0,0 +1,32 @@
+"""
+Image Pipeline Checks
+Broken uploads must fail as ValueError (a 400), never later as an OSError (a 5xx)
+"""
+import io
+import PIL.Image
+import pytest
+from app.ai.image_pipeline import prepare_image
+
+
+def _jpeg(size=(640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    PIL.Image.radial_gradient("L").resize(size).convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def test_prepare_valid_jpeg():
+    prepared = prepare_image(_jpeg())
+    assert (prepared.width, prepared.height) == (640, 480)
+
+
+def test_truncated_jpeg_is_a_bad_upload():
+    raw = _jpeg()
+    with pytest.raises(ValueError, match="Could not decode image"):
+        prepare_image(raw[:len(raw) // 2])
+
+
+def test_decompression_bomb_is_a_bad_upload(monkeypatch):
+    # Anything over twice MAX_IMAGE_PIXELS raises DecompressionBombError on open
+    monkeypatch.setattr(PIL.Image, "MAX_IMAGE_PIXELS", 10_000)
+    with pytest.raises(ValueError, match="Could not decode image"):
+        prepare_image(_jpeg())
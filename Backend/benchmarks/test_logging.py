@@ -0,0 +1,105 @@
+"""
+Logging Benchmarks
+Event-loop time per diagnostic line: a synchronous print versus the queue-backed logger
+"""
+import asyncio
+import io
+import logging
+import queue
+import time
+import pytest
+from config.log import build_handler, log_sampled
+
+# Cost of one write to stdout when the reader (container log driver, collector) is slow
+WRITE_LATENCY_S = 50e-6
+
+# A burst of concurrent requests, each logging a few lines between awaits
+BURST_REQUESTS = 500
+LINES_PER_REQUEST = 4
+
+MESSAGE = "✅ Cache hit: %s... (hit rate: %.1f%%)"
+ARGS = ("3f9a1c0e", 87.5)
+
+
+class SlowStream(io.StringIO):
+    """stdout whose writes block for WRITE_LATENCY_S, like a pipe under backpressure"""
+
+    def write(self, text: str) -> int:
+        time.sleep(WRITE_LATENCY_S)
+        return super().write(text)
+
+
+@pytest.fixture
+def stream() -> SlowStream:
+    return SlowStream()
+
+
+@pytest.fixture
+def queue_logger(stream):
+    """A logger behind the app's queue handler; the listener thread writes to the slow stream"""
+    handler, listener = build_handler(stream, "json", {"cache.hit": 0.01}, queue_size=1_000_000)
+    logger = logging.getLogger("benchmarks.logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    listener.start()
+    yield logger
+    logger.removeHandler(handler)
+    # Skip writing out the backlog of a calibrated run
+    try:
+        while True:
+            handler.queue.get_nowait()
+    except queue.Empty:
+        pass
+    listener.stop()
+
+
+def _print_line(stream):
+    print(MESSAGE % ARGS, file=stream, flush=True)
+
+
+def test_log_print(benchmark, stream):
+    """The previous diagnostics: print() on the calling thread"""
+    benchmark(_print_line, stream)
+
+
+def test_log_queue(benchmark, queue_logger):
+    """logger.info: message captured and enqueued, formatted and written on the listener thread"""
+    benchmark(queue_logger.info, MESSAGE, *ARGS)
+
+
+def test_log_queue_sampled(benchmark, queue_logger):
+    """A high-frequency event kept at 1% (LOG_SAMPLE_RATES default), logged with extra={"event": ...}"""
+    benchmark(queue_logger.info, MESSAGE, *ARGS, extra={"event": "cache.hit"})
+
+
+def test_log_sampled(benchmark, queue_logger):
+    """The same event through log_sampled: sampled-out calls never build a LogRecord"""
+    benchmark(log_sampled, queue_logger, "cache.hit", MESSAGE, *ARGS)
+
+
+def test_log_below_level(benchmark, queue_logger):
+    """A debug line with LOG_LEVEL=INFO"""
+    benchmark(queue_logger.debug, MESSAGE, *ARGS)
+
+
+def _burst(emit) -> None:
+    async def request():
+        for _ in range(LINES_PER_REQUEST):
+            emit()
+            await asyncio.sleep(0)
+
+    async def burst():
+        await asyncio.gather(*(request() for _ in range(BURST_REQUESTS)))
+
+    asyncio.run(burst())
+
+
+def test_burst_print(benchmark, stream):
+    """Event-loop time for a burst of requests logging with print()"""
+    benchmark.pedantic(_burst, args=(lambda: _print_line(stream),), rounds=5)
+
+
+def test_burst_queue(benchmark, queue_logger):
+    """The same burst through the queue-backed logger"""
+    benchmark.pedantic(_burst, args=(lambda: queue_logger.info(MESSAGE, *ARGS),), rounds=5)
@@ -0,0 +1,29 @@
+"""
+Near-Duplicate Checks
+Only lists that really name the same ingredients may share a cached decision
+"""
+from app.ai.near_duplicate import NearDuplicateIndex, canonical_ingredient_tokens
+
+BASE = "Ingredients: whole grain oats, sugar, palm oil, salt, emulsifier (E471), acidity regulator (E330)"
+
+
+def _index() -> NearDuplicateIndex:
+    index = NearDuplicateIndex(threshold=0.85, num_perm=64, bands=16)
+    index.add(BASE)
+    return index
+
+
+def test_quantities_are_ignored():
+    index = _index()
+    match = index.lookup(BASE.replace("oats", "oats (38%)").replace("salt", "salt 0.5 %"), lambda text: text)
+    assert match is not None and match[0] == BASE
+
+
+def test_different_e_numbers_are_not_near_duplicates():
+    other = BASE.replace("E471", "E322").replace("E330", "E250")
+    assert _index().lookup(other, lambda text: text) is None
+
+
+def test_codes_and_names_with_digits_are_kept():
+    tokens = canonical_ingredient_tokens("emulsifier (E471), vitamin B12, omega-3 fatty acids, 2% milk")
+    assert tokens == {"emulsifier", "e471", "vitamin b12", "omega-3 fatty acids", "milk"}
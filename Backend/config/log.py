@@ -0,0 +1,181 @@
+"""
+Logging
+Queue-backed structured logging: callers only enqueue records, a listener thread formats and writes them
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, TextIO, Tuple
+
+# Loggers set to LOG_LEVEL; everything else (httpx, google, ...) stays at the root's WARNING.
+# "__main__" covers the CLIs run with python -m (bulk scorer, catalog ingest).
+APP_LOGGERS = ("app", "config", "__main__")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+# Set by app.ai.tracing so records carry the ID of the request that logged them
+_request_id: Callable[[], Optional[str]] = lambda: None
+
+
+def bind_request_id(getter: Callable[[], Optional[str]]):
+    """Register the function returning the current request ID (called on the thread that logs)"""
+    global _request_id
+    _request_id = getter
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """'cache.hit=0.01,cache.store=0.1' -> {'cache.hit': 0.01, 'cache.store': 0.1}"""
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        event, _, rate = entry.partition("=")
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            raise ValueError(f"Invalid LOG_SAMPLE_RATES entry '{entry}' (expected event=rate)") from None
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every 1/rate records of each sampled event (records logged
+    with extra={"event": ...}); unsampled events always pass. Kept records
+    carry sample_rate so counts can be scaled back up. The counters are
+    updated without a lock: a race between threads only shifts which
+    record is kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {event: round(1 / rate) if rate > 0 else 0 for event, rate in rates.items()}
+        self.seen: Dict[str, int] = {}
+
+    def take(self, event: str) -> Optional[float]:
+        """Count one occurrence of event: its sample rate if this one is kept, else None"""
+        every = self.every.get(event)
+        if every is None:
+            return 1.0
+        if every == 0:
+            return None
+        count = self.seen.get(event, 0)
+        self.seen[event] = count + 1
+        return None if count % every else 1 / every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or hasattr(record, "sample_rate"):  # Not sampled, or already by log_sampled
+            return True
+        rate = self.take(event)
+        if rate is not None and rate < 1:
+            record.sample_rate = rate
+        return rate is not None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, plus request_id, event, sample_rate and exc when set"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "event", "sample_rate"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records for the listener thread and never blocks the caller:
+    when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture only what can change after this call returns: the message (its args
+        # may be mutated), the traceback and the request ID. Formatting and I/O happen
+        # on the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        request_id = _request_id()
+        if request_id:
+            record.request_id = request_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def build_handler(
+    stream: TextIO,
+    log_format: str = "json",
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10000
+) -> Tuple[NonBlockingQueueHandler, logging.handlers.QueueListener]:
+    """A queue handler and the (not yet started) listener writing its records to stream"""
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(SamplingFilter(sample_rates or {}))
+    return handler, logging.handlers.QueueListener(handler.queue, output)
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_sampler = SamplingFilter({})
+
+
+def configure_logging(level: str, log_format: str, sample_rates: Dict[str, float], queue_size: int):
+    """Route all loggers through one queue handler writing to stdout (once per process; config.settings calls it)"""
+    global _handler, _sampler
+    if _handler is not None:
+        return
+    handler, listener = build_handler(sys.stdout, log_format, sample_rates, queue_size)
+    _sampler = handler.filters[0]
+    logging.getLogger().addHandler(handler)
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)  # Flushes queued records on shutdown
+    _handler = handler
+
+
+def log_sampled(logger: logging.Logger, event: str, msg: str, *args: Any, level: int = logging.INFO):
+    """
+    Log a high-frequency event through the sampler before any LogRecord is
+    built, so sampled-out occurrences (most cache hits) cost a counter update.
+    Arguments are still evaluated by the caller, so keep them cheap.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = _sampler.take(event)
+    if rate is None:
+        return
+    extra = {"event": event, "sample_rate": rate} if rate < 1 else {"event": event}
+    logger.log(level, msg, *args, extra=extra, stacklevel=2)
+
+
+def get_stats() -> Dict[str, int]:
+    """Records waiting for the listener and records dropped because the queue was full"""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
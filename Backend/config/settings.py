@@ -1,6 +1,8 @@
 from dotenv import load_dotenv
+import logging
 import os
 from typing import List
+from config.log import configure_logging, parse_sample_rates
 
 load_dotenv()
 
@@ -20,6 +22,15 @@ else:
 
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
+# Logging: records are written by a background thread, as JSON lines (production default) or text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if ENV == "development" else "json").lower()
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "cache.hit=0.01,cache.store=0.01"))  # Fraction of high-frequency events kept
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records beyond this are dropped rather than blocking requests
+
+configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES, LOG_QUEUE_SIZE)
+logger = logging.getLogger(__name__)
+
 # API Keys with Fallback System
 # Load all available Gemini API keys (GEMINI_API_KEY1 through GEMINI_API_KEY10)
 GEMINI_API_KEYS: List[str] = []
@@ -35,6 +46,14 @@ single_key = os.getenv("GEMINI_API_KEY", "")
 if single_key and single_key not in GEMINI_API_KEYS:
     GEMINI_API_KEYS.insert(0, single_key)
 
+# Model backend: "gemini" (real API), "fake" (local stand-in for load and latency testing),
+# "record" (real API, captured to a cassette) or "replay" (served offline from a cassette)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()
+
+# Offline backends need no real keys; give them placeholder keys so per-key quotas and rotation still apply
+if MODEL_BACKEND in ("fake", "replay") and not GEMINI_API_KEYS:
+    GEMINI_API_KEYS = [f"fake-key-{i}" for i in range(1, int(os.getenv("FAKE_LLM_KEYS", "3")) + 1)]
+
 # Validate we have at least one key
 if not GEMINI_API_KEYS:
     error_msg = """
@@ -61,18 +80,76 @@ if not GEMINI_API_KEYS:
     if ENV == "production":
         raise ValueError(f"{error_msg}\\n\\nCannot start in PRODUCTION mode without API keys.")
     else:
-        print(f"⚠️  WARNING: Running in DEVELOPMENT mode without API keys!")
-        print(error_msg)
-        print("\\n⚠️  AI features will not work. Please add API keys to enable them.\\n")
+        logger.warning("⚠️  Running in DEVELOPMENT mode without API keys!\n%s\n⚠️  AI features will not work. Please add API keys to enable them.", error_msg)
 
 # For backward compatibility, set GEMINI_API_KEY to the first available key
 GEMINI_API_KEY = GEMINI_API_KEYS[0] if GEMINI_API_KEYS else ""
 
+# One startup line (every serverless cold start logs it); the missing-key banner above stays loud
 if GEMINI_API_KEYS:
-    print(f"✅ Loaded {len(GEMINI_API_KEYS)} Gemini API key(s) for fallback rotation")
-    print(f"📍 Environment: {ENV}")
+    logger.info("✅ %s: %d Gemini API key(s) for fallback rotation, %s backend", ENV, len(GEMINI_API_KEYS), MODEL_BACKEND)
 else:
-    print(f"⚠️  Running without API keys in {ENV} mode")
+    logger.warning("⚠️  Running without API keys in %s mode", ENV)
 
 # Frontend URL for CORS
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://unlabel-eight.vercel.app")
+
+# Autonomous agent prompt budget (approximate tokens of planner/synthesis context)
+AGENT_CONTEXT_MAX_TOKENS = int(os.getenv("AGENT_CONTEXT_MAX_TOKENS", "2000"))
+
+# Whole-run cache TTL for autonomous analyses (seconds)
+AUTONOMOUS_CACHE_TTL_SECONDS = int(os.getenv("AUTONOMOUS_CACHE_TTL_SECONDS", "900"))
+
+# Image preprocessing (uploads are downscaled once and shared by all vision calls)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1600"))  # Longest side in pixels, keeps label text legible
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Maximum photos of one product accepted by the image endpoints
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "4"))
+
+# Batch decision endpoint
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY_PER_KEY = int(os.getenv("BATCH_CONCURRENCY_PER_KEY", "2"))  # Concurrent pipelines per healthy API key
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Maximum products in one /compare/rank request
+RANKING_MAX_PRODUCTS = int(os.getenv("RANKING_MAX_PRODUCTS", "25"))
+
+# Local product catalog (SQLite FTS5 index built from an Open Food Facts dump)
+PRODUCT_CATALOG_PATH = os.getenv("PRODUCT_CATALOG_PATH", "data/product_catalog.db")
+PRODUCT_VECTOR_DIM = int(os.getenv("PRODUCT_VECTOR_DIM", "128"))  # Hashed ingredient vector size (float32 per product)
+
+# Near-duplicate reuse: serve cached analyses of ingredient lists that differ only slightly
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "false").lower() == "true"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))  # Minimum Jaccard similarity of ingredient sets
+NEAR_DUPLICATE_NUM_PERM = int(os.getenv("NEAR_DUPLICATE_NUM_PERM", "64"))  # MinHash signature length
+NEAR_DUPLICATE_BANDS = int(os.getenv("NEAR_DUPLICATE_BANDS", "16"))  # LSH bands (must divide NUM_PERM)
+
+# Fake model backend (MODEL_BACKEND=fake): simulated latency, errors and quotas
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))  # Median latency per call
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.35"))  # Log-normal spread (0 = constant)
+FAKE_LLM_ERROR_RATE_429 = float(os.getenv("FAKE_LLM_ERROR_RATE_429", "0"))  # Fraction of calls failing with 429
+FAKE_LLM_ERROR_RATE_5XX = float(os.getenv("FAKE_LLM_ERROR_RATE_5XX", "0"))  # Fraction of calls failing with 500
+FAKE_LLM_KEY_RPM = int(os.getenv("FAKE_LLM_KEY_RPM", "0"))  # Requests per minute per key (0 = unlimited)
+
+# Record/replay cassettes (MODEL_BACKEND=record / replay)
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "data/cassettes/llm.jsonl.gz")
+CASSETTE_REPLAY_LATENCY = os.getenv("CASSETTE_REPLAY_LATENCY", "recorded").lower()  # recorded or zero
+
+# Request tracing: spans per agent call, key attempt, cache lookup and executor wait (Server-Timing header)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")  # e.g. http://localhost:4318 for a local collector
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "unlabel-backend")
+
+# Prometheus metrics at GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# LLM token accounting: prices (USD per million tokens, Gemini 2.5 Flash list prices) and the debug response field
+LLM_PRICE_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", "0.30"))
+LLM_PRICE_OUTPUT_PER_MTOK = float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", "2.50"))
+LLM_USAGE_IN_RESPONSE = os.getenv("LLM_USAGE_IN_RESPONSE", "false").lower() == "true"  # Adds a 'usage' field to analysis responses
+
+# Browser/CDN caching of GET /api/analyze/decision responses (revalidated with ETags after this)
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", "300"))
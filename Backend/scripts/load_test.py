@@ -0,0 +1,195 @@
+"""
+Load Test Harness
+Drives the analysis endpoints at a target request rate and reports latency, throughput and LLM calls
+
+Runs in-process against the fake model backend by default:
+    python scripts/load_test.py --rps 5 --duration 30
+Or against a running server (LLM calls per request are then not available):
+    python scripts/load_test.py --url http://127.0.0.1:8000 --scenarios decision
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INGREDIENT_POOL = [
+    "whole grain oats", "sugar", "corn syrup", "wheat flour", "rice flour", "palm oil", "sunflower oil",
+    "salt", "soy lecithin", "natural flavor", "cocoa powder", "milk powder", "whey protein", "maltodextrin",
+    "dextrose", "honey", "almonds", "peanuts", "raisins", "chicory root fiber", "modified corn starch",
+    "citric acid", "mono- and diglycerides", "tocopherols", "baking soda", "vanilla extract", "glucose syrup",
+    "pea protein", "inulin", "caramel color", "sucralose", "xanthan gum", "cinnamon", "dried cranberries",
+    "coconut oil", "brown rice", "barley malt extract", "calcium carbonate", "iron", "vitamin b12",
+]
+
+SCENARIOS = ("decision", "compare", "autonomous")
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PayloadFactory:
+    """Ingredient lists for requests; unique by default so caches do not hide LLM latency"""
+
+    def __init__(self, seed: int, repeat: int):
+        self.rng = random.Random(seed)
+        self.repeat = repeat  # 0 = every payload unique, N = cycle through N payloads
+        self._pool: List[str] = []
+        self._count = 0
+
+    def _fresh(self) -> str:
+        ingredients = self.rng.sample(INGREDIENT_POOL, self.rng.randint(5, 14))
+        ingredients[0] += f" ({self.rng.randint(20, 70)}%)"
+        return "Ingredients: " + ", ".join(ingredients)
+
+    def text(self) -> str:
+        self._count += 1
+        if not self.repeat:
+            return self._fresh()
+        if len(self._pool) < self.repeat:
+            self._pool.append(self._fresh())
+            return self._pool[-1]
+        return self._pool[self._count % self.repeat]
+
+
+def _request_for(scenario: str, payloads: PayloadFactory) -> Tuple[str, str, Dict[str, Any]]:
+    """(method, path, httpx request kwargs) for one request of a scenario"""
+    if scenario == "decision":
+        return "POST", "/api/analyze/decision", {"json": {"text": payloads.text()}}
+    if scenario == "compare":
+        return "POST", "/api/analyze/compare", {
+            "json": {"product_a_text": payloads.text(), "product_b_text": payloads.text()}
+        }
+    return "POST", "/api/analyze/autonomous/text", {
+        "params": {"text": payloads.text(), "user_query": "Is this a good everyday snack?"}
+    }
+
+
+async def run_scenario(
+    client: Any,
+    scenario: str,
+    rps: float,
+    duration: float,
+    payloads: PayloadFactory,
+    llm_calls: Optional[Callable[[], int]] = None
+) -> Dict[str, Any]:
+    """
+    Open-loop load: requests are started on a fixed schedule whether or not
+    earlier ones have finished, so queueing shows up as latency instead of
+    silently lowering the offered rate.
+    """
+    total = max(1, int(rps * duration))
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    in_flight = 0
+    max_in_flight = 0
+    calls_before = llm_calls() if llm_calls else 0
+
+    async def fire():
+        nonlocal in_flight, max_in_flight
+        method, path, kwargs = _request_for(scenario, payloads)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = str(response.status_code)
+        except Exception as e:
+            status = type(e).__name__
+        finally:
+            in_flight -= 1
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"🚦 {scenario}: {total} requests at {rps} req/s")
+    started = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        delay = started + i / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    report = {
+        "scenario": scenario,
+        "requests": total,
+        "ok": ok,
+        "errors": total - ok,
+        "statuses": statuses,
+        "seconds": round(elapsed, 2),
+        "throughput": round(ok / elapsed, 2) if elapsed else 0.0,
+        "max_in_flight": max_in_flight,
+        "latency_ms": {
+            "p50": round(1000 * _percentile(latencies, 0.5), 1),
+            "p95": round(1000 * _percentile(latencies, 0.95), 1),
+            "p99": round(1000 * _percentile(latencies, 0.99), 1),
+            "max": round(1000 * max(latencies), 1),
+        },
+        "llm_calls_per_request": round((llm_calls() - calls_before) / total, 2) if llm_calls else None,
+    }
+    return report
+
+
+def _print_report(report: Dict[str, Any]):
+    latency = report["latency_ms"]
+    print(f"\n📊 {report['scenario']}: {report['ok']}/{report['requests']} ok in {report['seconds']}s ({report['throughput']} req/s)")
+    print(f"   Latency (ms): p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    print(f"   Max in flight: {report['max_in_flight']}")
+    if report["errors"]:
+        print(f"   Statuses: {report['statuses']}")
+    if report["llm_calls_per_request"] is not None:
+        print(f"   LLM calls per request: {report['llm_calls_per_request']}")
+
+
+async def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The load test needs httpx: pip install httpx")
+
+    llm_calls = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        # In-process: the fake backend stands in for Gemini unless the caller chose otherwise
+        os.environ.setdefault("MODEL_BACKEND", "fake")
+        sys.path.insert(0, BACKEND_DIR)
+        from app.main import app
+        from app.ai.model_backend import backend_call_count
+
+        if backend_call_count() is not None:
+            llm_calls = backend_call_count
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+
+    payloads = PayloadFactory(args.seed, args.repeat)
+    reports = []
+    async with client:
+        for scenario in args.scenarios.split(","):
+            if scenario not in SCENARIOS:
+                raise SystemExit(f"Unknown scenario '{scenario}' (choose from {', '.join(SCENARIOS)})")
+            reports.append(await run_scenario(client, scenario, args.rps, args.duration, payloads, llm_calls))
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the analysis endpoints at a target request rate")
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: decision, compare, autonomous")
+    parser.add_argument("--rps", type=float, default=2.0, help="Target requests per second per scenario")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per scenario")
+    parser.add_argument("--repeat", type=int, default=0, help="Cycle through N distinct payloads (0 = all unique, bypassing caches)")
+    parser.add_argument("--seed", type=int, default=7, help="Payload random seed")
+    parser.add_argument("--timeout", type=float, default=180.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    for report in asyncio.run(main(args)):
+        _print_report(report)
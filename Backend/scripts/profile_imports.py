@@ -0,0 +1,154 @@
+"""
+Import-Time Profile
+Reports per-module import cost and cold-start time to the first /api/health response
+
+Each run is a fresh interpreter, like a serverless cold start:
+    python scripts/profile_imports.py
+    python scripts/profile_imports.py --runs 10 --save before.json
+    python scripts/profile_imports.py --compare before.json
+Profile another checkout (e.g. a git worktree of the previous release):
+    python scripts/profile_imports.py --backend-dir ../old/Backend
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+# Runs in the child: import the app, then serve one health check straight through ASGI
+COLD_START_SNIPPET = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, ".")
+from app.main import app
+imported = time.perf_counter()
+
+async def health():
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/api/health", "raw_path": b"/api/health", "root_path": "",
+             "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("profile", 80)}
+    status = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+    await app(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(health())
+served = time.perf_counter()
+print(json.dumps({"import_ms": 1000 * (imported - started), "health_ms": 1000 * (served - started), "status": status}))
+"""
+
+
+def profile_imports(backend_dir: str, module: str) -> List[Dict[str, Any]]:
+    """One -X importtime run: (module, self_us, cumulative_us, depth) per imported module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, '.'); import {module}"],
+        cwd=backend_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            })
+    return modules
+
+
+def cold_start(backend_dir: str, runs: int) -> Dict[str, float]:
+    """Median time to import app.main and to answer /api/health, each in a fresh interpreter"""
+    imports, healths = [], []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", COLD_START_SNIPPET], cwd=backend_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise SystemExit(f"Cold start run failed:\n{result.stderr[-2000:]}")
+        timing = json.loads(result.stdout.strip().splitlines()[-1])
+        if timing["status"] != 200:
+            raise SystemExit(f"/api/health returned {timing['status']}")
+        imports.append(timing["import_ms"])
+        healths.append(timing["health_ms"])
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(imports), 1),
+        "health_ms": round(statistics.median(healths), 1),
+        "health_ms_min": round(min(healths), 1),
+    }
+
+
+def by_package(modules: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Self time in ms per top-level package (google.*, fastapi.*, app.*, ...)"""
+    totals: Dict[str, float] = {}
+    for entry in modules:
+        package = entry["module"].split(".")[0]
+        totals[package] = totals.get(package, 0.0) + entry["self_us"] / 1000
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def main(args: argparse.Namespace) -> Dict[str, Any]:
+    backend_dir = os.path.abspath(args.backend_dir)
+    modules = profile_imports(backend_dir, args.module)
+    root = next((m for m in reversed(modules) if m["module"] == args.module), None)
+    report = {
+        "backend_dir": backend_dir,
+        "module": args.module,
+        "import_total_ms": round(root["cumulative_us"] / 1000, 1) if root else None,
+        "slowest_modules": [
+            {"module": m["module"], "cumulative_ms": round(m["cumulative_us"] / 1000, 1), "self_ms": round(m["self_us"] / 1000, 1)}
+            for m in sorted(modules, key=lambda m: -m["cumulative_us"])[:args.top]
+        ],
+        "packages_ms": {name: round(ms, 1) for name, ms in list(by_package(modules).items())[:args.top]},
+        "cold_start": cold_start(backend_dir, args.runs),
+    }
+    return report
+
+
+def _print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    print(f"\n📦 import {report['module']}: {report['import_total_ms']} ms ({report['backend_dir']})")
+    print("\n   Slowest imports (cumulative / self ms):")
+    for entry in report["slowest_modules"]:
+        print(f"   {entry['cumulative_ms']:>9.1f} {entry['self_ms']:>8.1f}  {entry['module']}")
+    print("\n   Self time by top-level package (ms):")
+    for name, ms in report["packages_ms"].items():
+        print(f"   {ms:>9.1f}  {name}")
+    cold = report["cold_start"]
+    print(f"\n🥶 Cold start (median of {cold['runs']}): import {cold['import_ms']} ms, first /api/health {cold['health_ms']} ms (best {cold['health_ms_min']} ms)")
+    if baseline:
+        before = baseline["cold_start"]["health_ms"]
+        print(f"   Baseline first /api/health {before} ms -> {cold['health_ms']} ms ({before / cold['health_ms']:.2f}x faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile import cost and cold start of the backend")
+    parser.add_argument("--backend-dir", default=BACKEND_DIR, help="Backend checkout to profile (default: this one)")
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-interpreter cold start runs")
+    parser.add_argument("--top", type=int, default=20, help="Rows in the module and package tables")
+    parser.add_argument("--save", help="Write the report as JSON (e.g. a baseline)")
+    parser.add_argument("--compare", help="Baseline JSON from --save to compare the cold start against")
+    args = parser.parse_args()
+
+    report = main(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)